@@ -0,0 +1,136 @@
+"""Content-addressed storage for institute agreement PDFs.
+
+A file is stored once under ``agreements/<sha[:2]>/<sha>.pdf`` however many
+institutes upload it. Uploads are copied in chunks to a temp file in the
+same directory while being hashed, then renamed into place, so a reader
+never sees a half-written PDF. The copy runs on a background worker; the
+form that received the upload returns without waiting for it.
+"""
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+
+import db
+from dialects import insert_for
+from models import AgreementFile, Institute
+
+logger = logging.getLogger(__name__)
+
+AGREEMENTS_DIR = "agreements"
+CHUNK_SIZE = 1 << 20
+# Page objects in a PDF; an estimate, since pages inside compressed object
+# streams are not visible without a PDF parser.
+_PAGE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+_PAGE_OVERLAP = 32
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="agreements")
+
+
+@dataclass(frozen=True)
+class StoredFile:
+    sha256: str
+    path: str
+    size: int
+    page_count: int
+
+
+def path_for(sha256, root=AGREEMENTS_DIR):
+    return os.path.join(root, sha256[:2], f"{sha256}.pdf")
+
+
+def store(fileobj, root=AGREEMENTS_DIR):
+    """Copy ``fileobj`` into the store and return what was stored."""
+    os.makedirs(root, exist_ok=True)
+    digest, size, pages, tail = hashlib.sha256(), 0, 0, b""
+    fd, tmp = tempfile.mkstemp(dir=root, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = fileobj.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+                # Keep a short tail so a marker split across chunks still counts.
+                window = tail + chunk
+                pages += len(_PAGE.findall(window)) - len(_PAGE.findall(tail))
+                tail = window[-_PAGE_OVERLAP:]
+            out.flush()
+            os.fsync(out.fileno())
+        sha = digest.hexdigest()
+        final = path_for(sha, root)
+        if os.path.exists(final):
+            os.remove(tmp)  # already stored
+        else:
+            os.makedirs(os.path.dirname(final), exist_ok=True)
+            os.replace(tmp, final)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return StoredFile(sha, final, size, pages or None)
+
+
+def record(session, stored, original_name=None):
+    """Return the ``AgreementFile`` row for ``stored``, adding it if new."""
+    # Two uploads of the same file may finish at once; the first one wins.
+    conn = session.connection()
+    conn.execute(
+        insert_for(conn)(AgreementFile).values(
+            sha256=stored.sha256, path=stored.path, size=stored.size,
+            page_count=stored.page_count, original_name=original_name,
+            created_at=datetime.now(),
+        ).on_conflict_do_nothing(index_elements=['sha256'])
+    )
+    return session.get(AgreementFile, stored.sha256)
+
+
+def attach(institute_id, fileobj, original_name=None):
+    """Store ``fileobj`` and make it the institute's agreement."""
+    fileobj.seek(0)
+    stored = store(fileobj)
+    with db.Session() as session:
+        row = record(session, stored, original_name)
+        inst = session.get(Institute, institute_id)
+        if inst is not None:
+            inst.agreement_sha256 = row.sha256
+            inst.agreement_path = row.path
+        session.commit()
+    return stored
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        logger.error("storing agreement failed", exc_info=future.exception())
+
+
+def attach_async(institute_id, fileobj, original_name=None):
+    """``attach`` on the background worker; returns the ``Future``."""
+    future = _executor.submit(attach, institute_id, fileobj, original_name)
+    future.add_done_callback(_log_failure)
+    return future
+
+
+class _DownloadFile(io.FileIO):
+    # Streamlit reads a download's file object once, whole, into its media
+    # store and then drops it; close the descriptor after that read.
+    def read(self, size=-1):
+        try:
+            return super().read(size)
+        finally:
+            if size is None or size < 0:
+                self.close()
+
+
+def reader(path):
+    """Zero-argument callable for lazy downloads of a stored agreement (or a
+    legacy path). It returns an unbuffered file that Streamlit reads straight
+    into the download, so the PDF is copied into memory once."""
+    return lambda: _DownloadFile(path)
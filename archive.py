@@ -0,0 +1,264 @@
+"""Read-only Parquet snapshots of closed years of the income and expense registers.
+
+``archive_year`` moves every row of one calendar year out of a live register
+into ``ARCHIVE_DIR/<table>/year=<YYYY>/part-<id>.parquet`` (zstd, sorted by
+date, one row group per ``CHUNK_SIZE`` rows) and records the file in
+``archived_partitions``, in the same transaction as the DELETE. Readers only
+see files listed there, so a crash half-way leaves either the live rows or
+the snapshot, never both.
+
+The ``register_summary`` rollup is not touched: archived rows stay counted
+in it, so whole-month report totals cost the same as before. The helpers
+below serve the few reads that need raw rows (edge days of a date range,
+drill-down entries, exports, rollup rebuild) from the snapshots, which are
+memory-mapped and pruned by year, row-group date statistics and column.
+Rows registered later with a date in an archived year stay in the live
+table and are read from there as usual.
+"""
+import os
+from dataclasses import dataclass
+from datetime import date, datetime
+
+from sqlalchemy import and_, delete, func, insert, or_, select, update
+
+from models import IncomeRegister, ExpenseRegister, ArchivedPartition
+
+ARCHIVE_DIR = os.environ.get("IMS_ARCHIVE_DIR", "archive")
+CHUNK_SIZE = 50_000
+KEYS = ('institute_id', 'class_id', 'section_id')
+
+# table -> (model, register_summary measure)
+REGISTERS = {
+    'income_register': (IncomeRegister, 'income'),
+    'expense_register': (ExpenseRegister, 'expense'),
+}
+
+
+@dataclass
+class ArchiveResult:
+    table: str
+    year: int
+    rows: int
+    amount: float
+    path: str
+    size_bytes: int
+
+
+def _schema(table):
+    import pyarrow as pa
+
+    types = {'date': pa.date32(), 'amount': pa.float64()}
+    return pa.schema([pa.field(c.name, types.get(c.name, pa.int64())) for c in table.columns])
+
+
+# --- Writing ---
+def archive_year(engine, table_name, year, chunk_size=CHUNK_SIZE):
+    """Move ``year`` of register ``table_name`` to a snapshot; ``None`` if it had no rows."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if year >= date.today().year:
+        raise ValueError(f"{year} is not a closed year")
+    table = REGISTERS[table_name][0].__table__
+    in_year = table.c.date.between(date(year, 1, 1), date(year, 12, 31))
+    schema = _schema(table)
+    rows, amount = 0, 0.0
+    tmp = path = None
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            # A write first, so on SQLite nothing else can change the year's
+            # rows before the commit (PostgreSQL locks them with FOR UPDATE).
+            part_id = conn.execute(insert(ArchivedPartition).values(
+                table_name=table_name, year=year, path=f"pending-{table_name}-{year}",
+                created_at=datetime.now(),
+            )).inserted_primary_key[0]
+            path = os.path.join(ARCHIVE_DIR, table_name, f"year={year}", f"part-{part_id:05d}.parquet")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + ".tmp"
+            stmt = (
+                select(*table.columns).where(in_year)
+                .order_by(table.c.date, table.c.id).with_for_update()
+            )
+            result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(stmt)
+            with pq.ParquetWriter(tmp, schema, compression='zstd') as writer:
+                for part in result.partitions(chunk_size):
+                    columns = list(zip(*part))
+                    writer.write_batch(pa.record_batch(
+                        [pa.array(col, type=f.type) for col, f in zip(columns, schema)],
+                        schema=schema,
+                    ))
+                    rows += len(part)
+                    amount += sum(r.amount or 0 for r in part)
+            if not rows:
+                trans.rollback()
+                os.remove(tmp)
+                return None
+            deleted = conn.execute(delete(table).where(in_year)).rowcount
+            if deleted != rows:
+                raise RuntimeError(f"{table_name} {year}: wrote {rows} rows but deleted {deleted}")
+            os.replace(tmp, path)
+            size = os.path.getsize(path)
+            conn.execute(
+                update(ArchivedPartition).where(ArchivedPartition.id == part_id)
+                .values(path=path, rows=rows, amount=amount, size_bytes=size)
+            )
+            trans.commit()
+        except BaseException:
+            trans.rollback()
+            for leftover in (tmp, path):
+                if leftover and os.path.exists(leftover):
+                    os.remove(leftover)
+            raise
+    return ArchiveResult(table_name, year, rows, amount, path, size)
+
+
+def archive_closed(engine, through, log=print):
+    """Archive every year up to ``through`` (and before this year) of both registers."""
+    last = min(through, date.today().year - 1)
+    done = []
+    for table_name, (model, _) in REGISTERS.items():
+        with engine.connect() as conn:
+            first = conn.execute(select(func.min(model.date))).scalar()
+        if first is None:
+            continue
+        for year in range(first.year, last + 1):
+            result = archive_year(engine, table_name, year)
+            if result:
+                log(f"{table_name} {year}: {result.rows:,} rows -> {result.path} "
+                    f"({result.size_bytes / 1e6:.1f} MB)")
+                done.append(result)
+    return done
+
+
+# --- Reading ---
+def partitions(conn, table_name=None):
+    """Catalog rows, oldest year first."""
+    stmt = select(ArchivedPartition).where(~ArchivedPartition.path.startswith("pending-"))
+    if table_name:
+        stmt = stmt.where(ArchivedPartition.table_name == table_name)
+    return conn.execute(stmt.order_by(ArchivedPartition.table_name, ArchivedPartition.year,
+                                      ArchivedPartition.id)).all()
+
+
+def _paths(conn, table_name, ranges):
+    """Snapshot files of ``table_name`` whose year overlaps one of ``ranges``."""
+    years = []
+    for lo, hi in ranges:
+        clauses = []
+        if lo:
+            clauses.append(ArchivedPartition.year >= lo.year)
+        if hi:
+            clauses.append(ArchivedPartition.year <= hi.year)
+        years.append(and_(*clauses) if clauses else True)
+    stmt = (
+        select(ArchivedPartition.path)
+        .where(ArchivedPartition.table_name == table_name,
+               ~ArchivedPartition.path.startswith("pending-"), or_(*years))
+        .order_by(ArchivedPartition.year, ArchivedPartition.id)
+    )
+    return [os.path.abspath(p) for p in conn.execute(stmt).scalars()]
+
+
+def _dataset(conn, table_name, ranges, keys, scope=None):
+    """``(dataset, filter)`` over the matching snapshots, or ``(None, None)``.
+
+    ``scope`` (see scoping.py) limits the rows to its institutes.
+    """
+    paths = _paths(conn, table_name, ranges)
+    if not paths:
+        return None, None
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+
+    dataset = ds.dataset(paths, format='parquet', schema=_schema(REGISTERS[table_name][0].__table__),
+                         filesystem=fs.LocalFileSystem(use_mmap=True))
+    day = ds.field('date')
+    spans = []
+    for lo, hi in ranges:
+        span = None
+        if lo:
+            span = day >= lo
+        if hi:
+            span = day <= hi if span is None else span & (day <= hi)
+        spans.append(span)
+    expr = None
+    if all(s is not None for s in spans):
+        for s in spans:
+            expr = s if expr is None else expr | s
+    for key, value in (keys or {}).items():
+        if value is not None:
+            match = ds.field(key) == value
+            expr = match if expr is None else expr & match
+    if scope is not None:
+        match = ds.field('institute_id').isin(sorted(scope.institute_ids))
+        expr = match if expr is None else expr & match
+    return dataset, expr
+
+
+def _range(filters):
+    return [(filters.start, filters.end)]
+
+
+def count(conn, table_name, filters, scope=None):
+    dataset, expr = _dataset(conn, table_name, _range(filters), filters.keys(), scope)
+    return dataset.count_rows(filter=expr) if dataset else 0
+
+
+def iter_chunks(conn, table_name, filters, chunk_size=CHUNK_SIZE, scope=None):
+    """Archived rows matching ``filters`` as lists of tuples in table column order."""
+    dataset, expr = _dataset(conn, table_name, _range(filters), filters.keys(), scope)
+    if dataset is None:
+        return
+    for batch in dataset.to_batches(filter=expr, batch_size=chunk_size):
+        if batch.num_rows:
+            yield list(zip(*(col.to_pylist() for col in batch.columns)))
+
+
+def totals(conn, table_name, ranges, keys=None, by=KEYS, scope=None):
+    """``[(*by, amount, rows)]`` of archived rows dated inside any of
+    ``ranges``, one per value of the ``by`` key columns."""
+    dataset, expr = _dataset(conn, table_name, ranges, keys, scope)
+    if dataset is None:
+        return []
+    t = dataset.to_table(columns=[*by, 'amount', 'id'], filter=expr)
+    if not t.num_rows:
+        return []
+    g = t.group_by(list(by)).aggregate([('amount', 'sum'), ('id', 'count')])
+    return list(zip(*(g[c].to_pylist() for c in (*by, 'amount_sum', 'id_count'))))
+
+
+def entries(conn, table_name, filters, limit, scope=None):
+    """The newest ``limit`` archived rows matching ``filters`` as
+    ``(id, date, amount, institute_id)``."""
+    dataset, expr = _dataset(conn, table_name, _range(filters), filters.keys(), scope)
+    if dataset is None:
+        return []
+    t = dataset.to_table(columns=['id', 'date', 'amount', 'institute_id'], filter=expr)
+    t = t.sort_by([('date', 'descending'), ('id', 'descending')]).slice(0, limit)
+    return list(zip(*(t[c].to_pylist() for c in t.column_names)))
+
+
+def buckets(conn):
+    """Archived amounts per ``register_summary`` bucket, as summaries deltas."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    out = {}
+    for table_name, (_, measure) in REGISTERS.items():
+        dataset, _ = _dataset(conn, table_name, [(None, None)], None)
+        if dataset is None:
+            continue
+        t = dataset.to_table(columns=[*KEYS, 'date', 'amount', 'id'])
+        t = pa.table({
+            **{k: pc.fill_null(t[k], 0) for k in KEYS},
+            'month': pc.strftime(pc.cast(t['date'], pa.timestamp('s')), format='%Y-%m'),
+            'amount': pc.fill_null(t['amount'], 0.0),
+            'id': t['id'],
+        })
+        g = t.group_by([*KEYS, 'month']).aggregate([('amount', 'sum'), ('id', 'count')])
+        for *key, amount, n in zip(*(g[c].to_pylist() for c in (*KEYS, 'month', 'amount_sum', 'id_count'))):
+            change = out.setdefault(tuple(key), {})
+            change[measure] = change.get(measure, 0.0) + amount
+            change[measure + '_count'] = change.get(measure + '_count', 0) + n
+    return out
@@ -0,0 +1,318 @@
+"""Append-only change log of every row written through the ORM.
+
+An ``after_flush`` hook records each insert, update and delete as an
+``AuditLog`` row (the changed columns with their old and new values) and
+keeps them in ``session.info`` until the transaction commits; a rollback
+drops them. Committed entries go onto a queue that one background thread
+writes in batches of up to ``BATCH_SIZE`` every ``FLUSH_SECONDS``, so a
+user's commit never waits for the audit insert. Anything still queued is
+written when the process exits. Entries of an engine that has since been
+disposed get a single attempt; if its database is gone they are dropped
+with a warning rather than retried.
+
+Bulk writes that skip the ORM log their rows with ``log_rows`` inside their
+own transaction (Compute All Shares does); CSV import and archiving are not
+itemised, their job rows record what ran.
+
+``state_at`` replays the log backwards from the live row, so it also
+answers for rows that existed before auditing started, as long as the
+column has not changed since.
+"""
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+import weakref
+from collections import defaultdict
+from datetime import date, datetime, time as dt_time
+
+from sqlalchemy import DDL, Date, DateTime, event, insert, inspect, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from models import Base, AuditLog, Job
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+FLUSH_SECONDS = 1.0
+RETRIES = 3
+# The log itself and the job queue's bookkeeping are not audited.
+SKIPPED = {AuditLog.__tablename__, Job.__tablename__}
+# (table, column) pairs whose values are not copied into the log.
+REDACTED = {('admins', 'password')}
+HIDDEN = "***"
+
+_queue = queue.Queue()
+_writer = None
+_writer_lock = threading.Lock()
+# Commits queued but not yet written, for ``flush`` to wait on.
+_outstanding = 0
+_written = threading.Condition()
+# Engines whose pool was disposed, e.g. scratch databases about to be removed.
+_disposed = weakref.WeakSet()
+
+
+# --- Capture ---
+def _track_old_values():
+    # Load the previous value when an attribute of an expired instance is
+    # overwritten, so the update can be logged with it.
+    for mapper in Base.registry.mappers:
+        for attr in mapper.column_attrs:
+            event.listen(getattr(mapper.class_, attr.key), 'set',
+                         lambda *args: None, active_history=True)
+
+
+_track_old_values()
+
+
+def _value(table, column, value):
+    if (table, column) in REDACTED and value is not None:
+        return HIDDEN
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _row_id(obj):
+    return ','.join(str(v) for v in inspect(obj).mapper.primary_key_from_instance(obj))
+
+
+def _entry(obj, action, now, admin_id):
+    state = inspect(obj)
+    table = state.mapper.local_table.name
+    if table in SKIPPED:
+        return None
+    changes = {}
+    for attr in state.mapper.column_attrs:
+        key = attr.key
+        if action == 'update':
+            history = state.attrs[key].history
+            if not history.has_changes():
+                continue
+            old = history.deleted[0] if history.deleted else None
+            new = history.added[0] if history.added else None
+            if old == new:
+                continue
+            changes[key] = [_value(table, key, old), _value(table, key, new)]
+        elif key in state.dict:
+            changes[key] = _value(table, key, state.dict[key])
+    if action == 'update' and not changes:
+        return None
+    return {
+        'changed_at': now, 'admin_id': admin_id, 'table_name': table,
+        'row_id': _row_id(obj), 'action': action,
+        'changes': json.dumps(changes, default=str),
+    }
+
+
+@event.listens_for(Session, 'before_flush')
+def _load_deleted(session, flush_context, instances):
+    # Deleted rows are gone after the flush; load their values while we can.
+    for obj in session.deleted:
+        state = inspect(obj)
+        if state.mapper.local_table.name not in SKIPPED:
+            for attr in state.mapper.column_attrs:
+                getattr(obj, attr.key)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect(session, flush_context):
+    now = datetime.now()
+    admin_id = session.info.get('admin_id')
+    # The flush's own list of deletes also has orphans removed by cascade,
+    # which session.deleted does not.
+    deleted = [state.obj() for state, (is_delete, list_only) in flush_context.states.items()
+               if is_delete and not list_only]
+    entries = [
+        e for action, objs in (('insert', session.new), ('update', session.dirty),
+                               ('delete', deleted))
+        for obj in objs
+        if (e := _entry(obj, action, now, admin_id)) is not None
+    ]
+    if entries:
+        session.info.setdefault('audit_pending', []).extend(entries)
+
+
+@event.listens_for(Session, 'after_commit')
+def _enqueue(session):
+    global _outstanding
+    entries = session.info.pop('audit_pending', None)
+    if entries:
+        with _written:
+            _outstanding += 1
+        _queue.put((session.get_bind(), entries))
+        _start_writer()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard(session):
+    session.info.pop('audit_pending', None)
+
+
+def log_rows(conn, model, rows, action='insert', admin_id=None):
+    """Log ``rows`` (dicts of column values, with the primary key) written
+    with Core statements on ``conn``. Written in the caller's transaction,
+    so they commit or roll back with the rows."""
+    table = model.__tablename__
+    now = datetime.now()
+    entries = [
+        {'changed_at': now, 'admin_id': admin_id, 'table_name': table,
+         'row_id': ','.join(str(row[c.key]) for c in inspect(model).primary_key),
+         'action': action,
+         'changes': json.dumps({k: _value(table, k, v) for k, v in row.items()}, default=str)}
+        for row in rows
+    ]
+    if entries:
+        conn.execute(insert(AuditLog), entries)
+    return len(entries)
+
+
+# --- Writer ---
+@event.listens_for(Engine, 'engine_disposed')
+def _mark_disposed(engine):
+    _disposed.add(engine)
+
+
+def _start_writer():
+    global _writer
+    if _writer is not None and _writer.is_alive():
+        return
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_write_forever, name="audit-writer", daemon=True)
+            _writer.start()
+
+
+def _drain(block):
+    """``({engine: entries}, commits)`` of about ``BATCH_SIZE`` entries at
+    most. With ``block``, waits for one commit and then up to
+    ``FLUSH_SECONDS`` for more."""
+    batches, n, commits = defaultdict(list), 0, 0
+    deadline = None
+    while n < BATCH_SIZE:
+        try:
+            if not block:
+                engine, entries = _queue.get_nowait()
+            elif deadline is None:
+                engine, entries = _queue.get()
+                deadline = time.monotonic() + FLUSH_SECONDS
+            else:
+                engine, entries = _queue.get(timeout=max(deadline - time.monotonic(), 0))
+        except queue.Empty:
+            break
+        batches[engine].extend(entries)
+        n += len(entries)
+        commits += 1
+    return batches, commits
+
+
+def _write(batches, commits):
+    global _outstanding
+    try:
+        for engine, entries in batches.items():
+            for attempt in range(1, RETRIES + 1):
+                try:
+                    with engine.begin() as conn:
+                        conn.execute(insert(AuditLog), entries)
+                    break
+                except Exception as e:
+                    if engine in _disposed:
+                        logger.warning("Dropped %d audit entries of a disposed engine: %s",
+                                       len(entries), e)
+                        break
+                    if attempt == RETRIES:
+                        logger.exception("Dropped %d audit entries after %d attempts",
+                                         len(entries), RETRIES)
+                    else:
+                        time.sleep(attempt)
+    finally:
+        with _written:
+            _outstanding -= commits
+            _written.notify_all()
+
+
+def _write_forever():
+    while True:
+        _write(*_drain(block=True))
+
+
+def flush(timeout=30):
+    """Write everything committed so far; True unless ``timeout`` ran out."""
+    while True:
+        batches, commits = _drain(block=False)
+        if not commits:
+            break
+        _write(batches, commits)
+    with _written:
+        return _written.wait_for(lambda: _outstanding <= 0, timeout)
+
+
+atexit.register(flush)
+
+
+# --- Point-in-time reads ---
+def _decode(model, column, value):
+    if value is None or value == HIDDEN:
+        return value
+    col_type = model.__table__.c[column].type
+    if isinstance(col_type, DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(col_type, Date):
+        return date.fromisoformat(value)
+    return value
+
+
+def history(conn, model, row_id, since=None):
+    """Log entries of one row, oldest first, with ``changes`` decoded."""
+    stmt = (
+        select(AuditLog.changed_at, AuditLog.admin_id, AuditLog.action, AuditLog.changes)
+        .where(AuditLog.table_name == model.__tablename__, AuditLog.row_id == str(row_id))
+        .order_by(AuditLog.changed_at, AuditLog.id)
+    )
+    if since is not None:
+        stmt = stmt.where(AuditLog.changed_at > since)
+    return [
+        (changed_at, admin_id, action, json.loads(changes))
+        for changed_at, admin_id, action, changes in conn.execute(stmt)
+    ]
+
+
+def state_at(conn, model, row_id, when):
+    """Column values of row ``row_id`` as they were at ``when`` (a datetime,
+    or a date meaning the end of that day); ``None`` if it did not exist."""
+    if not isinstance(when, datetime):
+        when = datetime.combine(when, dt_time.max)
+    pk = inspect(model).primary_key
+    keys = [c.key for c in inspect(model).column_attrs]
+    live = conn.execute(
+        select(*(getattr(model, k) for k in keys))
+        .where(*(c == c.type.python_type(v) for c, v in zip(pk, str(row_id).split(','))))
+    ).first()
+    state = dict(zip(keys, live)) if live is not None else None
+    # Undo everything logged after ``when``, newest first.
+    for _, _, action, changes in reversed(history(conn, model, row_id, since=when)):
+        if action == 'insert':
+            state = None
+        elif action == 'delete':
+            state = {k: _decode(model, k, v) for k, v in changes.items()}
+        elif state is not None:
+            for k, (old, _) in changes.items():
+                state[k] = _decode(model, k, old)
+    return state
+
+
+def value_at(conn, model, row_id, column, when):
+    """e.g. ``value_at(conn, Institute, 7, 'rate_per_student', date(2024, 3, 1))``."""
+    state = state_at(conn, model, row_id, when)
+    return None if state is None else state[column]
+
+
+# SQLite refuses to change or remove logged rows.
+for _op in ('UPDATE', 'DELETE'):
+    event.listen(AuditLog.__table__, 'after_create', DDL(
+        f"CREATE TRIGGER audit_log_no_{_op.lower()} BEFORE {_op} ON audit_log "
+        f"BEGIN SELECT RAISE(ABORT, 'audit_log is append-only'); END"
+    ).execute_if(dialect='sqlite'))
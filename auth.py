@@ -0,0 +1,192 @@
+"""Admin passwords, logins and the sessions that follow them.
+
+Passwords are stored as ``scrypt$<n>$<r>$<p>$<salt>$<hash>``. The cost
+``n`` comes from ``IMS_SCRYPT_N``; raising it makes every guess dearer, and
+each admin's hash is upgraded to the new cost at their next login.
+
+The slow KDF runs once, in ``login``. It hands back a token signed with
+``SECRET_KEY`` that the app keeps in the browser session; ``current`` checks
+the signature and looks the session up in an in-memory store, so
+authorising a rerun costs a few microseconds and no query. Sessions end
+after ``SESSION_HOURS``, after ``IDLE_MINUTES`` without a rerun, on logout,
+or when the server restarts.
+
+Failed attempts are counted per user id; after ``MAX_FAILURES`` within
+``LOCKOUT_SECONDS`` the id is locked for the rest of that window. Unknown
+ids run the KDF too, so timing does not tell which ids exist. Counts expire
+with their window and at most ``MAX_TRACKED_IDS`` ids are counted at once,
+so guessing many different ids cannot grow the table without limit.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import select
+
+from models import Admin
+
+SCHEME = "scrypt"
+SCRYPT_N = int(os.environ.get("IMS_SCRYPT_N", 2 ** 16))
+SCRYPT_R = 8
+SCRYPT_P = 1
+SESSION_HOURS = float(os.environ.get("IMS_SESSION_HOURS", 12))
+IDLE_MINUTES = float(os.environ.get("IMS_SESSION_IDLE_MINUTES", 60))
+MAX_FAILURES = 5
+LOCKOUT_SECONDS = 300
+MAX_TRACKED_IDS = 10_000
+# Without IMS_SECRET_KEY a key is made per process; sessions do not outlive
+# the process anyway.
+SECRET_KEY = os.environ.get("IMS_SECRET_KEY", "").encode() or secrets.token_bytes(32)
+
+
+class LoginError(Exception):
+    pass
+
+
+# --- Passwords ---
+def _b64(raw):
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r, dklen=32)
+
+
+def hash_password(password, n=None):
+    n = n or SCRYPT_N
+    salt = secrets.token_bytes(16)
+    digest = _scrypt(password, salt, n, SCRYPT_R, SCRYPT_P)
+    return f"{SCHEME}${n}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(digest)}"
+
+
+def is_hashed(stored):
+    return bool(stored) and stored.startswith(SCHEME + "$")
+
+
+def verify_password(password, stored):
+    if not is_hashed(stored):
+        return False
+    _, n, r, p, salt, digest = stored.split("$")
+    return hmac.compare_digest(_scrypt(password, _unb64(salt), int(n), int(r), int(p)),
+                               _unb64(digest))
+
+
+def needs_rehash(stored):
+    return stored.split("$")[1:4] != [str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P)]
+
+
+# Verified against for unknown user ids, so they cost as much as a wrong password.
+_DUMMY = hash_password(secrets.token_urlsafe())
+
+
+# --- Sessions ---
+@dataclass
+class LoginSession:
+    admin_id: int
+    name: str
+    expires: float
+    last_seen: float
+
+
+_sessions = {}
+# user id -> failure times, ordered by the latest failure (oldest first)
+_failures = {}
+_lock = threading.Lock()
+
+
+def _sign(payload):
+    return _b64(hmac.new(SECRET_KEY, payload.encode(), hashlib.sha256).digest())
+
+
+def current(token):
+    """The live ``LoginSession`` for ``token``, or ``None``."""
+    if not token:
+        return None
+    payload, _, signature = token.rpartition(".")
+    if not hmac.compare_digest(_sign(payload), signature):
+        return None
+    found = _sessions.get(payload)
+    now = time.time()
+    if found is None or now > found.expires or now - found.last_seen > IDLE_MINUTES * 60:
+        _sessions.pop(payload, None)
+        return None
+    found.last_seen = now
+    return found
+
+
+def _locked(user_id, now):
+    recent = [t for t in _failures.get(user_id, ()) if now - t < LOCKOUT_SECONDS]
+    if recent:
+        _failures[user_id] = recent
+    else:
+        _failures.pop(user_id, None)
+    return len(recent) >= MAX_FAILURES
+
+
+def _failed(user_id, now):
+    _failures[user_id] = _failures.pop(user_id, []) + [now]
+    # Beyond the cap the ids failed longest ago are forgotten first.
+    while len(_failures) > MAX_TRACKED_IDS:
+        del _failures[next(iter(_failures))]
+
+
+def _sweep(now):
+    while _failures:
+        user_id, times = next(iter(_failures.items()))
+        if now - times[-1] < LOCKOUT_SECONDS:
+            break
+        del _failures[user_id]
+
+
+def login(session, user_id, password):
+    """Check the credentials and return a session token, or raise ``LoginError``."""
+    user_id = (user_id or "").strip()
+    now = time.time()
+    with _lock:
+        _sweep(now)
+        if _locked(user_id, now):
+            raise LoginError("Too many failed attempts. Try again in a few minutes.")
+    admin = session.execute(select(Admin).where(Admin.user_id == user_id)).scalar()
+    stored = admin.password if admin is not None and is_hashed(admin.password) else _DUMMY
+    if not verify_password(password or "", stored) or stored is _DUMMY:
+        with _lock:
+            _failed(user_id, now)
+        raise LoginError("Wrong user id or password.")
+    if needs_rehash(stored):
+        admin.password = hash_password(password)
+        session.commit()
+    with _lock:
+        _failures.pop(user_id, None)
+        _purge(now)
+        payload = f"{admin.id}.{secrets.token_urlsafe(24)}"
+        _sessions[payload] = LoginSession(admin.id, admin.name or admin.user_id,
+                                          now + SESSION_HOURS * 3600, now)
+    return f"{payload}.{_sign(payload)}"
+
+
+def logout(token):
+    if token:
+        _sessions.pop(token.rpartition(".")[0], None)
+
+
+def end_sessions(admin_id):
+    """Sign ``admin_id`` out everywhere, e.g. after a password change."""
+    with _lock:
+        for payload in [k for k, s in _sessions.items() if s.admin_id == admin_id]:
+            del _sessions[payload]
+
+
+def _purge(now):
+    for payload in [k for k, s in _sessions.items()
+                    if now > s.expires or now - s.last_seen > IDLE_MINUTES * 60]:
+        del _sessions[payload]
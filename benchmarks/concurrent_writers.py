@@ -0,0 +1,149 @@
+"""Throughput of N staff saving income entries at the same time.
+
+Each writer thread opens its own ORM session and logs ``--writes`` income
+rows one commit at a time, as the Accounts form does (so the rollup hooks
+run too), while reader threads keep running the profit/loss report. Runs
+against a scratch SQLite file (never ``institutes.db``) twice, with the old
+bare engine and with ``db.make_engine``'s WAL/busy-timeout settings, or once
+against ``--url`` (e.g. a PostgreSQL database you can throw away):
+
+    python -m benchmarks.concurrent_writers --writers 1 4 16
+    python -m benchmarks.concurrent_writers --url postgresql+psycopg2://ims@localhost/ims_bench
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, delete, insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+import audit
+import db
+import migrations
+import reports
+from models import Institute, ClassModel, Section, Assignment, IncomeRegister, RegisterSummary
+
+# Readers and writers share one stats dict; += on its values is not atomic.
+_stats_lock = threading.Lock()
+
+
+def setup(engine, institutes=50, classes=10):
+    migrations.upgrade(engine, log=lambda *a: None)
+    with engine.begin() as conn:
+        for model in (IncomeRegister, RegisterSummary, Assignment, Section, ClassModel, Institute):
+            conn.execute(delete(model))
+        conn.execute(insert(Institute), [
+            {"id": i, "name": f"Institute {i}", "rate_per_student": 1000}
+            for i in range(1, institutes + 1)
+        ])
+        conn.execute(insert(ClassModel), [{"id": c, "name": f"Class {c}"} for c in range(1, classes + 1)])
+        conn.execute(insert(Section), [
+            {"id": c, "class_id": c, "name": "A", "start_date": date(2024, 1, 1),
+             "end_date": date(2024, 12, 31), "duration_months": 11}
+            for c in range(1, classes + 1)
+        ])
+    return institutes, classes
+
+
+def _writer(Session, n, keys, seed, stats):
+    rnd = random.Random(seed)
+    institutes, classes = keys
+    for _ in range(n):
+        c = rnd.randint(1, classes)
+        t0 = time.perf_counter()
+        with Session() as session:
+            session.add(IncomeRegister(
+                date=date(2024, 1, 1) + timedelta(days=rnd.randrange(365)),
+                amount=round(rnd.uniform(100, 5000), 2),
+                institute_id=rnd.randint(1, institutes), class_id=c, section_id=c,
+            ))
+            try:
+                session.commit()
+            except OperationalError:
+                session.rollback()
+                with _stats_lock:
+                    stats["errors"] += 1
+                continue
+        with _stats_lock:
+            stats["latencies"].append(time.perf_counter() - t0)
+
+
+def _reader(Session, stop, stats):
+    while not stop.is_set():
+        with Session() as session:
+            try:
+                reports.profit_loss_by_institute(session).all()
+                with _stats_lock:
+                    stats["reads"] += 1
+            except OperationalError:
+                with _stats_lock:
+                    stats["read_errors"] += 1
+
+
+def run(engine, writers, writes, readers, keys):
+    Session = sessionmaker(bind=engine)
+    stats = {"latencies": [], "errors": 0, "reads": 0, "read_errors": 0}
+    stop = threading.Event()
+    reader_threads = [threading.Thread(target=_reader, args=(Session, stop, stats)) for _ in range(readers)]
+    writer_threads = [
+        threading.Thread(target=_writer, args=(Session, writes, keys, i, stats))
+        for i in range(writers)
+    ]
+    t0 = time.perf_counter()
+    for t in reader_threads + writer_threads:
+        t.start()
+    for t in writer_threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    for t in reader_threads:
+        t.join()
+    lat = sorted(stats["latencies"])
+    return {
+        "commits/s": len(lat) / elapsed,
+        "p95 ms": lat[int(0.95 * (len(lat) - 1))] * 1000 if lat else 0.0,
+        "errors": stats["errors"],
+        "reads/s": stats["reads"] / elapsed,
+        "read errors": stats["read_errors"],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--writes", type=int, default=200, help="commits per writer")
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--url", help="database to use instead of a scratch SQLite file")
+    args = parser.parse_args(argv)
+    pool = max(args.writers) + args.readers
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.url:
+            engines = [("configured", db.make_engine(args.url, pool_size=pool, max_overflow=0))]
+        else:
+            url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+            engines = [
+                # What db.py used to build: rollback journal, 5 s lock wait.
+                ("sqlite default", create_engine(url, pool_size=pool, max_overflow=0)),
+                ("sqlite tuned", db.make_engine(url, pool_size=pool, max_overflow=0)),
+            ]
+        print(f"{'engine':<16}{'writers':>8}{'commits/s':>11}{'p95 ms':>9}{'errors':>8}{'reads/s':>9}{'read err':>9}")
+        for label, engine in engines:
+            for writers in args.writers:
+                keys = setup(engine)
+                r = run(engine, writers, args.writes, args.readers, keys)
+                print(f"{label:<16}{writers:>8}{r['commits/s']:>11.0f}{r['p95 ms']:>9.1f}"
+                      f"{r['errors']:>8}{r['reads/s']:>9.1f}{r['read errors']:>9}")
+            # The change log is written in the background; finish it while
+            # the scratch file still exists.
+            audit.flush()
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""Drive the app headlessly with concurrent scripted users.
+
+Each simulated user is a Streamlit ``AppTest`` session in its own process
+(``AppTest`` keeps global state, so two cannot run on threads of one
+process) against the shared database. It signs in as ``--user`` (by
+default the ``admin1`` that benchmarks.synthetic_data creates) and repeats
+four flows: register an institute, log an income entry, save an institute
+share and open Reports.
+Every interaction is timed; the view's query count and server-side time
+come from the ``?timing=1`` caption. Percentiles per interaction are
+printed, and can be saved as a baseline and compared on a later run:
+
+    python -m benchmarks.synthetic_data --url sqlite:////tmp/load.db
+    python -m benchmarks.load_test --url sqlite:////tmp/load.db --users 8 --json base.json
+    python -m benchmarks.load_test --url sqlite:////tmp/load.db --users 8 --baseline base.json
+
+The flows write to the database, so point ``--url`` at a copy.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "software_app.py")
+_TIMING = re.compile(r": (\d+) queries in ([\d.]+) ms")
+
+
+class User:
+    def __init__(self, n, targets, seed, user_id="admin1", password="admin1"):
+        from streamlit.testing.v1 import AppTest
+
+        self.n = n
+        self.user_id, self.password = user_id, password
+        self.targets = targets
+        self.rnd = random.Random(seed)
+        self.at = AppTest.from_file(APP, default_timeout=120)
+        self.at.query_params["timing"] = "1"
+        self.samples = defaultdict(list)  # interaction -> [(seconds, queries, view ms)]
+        self.tab = "Registration"
+
+    def step(self, name):
+        # A browser sends the open tab with every rerun; AppTest does not.
+        self.at.session_state["active_tab"] = self.tab
+        t0 = time.perf_counter()
+        self.at.run()
+        elapsed = time.perf_counter() - t0
+        if self.at.exception:
+            raise RuntimeError(f"{name}: {self.at.exception[0].value}")
+        queries = view_ms = None
+        for caption in self.at.caption:
+            m = _TIMING.search(caption.value)
+            if m:
+                queries, view_ms = int(m.group(1)), float(m.group(2))
+        self.samples[name].append((elapsed, queries, view_ms))
+
+    def _open(self, tab, name):
+        self.tab = tab
+        self.step(name)
+
+    def _widget(self, kind, label):
+        return next(w for w in getattr(self.at, kind) if w.label == label)
+
+    # --- Flows ---
+    def sign_in(self):
+        self.step("first load")
+        self.at.text_input(key="login_uid").input(self.user_id)
+        self.at.text_input(key="login_pwd").input(self.password)
+        self._widget("button", "Sign In").click()
+        self.step("sign in")
+        if "auth_token" not in self.at.session_state:
+            problems = [e.value for e in self.at.error] or ["the sign-in screen did not go away"]
+            raise RuntimeError(f"sign in as {self.user_id}: {problems[0]}")
+
+    def register_institute(self):
+        self._open("Registration", "open registration")
+        self._widget("text_input", "Institute Name").input(f"Load test {self.n}-{self.rnd.randrange(10**6)}")
+        self._widget("number_input", "Rate Per Student").set_value(self.rnd.randint(500, 5000))
+        self._widget("button", "Register Institute").click()
+        self.step("register institute")
+
+    def log_income(self):
+        self._open("Accounts", "open accounts")
+        self.at.selectbox(key="inc_inst").select(self.rnd.choice(self.targets))
+        self.step("pick institute")
+        self._widget("number_input", "Amount Received").set_value(round(self.rnd.uniform(100, 50_000), 2))
+        self._widget("button", "Log Income").click()
+        self.step("log income")
+
+    def save_share(self):
+        self._open("Accounts", "open accounts")
+        self.at.selectbox(key="share_inst").select(self.rnd.choice(self.targets))
+        self.step("pick institute")
+        self._widget("button", "Save Share").click()
+        self.step("save share")
+
+    def open_reports(self):
+        self._open("Reports", "open reports")
+
+    FLOWS = (register_institute, log_income, save_share, open_reports)
+
+    def run(self, iterations):
+        """Play the flows; returns an error message, or None."""
+        try:
+            self.sign_in()
+            for _ in range(iterations):
+                for flow in self.FLOWS:
+                    flow(self)
+        except Exception as e:
+            return f"user {self.n}: {e!r}"
+        return None
+
+
+def run_user(n, targets, seed, iterations, user_id, password):
+    user = User(n, targets, seed, user_id, password)
+    error = user.run(iterations)
+    return dict(user.samples), error
+
+
+def _pct(values, p):
+    values = sorted(v for v in values if v is not None)
+    return values[min(len(values) - 1, int(p * len(values)))] if values else None
+
+
+def summarize(per_user):
+    merged = defaultdict(list)
+    for samples_by_name in per_user:
+        for name, samples in samples_by_name.items():
+            merged[name].extend(samples)
+    return {
+        name: {
+            "n": len(samples),
+            "p50 ms": _pct([s[0] for s in samples], 0.5) * 1000,
+            "p95 ms": _pct([s[0] for s in samples], 0.95) * 1000,
+            "p99 ms": _pct([s[0] for s in samples], 0.99) * 1000,
+            "view p95 ms": _pct([s[2] for s in samples], 0.95),
+            "queries p50": _pct([s[1] for s in samples], 0.5),
+            "queries max": max((s[1] for s in samples if s[1] is not None), default=None),
+        }
+        for name, samples in merged.items()
+    }
+
+
+def compare(result, baseline, tolerance):
+    """Interactions whose p95 grew by more than ``tolerance`` or that run more queries."""
+    problems = []
+    for name, base in baseline.items():
+        now = result.get(name)
+        if now is None:
+            continue
+        if now["p95 ms"] > base["p95 ms"] * (1 + tolerance):
+            problems.append(f"{name}: p95 {base['p95 ms']:.0f} -> {now['p95 ms']:.0f} ms")
+        if (now["queries p50"] or 0) > (base["queries p50"] or 0):
+            problems.append(f"{name}: queries {base['queries p50']} -> {now['queries p50']}")
+    return problems
+
+
+def _fmt(v, spec):
+    # Missing values keep the column's width.
+    return format("-", spec.split(".")[0]) if v is None else format(v, spec)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", required=True, help="database to run against (a copy; flows write to it)")
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--iterations", type=int, default=5, help="flow rounds per user")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--user", default="admin1", help="admin every simulated user signs in as")
+    parser.add_argument("--password", default="admin1")
+    parser.add_argument("--json", help="write the summary here")
+    parser.add_argument("--baseline", help="summary from an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 growth over the baseline")
+    args = parser.parse_args(argv)
+
+    # The app builds its engine from this when it is first imported.
+    os.environ["IMS_DATABASE_URL"] = args.url
+    from sqlalchemy import select
+
+    import db
+    from models import Assignment
+
+    with db.Session() as session:
+        targets = list(session.execute(
+            select(Assignment.institute_id).distinct().order_by(Assignment.institute_id).limit(1000)
+        ).scalars())
+    if not targets:
+        parser.error("the database has no assignments; fill it with benchmarks.synthetic_data")
+
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.users) as pool:
+        outcomes = list(pool.map(
+            run_user, range(args.users), [targets] * args.users,
+            [args.seed + n for n in range(args.users)], [args.iterations] * args.users,
+            [args.user] * args.users, [args.password] * args.users,
+        ))
+    print(f"{args.users} users x {args.iterations} rounds in {time.perf_counter() - t0:.1f}s")
+    errors = [error for _, error in outcomes if error]
+
+    result = summarize(samples for samples, _ in outcomes)
+    print(f"{'interaction':<20}{'n':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'view p95':>10}{'queries':>9}{'max':>6}")
+    for name, r in result.items():
+        print(f"{name:<20}{r['n']:>6}{r['p50 ms']:>9.0f}{r['p95 ms']:>9.0f}{r['p99 ms']:>9.0f}"
+              f"{_fmt(r['view p95 ms'], '>10.1f')}{_fmt(r['queries p50'], '>9')}{_fmt(r['queries max'], '>6')}")
+    for e in errors:
+        print(f"error: {e}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+    status = 1 if errors else 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(result, json.load(f), args.tolerance)
+        for p in problems:
+            print(f"regression: {p}")
+        status = status or (1 if problems else 0)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""Time the report aggregations with and without the migration 1 indexes.
+
+Builds a scratch SQLite database (never ``institutes.db``), fills each
+register with ``--rows`` entries, runs the raw register aggregations against
+the bare tables, applies the migrations and runs them again. The last
+column times the same reports as the app now runs them, from the
+``register_summary`` rollup.
+
+    python -m benchmarks.report_indexes --rows 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, func, insert, text
+from sqlalchemy.orm import sessionmaker
+
+import migrations
+import reports
+from models import (
+    Base, Institute, ClassModel, Section, IncomeRegister, ExpenseRegister
+)
+
+
+def _by_class(model, label):
+    def build(session):
+        return (
+            session.query(ClassModel.name.label('Class'), func.sum(model.amount).label(label))
+            .join(model, model.class_id == ClassModel.id)
+            .group_by(ClassModel.name)
+        )
+    return build
+
+
+def _by_institute(model, label):
+    def build(session):
+        return (
+            session.query(
+                Institute.name.label('Institute'),
+                func.coalesce(func.sum(model.amount), 0).label(label)
+            )
+            .outerjoin(model, model.institute_id == Institute.id)
+            .group_by(Institute.name)
+        )
+    return build
+
+
+# (label, raw register query, query the app runs instead). The app answers
+# both institute-wise sums with the single profit/loss statement.
+REPORTS = [
+    ("income by class", _by_class(IncomeRegister, 'Total Income'), reports.income_by_class),
+    ("expense by class", _by_class(ExpenseRegister, 'Total Expense'), reports.expense_by_class),
+    ("income by institute", _by_institute(IncomeRegister, 'Income'), reports.profit_loss_by_institute),
+    ("expense by institute", _by_institute(ExpenseRegister, 'Expense'), reports.profit_loss_by_institute),
+]
+
+
+def populate(engine, rows, institutes, classes, sections_per_class, seed=1):
+    # Register rows follow assignments: each section runs for 6-12 months
+    # and is taught at 1-3 institutes, and entries fall inside that window.
+    rnd = random.Random(seed)
+    start = date(2015, 1, 1)
+    sections, assignments = [], []
+    for c in range(1, classes + 1):
+        for s in range(1, sections_per_class + 1):
+            begins = start + timedelta(days=rnd.randrange(3300))
+            sec = {"id": len(sections) + 1, "class_id": c, "name": f"S{s}",
+                   "start_date": begins,
+                   "end_date": begins + timedelta(days=30 * rnd.randint(6, 12))}
+            sections.append(sec)
+            for inst in rnd.sample(range(1, institutes + 1), rnd.randint(1, 3)):
+                assignments.append((inst, sec))
+
+    with engine.begin() as conn:
+        conn.execute(insert(Institute), [
+            {"id": i, "name": f"Institute {i}", "rate_per_student": rnd.randint(500, 5000)}
+            for i in range(1, institutes + 1)
+        ])
+        conn.execute(insert(ClassModel), [
+            {"id": c, "name": f"Class {c}", "agency": f"Agency {c % 7}"}
+            for c in range(1, classes + 1)
+        ])
+        conn.execute(insert(Section), sections)
+
+    for model in (IncomeRegister, ExpenseRegister):
+        done = 0
+        while done < rows:
+            batch = []
+            for _ in range(min(50_000, rows - done)):
+                inst, sec = rnd.choice(assignments)
+                days = (sec["end_date"] - sec["start_date"]).days
+                batch.append({
+                    "date": sec["start_date"] + timedelta(days=rnd.randrange(days)),
+                    "amount": round(rnd.uniform(100, 50_000), 2),
+                    "institute_id": inst,
+                    "class_id": sec["class_id"],
+                    "section_id": sec["id"],
+                })
+            with engine.begin() as conn:
+                conn.execute(insert(model), batch)
+            done += len(batch)
+
+
+def time_reports(engine, repeat, rollup=False):
+    Session = sessionmaker(bind=engine)
+    results = {}
+    with Session() as session:
+        for label, raw, summary in REPORTS:
+            build = summary if rollup else raw
+            stmt = build(session).statement
+            best = float("inf")
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                session.execute(stmt).fetchall()
+                best = min(best, time.perf_counter() - t0)
+            results[label] = best
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000, help="rows per register")
+    parser.add_argument("--institutes", type=int, default=2_000)
+    parser.add_argument("--classes", type=int, default=200)
+    parser.add_argument("--sections-per-class", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        # Bare tables, as an old institutes.db would have them.
+        with engine.begin() as conn:
+            for table in Base.metadata.sorted_tables:
+                table.create(conn)
+                for index in table.indexes:
+                    index.drop(conn)
+        print(f"Populating {args.rows:,} rows per register ...")
+        populate(engine, args.rows, args.institutes, args.classes, args.sections_per_class)
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+
+        before = time_reports(engine, args.repeat)
+        migrations.upgrade(engine)
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+        after = time_reports(engine, args.repeat)
+        rollup = time_reports(engine, args.repeat, rollup=True)
+        engine.dispose()
+
+    print(f"{'report':<24}{'no indexes':>12}{'indexed':>12}{'speedup':>10}{'rollup':>12}")
+    for label, _, _ in REPORTS:
+        b, a, r = before[label], after[label], rollup[label]
+        print(f"{label:<24}{b * 1000:>10.1f}ms{a * 1000:>10.1f}ms{b / a:>9.1f}x{r * 1000:>10.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Fill an empty database with realistic synthetic data for load testing.
+
+Every model gets rows: institutes with skewed popularity, classes with
+sections that run for 3-12 months, assignments of those sections to
+institutes, register entries dated inside their section's run, share
+payouts after a section ends, letters and a few admins (``admin1`` to
+``admin5``, each with its user id as password and access to all
+institutes). Rows go in with Core executemany batches and the
+``register_summary`` rollup is rebuilt at the end, as after a bulk import.
+
+    python -m benchmarks.synthetic_data --url sqlite:////tmp/load.db \\
+        --institutes 10000 --assignments 100000 --register-rows 1000000
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import func, insert, select
+
+import auth
+import db
+import migrations
+import summaries
+from models import (
+    Institute, ClassModel, Section, Assignment, LetterDispatch, LetterReceive,
+    IncomeRegister, ExpenseRegister, InstituteShare, Admin
+)
+
+BATCH_SIZE = 50_000
+FIRST_DAY = date(2015, 1, 1)
+LAST_DAY = date(2025, 12, 31)
+AGENCIES = ("NAVTTC", "TEVTA", "PSDF", "BISP", "USAID", "Private")
+
+
+def _add_months(d, months):
+    y, m = divmod(d.month - 1 + months, 12)
+    return d.replace(year=d.year + y, month=m + 1, day=min(d.day, 28))
+
+
+def _random_day(rnd, lo, hi):
+    return lo + timedelta(days=rnd.randrange(max((hi - lo).days, 1)))
+
+
+def _insert(engine, model, rows):
+    """Insert an iterable of row dicts in ``BATCH_SIZE`` transactions."""
+    batch, total = [], 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            with engine.begin() as conn:
+                conn.execute(insert(model), batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        with engine.begin() as conn:
+            conn.execute(insert(model), batch)
+        total += len(batch)
+    return total
+
+
+def populate(engine, institutes=10_000, classes=500, assignments=100_000,
+             register_rows=1_000_000, letters=50_000, seed=1, log=print):
+    """Fill ``engine``'s (empty, migrated) database; returns rows per table."""
+    rnd = random.Random(seed)
+    counts = {}
+
+    rates = [int(rnd.lognormvariate(7.3, 0.5)) for _ in range(institutes)]
+    counts['institutes'] = _insert(engine, Institute, (
+        {"id": i, "name": f"Institute {i}", "address": f"{rnd.randint(1, 300)} Main Road, City {i % 97}",
+         "focal_person": f"Focal Person {i}", "contact": f"03{rnd.randint(0, 10**9):09d}",
+         "agreement_date": _random_day(rnd, FIRST_DAY, LAST_DAY), "rate_per_student": rates[i - 1]}
+        for i in range(1, institutes + 1)
+    ))
+    counts['classes'] = _insert(engine, ClassModel, (
+        {"id": c, "name": f"Class {c}", "agency": rnd.choice(AGENCIES)}
+        for c in range(1, classes + 1)
+    ))
+
+    # Each section needs several institutes for the assignments to fit.
+    sections = []
+    per_class = max(1, assignments // (classes * 8))
+    for c in range(1, classes + 1):
+        for n in range(rnd.randint(1, 2 * per_class)):
+            months = rnd.randint(3, 12)
+            start = _random_day(rnd, FIRST_DAY, _add_months(LAST_DAY, -months))
+            sections.append({
+                "id": len(sections) + 1, "class_id": c, "name": f"Section {chr(65 + n % 26)}{n // 26 or ''}",
+                "start_date": start, "end_date": _add_months(start, months), "duration_months": months,
+            })
+    counts['sections'] = _insert(engine, Section, sections)
+
+    # A few institutes take most of the sections (Pareto weights).
+    weights = [rnd.paretovariate(1.2) for _ in range(institutes)]
+    target = min(assignments, len(sections) * institutes)
+    pairs = set()
+    while len(pairs) < target:
+        for inst in rnd.choices(range(1, institutes + 1), weights, k=target - len(pairs)):
+            pairs.add((inst, rnd.randrange(len(sections))))
+    assigned = [
+        (inst, sections[s], max(5, int(rnd.gauss(30, 10))))
+        for inst, s in sorted(pairs)
+    ]
+    counts['assignments'] = _insert(engine, Assignment, (
+        {"id": n, "institute_id": inst, "class_id": sec["class_id"],
+         "section_id": sec["id"], "total_students": students}
+        for n, (inst, sec, students) in enumerate(assigned, 1)
+    ))
+    log(f"  {len(sections):,} sections, {len(assigned):,} assignments")
+
+    # Bigger classes book more entries.
+    by_size = [students for _, _, students in assigned]
+
+    def entries(n, low, high):
+        for a in rnd.choices(range(len(assigned)), by_size, k=n):
+            inst, sec, students = assigned[a]
+            yield {
+                "date": _random_day(rnd, sec["start_date"], sec["end_date"]),
+                "amount": round(students * rates[inst - 1] * rnd.uniform(low, high), 2),
+                "institute_id": inst, "class_id": sec["class_id"], "section_id": sec["id"],
+            }
+
+    counts['income_register'] = _insert(engine, IncomeRegister, entries(register_rows, 0.2, 1.2))
+    log(f"  {counts['income_register']:,} income rows")
+    counts['expense_register'] = _insert(engine, ExpenseRegister, entries(register_rows // 2, 0.05, 0.6))
+    log(f"  {counts['expense_register']:,} expense rows")
+
+    counts['institute_share'] = _insert(engine, InstituteShare, (
+        {"institute_id": inst, "class_id": sec["class_id"], "section_id": sec["id"],
+         "total_students": students, "rate_per_student": rates[inst - 1],
+         "duration_months": sec["duration_months"],
+         "total_amount": students * rates[inst - 1] * sec["duration_months"],
+         "paid_date": sec["end_date"] + timedelta(days=rnd.randint(0, 60))}
+        for inst, sec, students in assigned
+        if sec["end_date"] < LAST_DAY and rnd.random() < 0.6
+    ))
+    counts['letters_dispatch'] = _insert(engine, LetterDispatch, (
+        {"date": _random_day(rnd, FIRST_DAY, LAST_DAY), "reference": f"D-{n:07d}",
+         "recipient": f"Institute {rnd.randint(1, institutes)}"}
+        for n in range(1, letters + 1)
+    ))
+    counts['letters_receive'] = _insert(engine, LetterReceive, (
+        {"date": _random_day(rnd, FIRST_DAY, LAST_DAY), "reference": f"R-{n:07d}",
+         "sender": f"Institute {rnd.randint(1, institutes)}"}
+        for n in range(1, letters + 1)
+    ))
+    counts['admins'] = _insert(engine, Admin, (
+        {"name": f"Admin {n}", "designation": "Accounts Officer", "user_id": f"admin{n}",
+         "password": auth.hash_password(f"admin{n}"), "institute_permission": "all",
+         "all_institutes": True}
+        for n in range(1, 6)
+    ))
+
+    log("  rebuilding register_summary ...")
+    with engine.begin() as conn:
+        counts['register_summary'] = summaries.rebuild(conn)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", required=True, help="empty database to fill (never institutes.db)")
+    parser.add_argument("--institutes", type=int, default=10_000)
+    parser.add_argument("--classes", type=int, default=500)
+    parser.add_argument("--assignments", type=int, default=100_000)
+    parser.add_argument("--register-rows", type=int, default=1_000_000, help="income rows; expense gets half")
+    parser.add_argument("--letters", type=int, default=50_000, help="per letter register")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    engine = db.make_engine(args.url)
+    migrations.upgrade(engine, log=lambda *a: None)
+    with engine.connect() as conn:
+        if conn.execute(select(func.count()).select_from(Institute)).scalar():
+            parser.error("the target database already has institutes")
+    t0 = time.perf_counter()
+    counts = populate(engine, args.institutes, args.classes, args.assignments,
+                      args.register_rows, args.letters, args.seed)
+    for table, n in counts.items():
+        print(f"{table:<20}{n:>12,}")
+    print(f"done in {time.perf_counter() - t0:.0f}s")
+
+
+if __name__ == "__main__":
+    main()
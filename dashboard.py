@@ -0,0 +1,186 @@
+"""Headline figures and charts for the Dashboard tab.
+
+Money figures come from ``register_summary``, the monthly rollup that
+summaries.py keeps up to date on every write, so a KPI reads a handful of
+buckets instead of the registers. Each result is cached per permission
+scope and reused until a commit touches one of its tables (the generations
+of refdata.py) or ``TTL`` seconds pass, which also picks up writes made by
+other processes such as ``manage.py``. Outstanding shares are priced day by
+day against the rate history, so they are cached on their own and an income
+or expense entry does not reprice every unpaid assignment. At most
+``MAX_ENTRIES`` results are kept, the least recently used dropped first.
+
+Trends over long ranges are downsampled to at most ``MAX_POINTS`` points by
+summing months into quarters, half-years or years.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+
+from sqlalchemy import case, func, select
+
+import refdata
+import scoping
+import shares
+from models import Assignment, ClassModel, Institute, RegisterSummary
+
+TTL = float(os.environ.get("IMS_DASHBOARD_TTL", 300))
+MAX_ENTRIES = 256
+MAX_POINTS = 48
+# Months per point, smallest first.
+PERIODS = (1, 3, 6, 12, 24, 60)
+TOP_INSTITUTES = 8
+OTHERS = "Others"
+
+# metric -> tables whose writes invalidate it
+DEPENDS = {
+    'kpis': ('income_register', 'expense_register', 'assignments'),
+    'outstanding': ('institute_share', 'assignments', 'sections', 'institutes', 'institute_rates'),
+    'agencies': ('assignments', 'classes'),
+    'trend': ('income_register', 'institutes'),
+}
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+@dataclass
+class Kpis:
+    month: str
+    income: float
+    expense: float
+    last_income: float
+    last_expense: float
+    unpaid: int
+    outstanding: float
+    students: int
+    computed_at: float
+
+
+def _cached(metric, session, args, compute):
+    scope = scoping.current(session)
+    key = (metric, scope, args)
+    gen = refdata.generation(*DEPENDS[metric])
+    with _lock:
+        hit = _cache.pop(key, None)
+        if hit is not None and hit[0] == gen and time.time() - hit[1] < TTL:
+            _cache[key] = hit
+            return hit[2]
+    value = compute()
+    with _lock:
+        _cache[key] = (gen, time.time(), value)
+        while len(_cache) > MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return value
+
+
+def clear():
+    with _lock:
+        _cache.clear()
+
+
+def _month(d):
+    return f"{d:%Y-%m}"
+
+
+def _previous_month(d):
+    return date(d.year - (d.month == 1), (d.month - 2) % 12 + 1, 1)
+
+
+# --- Metrics ---
+def outstanding(session, ended_by):
+    """``(unpaid shares, their total)`` of sections ended by ``ended_by``."""
+    def compute():
+        unpaid, total, _ = shares.summary(session, ended_by=ended_by)
+        return unpaid, total
+    return _cached('outstanding', session, ended_by, compute)
+
+
+def kpis(session, today=None):
+    today = today or date.today()
+
+    def compute():
+        this, last = _month(today), _month(_previous_month(today))
+        totals = dict.fromkeys((this, last), (0.0, 0.0))
+        totals.update({
+            month: (income, expense)
+            for month, income, expense in session.execute(
+                select(RegisterSummary.month, func.sum(RegisterSummary.income),
+                       func.sum(RegisterSummary.expense))
+                .where(RegisterSummary.month.in_((this, last)))
+                .group_by(RegisterSummary.month)
+            )
+        })
+        students = session.execute(select(func.sum(Assignment.total_students))).scalar() or 0
+        return Kpis(this, *totals[this], *totals[last], *outstanding(session, today), students,
+                    time.time())
+
+    return _cached('kpis', session, today, compute)
+
+
+def students_per_agency(session):
+    """``[(agency, students)]``, most students first."""
+    def compute():
+        agency = func.coalesce(func.nullif(ClassModel.agency, ''), "Unspecified")
+        return session.execute(
+            select(agency, func.sum(Assignment.total_students))
+            .join(ClassModel, ClassModel.id == Assignment.class_id)
+            .group_by(agency).order_by(func.sum(Assignment.total_students).desc())
+        ).all()
+    return _cached('agencies', session, None, compute)
+
+
+def period_for(n_months):
+    """Months per point so ``n_months`` fit in ``MAX_POINTS``."""
+    return next((p for p in PERIODS if -(-n_months // p) <= MAX_POINTS), PERIODS[-1])
+
+
+def _bucket(month, period):
+    # Points start on month 1 of a year, so a quarter is Jan-Mar, Apr-Jun...
+    year, m = int(month[:4]), int(month[5:7])
+    index = (year * 12 + m - 1) // period * period
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def income_trend(session, start=None, end=None):
+    """``(period in months, [(point, institute, income)])`` for the
+    ``TOP_INSTITUTES`` institutes with the most income in the range, the
+    rest summed as ``OTHERS``. Institutes are labelled ``"<id>: <name>"``, so
+    two with the same name stay apart. ``start``/``end`` are dates (``None``
+    = open)."""
+    def compute():
+        in_range = [RegisterSummary.month != '']
+        if start:
+            in_range.append(RegisterSummary.month >= _month(start))
+        if end:
+            in_range.append(RegisterSummary.month <= _month(end))
+        first, last = session.execute(
+            select(func.min(RegisterSummary.month), func.max(RegisterSummary.month)).where(*in_range)
+        ).one()
+        if first is None:
+            return 1, []
+        n_months = (int(last[:4]) - int(first[:4])) * 12 + int(last[5:7]) - int(first[5:7]) + 1
+        period = period_for(n_months)
+        income = func.sum(RegisterSummary.income)
+        top = session.execute(
+            select(RegisterSummary.institute_id, Institute.name)
+            .join(Institute, Institute.id == RegisterSummary.institute_id)
+            .where(*in_range).group_by(RegisterSummary.institute_id, Institute.name)
+            .order_by(income.desc()).limit(TOP_INSTITUTES)
+        ).all()
+        labels = {institute_id: f"{institute_id}: {name}" for institute_id, name in top}
+        # Institutes outside the top share id 0, one row per month.
+        who = case((RegisterSummary.institute_id.in_(list(labels)), RegisterSummary.institute_id), else_=0)
+        points = {}
+        for month, institute_id, amount in session.execute(
+            select(RegisterSummary.month, who, income)
+            .where(*in_range).group_by(RegisterSummary.month, who)
+        ):
+            key = (_bucket(month, period), institute_id)
+            points[key] = points.get(key, 0.0) + (amount or 0.0)
+        return period, [(point, labels.get(institute_id, OTHERS), amount)
+                        for (point, institute_id), amount in sorted(points.items())]
+    return _cached('trend', session, (start, end), compute)
@@ -0,0 +1,100 @@
+import os
+import threading
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker
+
+import audit  # noqa: F401  (registers the change log hooks)
+import migrations
+import profiler
+import refdata  # noqa: F401  (registers the cache invalidation hooks)
+import scoping  # noqa: F401  (registers the permission filter)
+import search  # noqa: F401  (indexes new tables for full-text search)
+import summaries  # noqa: F401  (registers the rollup flush hooks)
+
+# --- Configuration ---
+# Read from the environment so a deployment can point the app at PostgreSQL,
+# e.g. IMS_DATABASE_URL=postgresql+psycopg2://ims:secret@db/ims
+DB_URL = os.environ.get("IMS_DATABASE_URL", "sqlite:///institutes.db")
+POOL_SIZE = int(os.environ.get("IMS_DB_POOL_SIZE", 5))
+MAX_OVERFLOW = int(os.environ.get("IMS_DB_MAX_OVERFLOW", 10))
+POOL_TIMEOUT = float(os.environ.get("IMS_DB_POOL_TIMEOUT", 30))  # seconds to wait for a connection
+POOL_RECYCLE = int(os.environ.get("IMS_DB_POOL_RECYCLE", 1800))  # seconds; server-side idle cutoffs
+# SQLite: how long a writer waits for the lock before "database is locked".
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("IMS_SQLITE_BUSY_TIMEOUT_MS", 10_000))
+SQLITE_CACHE_KIB = int(os.environ.get("IMS_SQLITE_CACHE_KIB", 16_384))
+SQLITE_MMAP_BYTES = int(os.environ.get("IMS_SQLITE_MMAP_BYTES", 256 * 1024 * 1024))
+
+
+def _sqlite_pragmas(dbapi_conn, connection_record):
+    # WAL lets readers run alongside the single writer, and NORMAL sync is
+    # durable in WAL mode except for the last commits before a power loss.
+    cursor = dbapi_conn.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KIB}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_BYTES}")
+    finally:
+        cursor.close()
+
+
+def make_engine(url=DB_URL, pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW,
+                pool_timeout=POOL_TIMEOUT, **kwargs):
+    """Engine for ``url`` with the pool and per-connection settings above."""
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        if url.database in (None, "", ":memory:"):
+            # One shared in-memory database; pool settings do not apply.
+            return create_engine(url, **kwargs)
+        engine = create_engine(
+            url, pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout,
+            connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+            **kwargs
+        )
+        event.listen(engine, "connect", _sqlite_pragmas)
+        return engine
+    return create_engine(
+        url, pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout,
+        pool_recycle=POOL_RECYCLE, pool_pre_ping=True, **kwargs
+    )
+
+
+# --- Database setup ---
+# One engine and one session factory per process. Streamlit re-executes the
+# app script on every interaction but imports this module only once.
+engine = make_engine()
+Session = sessionmaker(bind=engine)
+profiler.install(engine)
+
+
+def init_db(bind=None, log=print):
+    """Create missing tables and apply pending migrations. Safe to call repeatedly."""
+    return migrations.upgrade(bind or engine, log=log)
+
+
+class QueryCounter:
+    """Count statements this thread sends to ``engine`` inside a ``with`` block."""
+
+    def __init__(self, bind=None):
+        self.bind = bind or engine
+        self.count = 0
+        self.elapsed = 0.0
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == self._thread:
+            self.count += 1
+
+    def __enter__(self):
+        self._thread = threading.get_ident()
+        self._started = time.perf_counter()
+        event.listen(self.bind, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.bind, "before_cursor_execute", self._on_execute)
+        self.elapsed = time.perf_counter() - self._started
+        return False
@@ -0,0 +1,59 @@
+from sqlalchemy import func
+
+from models import Institute, ClassModel, Section, Assignment
+
+# Read-only snapshot behind the "Database State" view in the Accounts tab.
+# Each function is a single joined query; outer joins keep dangling foreign
+# keys visible as "Unknown" instead of dropping the row.
+
+UNKNOWN = "Unknown"
+
+
+def table_counts(session):
+    return session.query(
+        session.query(func.count(Institute.id)).scalar_subquery(),
+        session.query(func.count(ClassModel.id)).scalar_subquery(),
+        session.query(func.count(Section.id)).scalar_subquery(),
+        session.query(func.count(Assignment.id)).scalar_subquery(),
+    ).one()
+
+
+def institute_rows(session, limit, offset=0):
+    return (
+        session.query(Institute.id, Institute.name)
+        .order_by(Institute.id).limit(limit).offset(offset).all()
+    )
+
+
+def class_rows(session, limit, offset=0):
+    return (
+        session.query(ClassModel.id, ClassModel.name)
+        .order_by(ClassModel.id).limit(limit).offset(offset).all()
+    )
+
+
+def section_rows(session, limit, offset=0):
+    return (
+        session.query(
+            Section.id, Section.name,
+            func.coalesce(ClassModel.name, UNKNOWN)
+        )
+        .outerjoin(ClassModel, ClassModel.id == Section.class_id)
+        .order_by(Section.id).limit(limit).offset(offset).all()
+    )
+
+
+def assignment_rows(session, limit, offset=0):
+    return (
+        session.query(
+            Assignment.id,
+            func.coalesce(Institute.name, UNKNOWN),
+            func.coalesce(ClassModel.name, UNKNOWN),
+            func.coalesce(Section.name, UNKNOWN),
+            Assignment.total_students,
+        )
+        .outerjoin(Institute, Institute.id == Assignment.institute_id)
+        .outerjoin(ClassModel, ClassModel.id == Assignment.class_id)
+        .outerjoin(Section, Section.id == Assignment.section_id)
+        .order_by(Assignment.id).limit(limit).offset(offset).all()
+    )
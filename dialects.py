@@ -0,0 +1,10 @@
+# Backend-specific SQL constructs shared by the model helpers.
+
+
+def insert_for(conn):
+    """``insert`` supporting ``on_conflict_do_*`` for the connection's backend."""
+    if conn.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
@@ -0,0 +1,194 @@
+"""Chunked CSV, Excel and Parquet export of registers and reports.
+
+Rows are read through a server-side cursor ``CHUNK_SIZE`` at a time and
+written out before the next chunk is fetched, so memory stays bounded no
+matter how many rows the export covers. Register exports include the
+closed years kept in archive snapshots.
+"""
+import csv
+import io
+import itertools
+from datetime import date, datetime
+
+from sqlalchemy import Date, DateTime, Float, Integer, func, select
+
+import archive
+import reports
+import scoping
+from models import (
+    LetterDispatch, LetterReceive, IncomeRegister, ExpenseRegister, InstituteShare
+)
+
+CHUNK_SIZE = 10_000
+EXCEL_MAX_ROWS = 1_048_575  # per sheet, below the header row
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+# --- What can be exported ---
+def _register(model, date_col):
+    def build(session, filters):
+        # ORM attributes, not table columns, so scoping.restrict applies.
+        stmt = select(*(getattr(model, c.key) for c in model.__table__.columns)).order_by(model.id)
+        if filters.start:
+            stmt = stmt.where(date_col >= filters.start)
+        if filters.end:
+            stmt = stmt.where(date_col <= filters.end)
+        for key, value in filters.keys().items():
+            if value is not None and key in model.__table__.c:
+                stmt = stmt.where(model.__table__.c[key] == value)
+        return stmt
+    return build
+
+
+def _report(builder):
+    def build(session, filters):
+        return builder(session, filters).statement
+    return build
+
+
+EXPORTS = {
+    'letters_dispatch': ("Dispatch register", _register(LetterDispatch, LetterDispatch.date)),
+    'letters_receive': ("Receive register", _register(LetterReceive, LetterReceive.date)),
+    'income_register': ("Income register", _register(IncomeRegister, IncomeRegister.date)),
+    'expense_register': ("Expense register", _register(ExpenseRegister, ExpenseRegister.date)),
+    'institute_share': ("Institute share register", _register(InstituteShare, InstituteShare.paid_date)),
+    'income_by_class': ("Income statement (class wise)", _report(reports.income_by_class)),
+    'expense_by_class': ("Expense statement (class wise)", _report(reports.expense_by_class)),
+    'profit_loss': ("Profit/loss statement (institute wise)", _report(reports.profit_loss_by_institute)),
+}
+
+
+def statement(name, session, filters=reports.NO_FILTER, scope=None):
+    """Export ``name`` as a select, limited to ``scope`` (see scoping.py)."""
+    return scoping.restrict(EXPORTS[name][1](session, filters), scope)
+
+
+# --- Reading ---
+def iter_chunks(conn, stmt, chunk_size=CHUNK_SIZE):
+    """Yield lists of row tuples from a streaming (server-side) cursor."""
+    result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(stmt)
+    try:
+        for part in result.partitions(chunk_size):
+            yield [tuple(r) for r in part]
+    finally:
+        result.close()
+
+
+def row_count(conn, session, name, filters=reports.NO_FILTER, scope=None):
+    # Options on a subquery are ignored; restricting the outer select
+    # carries the filter into it.
+    stmt = select(func.count()).select_from(statement(name, session, filters).subquery())
+    n = conn.execute(scoping.restrict(stmt, scope)).scalar()
+    if name in archive.REGISTERS:
+        n += archive.count(conn, name, filters, scope)
+    return n
+
+
+def _reporting(chunks, progress):
+    done = 0
+    for chunk in chunks:
+        yield chunk
+        done += len(chunk)
+        progress(done)
+
+
+# --- Writers ---
+def write_csv(stmt, chunks, out):
+    """``out`` is a binary file object."""
+    text = io.TextIOWrapper(out, encoding='utf-8', newline='', write_through=True)
+    writer = csv.writer(text)
+    writer.writerow([c.name for c in stmt.selected_columns])
+    for chunk in chunks:
+        writer.writerows(chunk)
+    text.flush()
+    text.detach()
+
+
+def _excel_value(v):
+    # openpyxl rejects values it cannot type; keep dates, stringify the rest.
+    if v is None or isinstance(v, (int, float, str, date, datetime)):
+        return v
+    return str(v)
+
+
+def write_excel(stmt, chunks, out):
+    from openpyxl import Workbook
+
+    header = [c.name for c in stmt.selected_columns]
+    wb = Workbook(write_only=True)
+    ws, rows = None, EXCEL_MAX_ROWS
+    for chunk in chunks:
+        for row in chunk:
+            if rows == EXCEL_MAX_ROWS:
+                # Continue on a new sheet once one is full.
+                ws, rows = wb.create_sheet(), 0
+                ws.append(header)
+            ws.append([_excel_value(v) for v in row])
+            rows += 1
+    if ws is None:
+        wb.create_sheet().append(header)
+    wb.save(out)
+
+
+def parquet_schema(stmt):
+    import pyarrow as pa
+
+    fields = []
+    for col in stmt.selected_columns:
+        t = col.type
+        if isinstance(t, Integer):
+            pa_type = pa.int64()
+        elif isinstance(t, Float):
+            pa_type = pa.float64()
+        elif isinstance(t, DateTime):
+            pa_type = pa.timestamp('us')
+        elif isinstance(t, Date):
+            pa_type = pa.date32()
+        else:
+            pa_type = pa.string()
+        fields.append(pa.field(col.name, pa_type))
+    return pa.schema(fields)
+
+
+def write_parquet(stmt, chunks, out):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = parquet_schema(stmt)
+    with pq.ParquetWriter(out, schema, compression='zstd') as writer:
+        for chunk in chunks:
+            columns = list(zip(*chunk)) or [[] for _ in schema]
+            writer.write_batch(pa.record_batch(
+                [pa.array(col, type=f.type) for col, f in zip(columns, schema)],
+                schema=schema,
+            ))
+
+
+WRITERS = {'csv': write_csv, 'xlsx': write_excel, 'parquet': write_parquet}
+
+
+def export(engine, session, name, fmt, out, filters=reports.NO_FILTER, chunk_size=CHUNK_SIZE,
+           progress=None, scope=None):
+    """Write export ``name`` as ``fmt`` to the binary file object ``out``.
+
+    ``progress``, if given, is called with the number of rows written so far
+    after each chunk. ``scope`` limits the rows to an admin's institutes.
+    """
+    stmt = statement(name, session, filters, scope)
+    with engine.connect() as conn:
+        chunks = iter_chunks(conn, stmt, chunk_size)
+        if name in archive.REGISTERS:
+            # Archived closed years first; they predate every live row.
+            chunks = itertools.chain(archive.iter_chunks(conn, name, filters, chunk_size, scope), chunks)
+        if progress:
+            chunks = _reporting(chunks, progress)
+        WRITERS[fmt](stmt, chunks, out)
+
+
+def file_name(name, fmt):
+    return f"{name}_{date.today():%Y%m%d}.{FORMATS[fmt][1]}"
@@ -0,0 +1,337 @@
+"""Bulk CSV import for institutes, assignments and the registers.
+
+A file is read ``BATCH_SIZE`` rows at a time. Each batch is parsed, its
+institute/class/section references (an id, or a name) are resolved with
+one query per reference kind, and the valid rows are written with a single
+executemany. The whole file is one transaction: it is rolled back on a dry
+run, or when any row is invalid unless ``skip_errors`` is set.
+"""
+import csv
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date
+
+from sqlalchemy import insert, select, tuple_
+
+import rates
+import refdata
+import summaries
+from models import (
+    Institute, ClassModel, Section, Assignment, LetterDispatch, LetterReceive,
+    IncomeRegister, ExpenseRegister, InstituteShare, InstituteRate
+)
+
+BATCH_SIZE = 5_000
+# SQLite page cache for the import connection (negative = KiB). Index pages
+# stay hot across batches instead of being re-read for every executemany.
+SQLITE_IMPORT_CACHE_KIB = 65_536
+REFS = ('institute', 'class', 'section')
+
+
+# --- Field parsers ---
+def _text(value):
+    return value
+
+
+def _int(value):
+    return int(value)
+
+
+def _float(value):
+    return float(value)
+
+
+def _date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"'{value}' is not a YYYY-MM-DD date")
+
+
+@dataclass(frozen=True)
+class Target:
+    model: type
+    # column -> (parser, required)
+    fields: dict
+    refs: tuple = ()
+    # measure and (date, amount) columns for register_summary upkeep
+    rollup: tuple = None
+
+
+TARGETS = {
+    'institutes': Target(Institute, {
+        'name': (_text, True), 'address': (_text, False),
+        'focal_person': (_text, False), 'contact': (_text, False),
+        'agreement_date': (_date, False), 'rate_per_student': (_int, False),
+    }),
+    'assignments': Target(Assignment, {
+        'total_students': (_int, True),
+    }, refs=REFS),
+    'income_register': Target(IncomeRegister, {
+        'date': (_date, True), 'amount': (_float, True),
+    }, refs=REFS, rollup=('income', 'date', 'amount')),
+    'expense_register': Target(ExpenseRegister, {
+        'date': (_date, True), 'amount': (_float, True),
+    }, refs=REFS, rollup=('expense', 'date', 'amount')),
+    'institute_share': Target(InstituteShare, {
+        'total_students': (_int, True), 'rate_per_student': (_int, True),
+        'duration_months': (_int, True), 'total_amount': (_float, True),
+        'paid_date': (_date, False),
+    }, refs=REFS, rollup=('share', 'paid_date', 'total_amount')),
+    'letters_dispatch': Target(LetterDispatch, {
+        'date': (_date, True), 'reference': (_text, True), 'recipient': (_text, False),
+    }),
+    'letters_receive': Target(LetterReceive, {
+        'date': (_date, True), 'reference': (_text, True), 'sender': (_text, False),
+    }),
+}
+
+
+@dataclass
+class ImportResult:
+    target: str
+    rows: int = 0
+    valid: int = 0
+    inserted: int = 0
+    errors: list = field(default_factory=list)  # (line number, message)
+    dry_run: bool = False
+    committed: bool = False
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+# --- Reference resolution ---
+def _is_id(raw):
+    return raw.isdigit()
+
+
+def _lookup(conn, model, raws):
+    """Map raw id/name strings to ids; ambiguous names map to None."""
+    ids = {int(r) for r in raws if _is_id(r)}
+    names = {r for r in raws if not _is_id(r)}
+    found = {}
+    if ids:
+        existing = set(conn.execute(select(model.id).where(model.id.in_(ids))).scalars())
+        found.update({str(i): i for i in ids if i in existing})
+    if names:
+        by_name = defaultdict(list)
+        for id_, name in conn.execute(select(model.id, model.name).where(model.name.in_(names))):
+            by_name[name].append(id_)
+        found.update({n: (ids_[0] if len(ids_) == 1 else None) for n, ids_ in by_name.items()})
+    return found
+
+
+def _lookup_sections(conn, pairs):
+    """Map ``(class_id, raw)`` to ``(section_id, class_id)`` for a batch."""
+    ids = {int(r) for _, r in pairs if _is_id(r)}
+    names = {r for _, r in pairs if not _is_id(r)}
+    by_id, by_name = {}, defaultdict(list)
+    if ids:
+        for id_, class_id in conn.execute(
+            select(Section.id, Section.class_id).where(Section.id.in_(ids))
+        ):
+            by_id[id_] = class_id
+    if names:
+        for id_, class_id, name in conn.execute(
+            select(Section.id, Section.class_id, Section.name).where(Section.name.in_(names))
+        ):
+            by_name[(class_id, name)].append(id_)
+    found = {}
+    for class_id, raw in pairs:
+        if _is_id(raw):
+            if int(raw) in by_id:
+                found[(class_id, raw)] = (int(raw), by_id[int(raw)])
+        else:
+            matches = by_name.get((class_id, raw), [])
+            found[(class_id, raw)] = (matches[0], class_id) if len(matches) == 1 else None
+    return found
+
+
+def _resolve(conn, parsed):
+    """Fill institute_id/class_id/section_id on ``(line, values, refs, errors)`` rows."""
+    institutes = _lookup(conn, Institute, {r['institute'] for _, _, r, e in parsed if not e})
+    classes = _lookup(conn, ClassModel, {r['class'] for _, _, r, e in parsed if not e})
+    pairs = {
+        (classes[r['class']], r['section'])
+        for _, _, r, e in parsed if not e and classes.get(r['class'])
+    }
+    sections = _lookup_sections(conn, pairs) if pairs else {}
+
+    for line, values, refs, errors in parsed:
+        if errors:
+            continue
+        for kind, found, column in (('institute', institutes, 'institute_id'),
+                                     ('class', classes, 'class_id')):
+            raw = refs[kind]
+            if raw not in found:
+                errors.append(f"unknown {kind} '{raw}'")
+            elif found[raw] is None:
+                errors.append(f"{kind} name '{raw}' is ambiguous, use the id")
+            else:
+                values[column] = found[raw]
+        if errors:
+            continue
+        key = (values['class_id'], refs['section'])
+        if key not in sections:
+            errors.append(f"unknown section '{refs['section']}'")
+        elif sections[key] is None:
+            errors.append(f"section name '{refs['section']}' is ambiguous in this class, use the id")
+        elif sections[key][1] != values['class_id']:
+            errors.append(f"section {refs['section']} does not belong to class {refs['class']}")
+        else:
+            values['section_id'] = sections[key][0]
+
+
+def _check_assignments(conn, parsed, seen):
+    keys = {
+        (v['institute_id'], v['class_id'], v['section_id'])
+        for _, v, _, e in parsed if not e
+    }
+    existing = set()
+    if keys:
+        existing = set(conn.execute(
+            select(Assignment.institute_id, Assignment.class_id, Assignment.section_id)
+            .where(tuple_(Assignment.institute_id, Assignment.class_id, Assignment.section_id).in_(keys))
+        ).all())
+    for _, values, _, errors in parsed:
+        if errors:
+            continue
+        key = (values['institute_id'], values['class_id'], values['section_id'])
+        if key in existing or key in seen:
+            errors.append("this section is already assigned to the institute")
+        seen.add(key)
+
+
+# --- Parsing ---
+def _parse_row(target, row):
+    values, refs, errors = {}, {}, []
+    for column, (parse, required) in target.fields.items():
+        raw = (row.get(column) or '').strip()
+        if not raw:
+            if required:
+                errors.append(f"{column} is required")
+            continue
+        try:
+            values[column] = parse(raw)
+        except ValueError as e:
+            errors.append(f"{column}: {e}")
+    for kind in target.refs:
+        raw = (row.get(kind) or row.get(f"{kind}_id") or '').strip()
+        if not raw:
+            errors.append(f"{kind} is required")
+        refs[kind] = raw
+    return values, refs, errors
+
+
+def _columns_error(target, header):
+    header = set(header or ())
+    missing = [c for c, (_, required) in target.fields.items() if required and c not in header]
+    missing += [k for k in target.refs if k not in header and f"{k}_id" not in header]
+    return f"missing column(s): {', '.join(missing)}" if missing else None
+
+
+def _batches(reader):
+    batch = []
+    for row in reader:
+        batch.append((reader.line_num, row))
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _rollup_deltas(target, rows):
+    measure, date_col, amount_col = target.rollup
+    deltas = defaultdict(lambda: defaultdict(float))
+    for v in rows:
+        key = summaries.bucket_key(v.get('institute_id'), v.get('class_id'),
+                                   v.get('section_id'), v.get(date_col))
+        deltas[key][measure] += v.get(amount_col) or 0
+        deltas[key][measure + '_count'] += 1
+    return deltas
+
+
+def _insert_institutes(conn, rows):
+    # With their first rate version, as the registration form does.
+    ids = conn.execute(
+        insert(Institute).returning(Institute.id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+    versions = [v for i, r in zip(ids, rows)
+                if (v := rates.first_version(i, r.get('rate_per_student'))) is not None]
+    if versions:
+        conn.execute(insert(InstituteRate), versions)
+
+
+def import_csv(engine, target_name, fh, dry_run=False, skip_errors=False, progress=None):
+    """Import the CSV text stream ``fh`` into ``target_name``.
+
+    ``progress``, if given, is called with the number of rows read so far
+    after each batch.
+    """
+    target = TARGETS[target_name]
+    result = ImportResult(target_name, dry_run=dry_run)
+    started = time.perf_counter()
+    reader = csv.DictReader(fh)
+    problem = _columns_error(target, reader.fieldnames)
+    if problem:
+        result.errors.append((1, problem))
+        return result
+
+    table = target.model.__table__
+    seen_assignments = set()
+    with engine.connect() as conn:
+        restore_cache = None
+        if conn.dialect.name == 'sqlite':
+            restore_cache = conn.exec_driver_sql("PRAGMA cache_size").scalar()
+            conn.exec_driver_sql(f"PRAGMA cache_size=-{SQLITE_IMPORT_CACHE_KIB}")
+            conn.commit()  # end the autobegun transaction before ours
+        trans = conn.begin()
+        try:
+            for batch in _batches(reader):
+                parsed = [(line, *_parse_row(target, row)) for line, row in batch]
+                if target.refs:
+                    _resolve(conn, parsed)
+                if target.model is Assignment:
+                    _check_assignments(conn, parsed, seen_assignments)
+                valid = []
+                for line, values, _, errors in parsed:
+                    result.errors.extend((line, msg) for msg in errors)
+                    if not errors:
+                        valid.append(values)
+                result.rows += len(batch)
+                if valid:
+                    # executemany needs every row to carry the same keys.
+                    columns = set().union(*valid)
+                    rows = [{c: v.get(c) for c in columns} for v in valid]
+                    if target.model is Institute:
+                        _insert_institutes(conn, rows)
+                    else:
+                        conn.execute(insert(table), rows)
+                    if target.rollup:
+                        summaries.apply_deltas(conn, _rollup_deltas(target, valid))
+                    result.valid += len(valid)
+                if progress:
+                    progress(result.rows)
+            if dry_run or (result.errors and not skip_errors):
+                trans.rollback()
+            else:
+                trans.commit()
+                result.committed = True
+                if target.model in refdata.TRACKED:
+                    refdata.bump(table.name)
+                if target.model is Institute:
+                    refdata.bump(InstituteRate.__tablename__)
+                result.inserted = result.valid
+        except BaseException:
+            trans.rollback()
+            raise
+        finally:
+            if restore_cache is not None:
+                conn.exec_driver_sql(f"PRAGMA cache_size={restore_cache}")
+    result.elapsed = time.perf_counter() - started
+    return result
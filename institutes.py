@@ -0,0 +1,41 @@
+from sqlalchemy import func, or_
+
+from models import Institute
+
+# Queries behind the Institute List tab. Pages are keyset based (``id > last
+# seen id``) so page N costs the same as page 1 regardless of table size.
+
+DEFAULT_PAGE_SIZE = 25
+PAGE_SIZES = (10, 25, 50, 100)
+
+
+def _search(query, term):
+    term = (term or "").strip()
+    if not term:
+        return query
+    pattern = f"%{term}%"
+    return query.filter(or_(
+        Institute.name.ilike(pattern),
+        Institute.focal_person.ilike(pattern),
+        Institute.contact.ilike(pattern),
+    ))
+
+
+def count_institutes(session, term=None):
+    return _search(session.query(func.count(Institute.id)), term).scalar()
+
+
+def institute_page(session, term=None, after_id=None, page_size=DEFAULT_PAGE_SIZE):
+    """Return ``(rows, has_next)`` for the page following ``after_id``.
+
+    Only the columns the list shows are loaded; the full row is fetched
+    separately for the one institute being edited.
+    """
+    query = _search(session.query(
+        Institute.id, Institute.name, Institute.focal_person,
+        Institute.contact, Institute.rate_per_student
+    ), term)
+    if after_id is not None:
+        query = query.filter(Institute.id > after_id)
+    rows = query.order_by(Institute.id).limit(page_size + 1).all()
+    return rows[:page_size], len(rows) > page_size
@@ -0,0 +1,266 @@
+"""Background jobs for slow exports, imports and recomputations.
+
+``submit`` records a ``Job`` row and hands it to a process pool, so the work
+runs on another core while the Streamlit session that asked for it stays
+responsive. The worker keeps the row's status and progress up to date and
+leaves any output file under ``JOB_DIR``; the app polls the table to show
+them. Workers are spawned, not forked, so they start from a clean
+interpreter with their own engine.
+"""
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+from sqlalchemy import select, update
+
+import archive
+import db
+import exports
+import importer
+import refdata
+import scoping
+import shares
+import summaries
+from models import Job
+from reports import ReportFilter
+
+logger = logging.getLogger(__name__)
+
+JOB_DIR = "jobs"
+MAX_WORKERS = int(os.environ.get("IMS_JOB_WORKERS", max(2, (os.cpu_count() or 2) // 2)))
+# Progress is written at most this often (seconds) to keep the table quiet.
+PROGRESS_INTERVAL = 0.5
+ACTIVE = ('queued', 'running')
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class JobContext:
+    """Handed to a task: where to write output and how to report progress."""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self._last = 0.0
+
+    def path(self, name):
+        folder = os.path.join(JOB_DIR, str(self.job_id))
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder, name)
+
+    def progress(self, fraction, message=None, force=False):
+        now = time.monotonic()
+        if not force and now - self._last < PROGRESS_INTERVAL:
+            return
+        self._last = now
+        values = {'progress': max(0.0, min(1.0, fraction))}
+        if message is not None:
+            values['message'] = message
+        _update(self.job_id, **values)
+
+
+def _update(job_id, **values):
+    with db.engine.begin() as conn:
+        conn.execute(update(Job).where(Job.id == job_id).values(**values))
+
+
+# --- Tasks ---
+# Each takes the context plus the JSON parameters given to ``submit`` and
+# returns a dict with an optional ``message``, ``result_path`` and the
+# ``touched`` tables whose cached dropdowns and dashboard figures the app must reload.
+def _filters(start=None, end=None, **keys):
+    return ReportFilter(
+        date.fromisoformat(start) if start else None,
+        date.fromisoformat(end) if end else None,
+        **keys
+    )
+
+
+def _session(admin_id):
+    # Scoped again in the worker: the job runs with the submitting admin's
+    # permissions as they are when it starts, and the report builders read
+    # archived rows through the session's scope.
+    session = db.Session()
+    scoping.scope(session, admin_id)
+    return session
+
+
+def export_task(ctx, name, fmt, admin_id=None, **filter_args):
+    filters = _filters(**filter_args)
+    path = ctx.path(exports.file_name(name, fmt))
+    with _session(admin_id) as session:
+        scope = scoping.current(session)
+        with db.engine.connect() as conn:
+            total = exports.row_count(conn, session, name, filters, scope) or 1
+        with open(path, 'wb') as out:
+            exports.export(db.engine, session, name, fmt, out, filters, scope=scope,
+                           progress=lambda rows: ctx.progress(rows / total, f"{rows:,} of {total:,} rows"))
+    return {'message': f"{total:,} rows exported", 'result_path': path}
+
+
+def import_task(ctx, target, path, dry_run=True, skip_errors=False):
+    with open(path, 'rb') as f:
+        total = max(sum(1 for _ in f) - 1, 1)
+    report = lambda rows: ctx.progress(rows / total, f"{rows:,} of {total:,} rows read")
+    if db.engine.dialect.name == 'sqlite':
+        # The import's transaction holds SQLite's only write lock until the
+        # end, so a progress update would just wait for it.
+        report = None
+    with open(path, newline='', encoding='utf-8-sig') as fh:
+        result = importer.import_csv(
+            db.engine, target, fh, dry_run=dry_run, skip_errors=skip_errors, progress=report,
+        )
+    outcome = {
+        'message': (
+            f"{result.rows} row(s) read, {result.valid} valid, {len(result.errors)} error(s), "
+            + (f"{result.inserted} imported" if result.committed
+               else "dry run, nothing written" if result.dry_run else "nothing written")
+        ),
+    }
+    if result.errors:
+        outcome['result_path'] = ctx.path('errors.csv')
+        with open(outcome['result_path'], 'w', newline='') as out:
+            writer = csv.writer(out)
+            writer.writerow(['line', 'error'])
+            writer.writerows(result.errors)
+    if result.committed:
+        outcome['touched'] = [importer.TARGETS[target].model.__tablename__]
+    return outcome
+
+
+def rebuild_summaries_task(ctx):
+    with db.engine.begin() as conn:
+        buckets = summaries.rebuild(conn)
+    return {'message': f"{buckets:,} rollup buckets rebuilt"}
+
+
+def shares_task(ctx, paid_date, ended_by=None, admin_id=None):
+    with _session(admin_id) as session:
+        scope = scoping.current(session)
+    result = shares.compute_all(
+        db.engine, date.fromisoformat(paid_date),
+        date.fromisoformat(ended_by) if ended_by else None, scope=scope, admin_id=admin_id,
+    )
+    return {'message': f"{result.inserted} share(s) totalling {result.total_amount:,.2f} saved",
+            'touched': ['institute_share']}
+
+
+def archive_task(ctx, through):
+    done = archive.archive_closed(
+        db.engine, through, log=lambda line: ctx.progress(0.0, line, force=True)
+    )
+    outcome = {'message': f"{len(done)} partition(s), {sum(r.rows for r in done):,} rows archived"}
+    if done:
+        # The rollup keeps archived rows, so only the registers changed.
+        outcome['touched'] = ['income_register', 'expense_register']
+    return outcome
+
+
+TASKS = {
+    'export': ("Export", export_task),
+    'import': ("CSV import", import_task),
+    'rebuild_summaries': ("Rebuild report rollup", rebuild_summaries_task),
+    'shares': ("Compute all shares", shares_task),
+    'archive': ("Archive closed years", archive_task),
+}
+
+
+# --- Running ---
+def _run(job_id):
+    """Worker process entry point."""
+    with db.Session() as session:
+        job = session.get(Job, job_id)
+        kind, params = job.kind, json.loads(job.params or '{}')
+        job.status, job.started_at = 'running', datetime.now()
+        session.commit()
+    try:
+        outcome = TASKS[kind][1](JobContext(job_id), **params) or {}
+    except Exception as e:
+        _update(job_id, status='failed', message=str(e) or type(e).__name__,
+                error=traceback.format_exc(), finished_at=datetime.now())
+        return {}
+    _update(job_id, status='done', progress=1.0, message=outcome.get('message'),
+            result_path=outcome.get('result_path'), finished_at=datetime.now())
+    return outcome
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                MAX_WORKERS, mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pool
+
+
+def _finished(job_id):
+    def callback(future):
+        global _pool
+        try:
+            outcome = future.result()
+        except Exception as e:
+            # The worker process died (or the pool did); the task never reported.
+            logger.error("job %s crashed: %s", job_id, e)
+            _update(job_id, status='failed', message=f"worker crashed: {e}",
+                    finished_at=datetime.now())
+            with _pool_lock:
+                _pool = None
+            return
+        if outcome.get('touched'):
+            # The worker's own cache counters are not ours.
+            refdata.bump(*outcome['touched'])
+    return callback
+
+
+def submit(kind, **params):
+    """Queue task ``kind`` with JSON-serialisable ``params``; returns the job id."""
+    if kind not in TASKS:
+        raise ValueError(f"unknown job kind {kind!r}")
+    with db.Session() as session:
+        job = Job(kind=kind, params=json.dumps(params), status='queued',
+                  progress=0.0, created_at=datetime.now())
+        session.add(job)
+        session.commit()
+        job_id = job.id
+    _executor().submit(_run, job_id).add_done_callback(_finished(job_id))
+    return job_id
+
+
+def recover():
+    """Fail jobs left queued or running by a previous server process."""
+    with db.engine.begin() as conn:
+        return conn.execute(
+            update(Job).where(Job.status.in_(ACTIVE))
+            .values(status='failed', message="interrupted by a server restart",
+                    finished_at=datetime.now())
+        ).rowcount
+
+
+def upload_path(name):
+    """Where to save an uploaded file before a job reads it."""
+    folder = os.path.join(JOB_DIR, 'uploads')
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, f"{datetime.now():%Y%m%d%H%M%S%f}_{os.path.basename(name)}")
+
+
+# --- Reading ---
+def label(job):
+    return f"#{job.id} {TASKS[job.kind][0] if job.kind in TASKS else job.kind}"
+
+
+def get(session, ids):
+    if not ids:
+        return []
+    return session.execute(select(Job).where(Job.id.in_(ids)).order_by(Job.id.desc())).scalars().all()
+
+
+def recent(session, limit=50):
+    return session.execute(select(Job).order_by(Job.id.desc()).limit(limit)).scalars().all()
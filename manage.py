@@ -0,0 +1,190 @@
+"""Command line maintenance tasks for the institute database.
+
+Usage:
+    python manage.py init-db
+    python manage.py migrate [--status]
+    python manage.py summaries {rebuild,verify}
+    python manage.py export NAME --format {csv,xlsx,parquet} --out PATH [--from DATE] [--to DATE]
+    python manage.py import TARGET FILE.csv [--dry-run] [--skip-errors]
+    python manage.py shares --paid-date DATE [--ended-by DATE] [--dry-run]
+    python manage.py archive {--through YEAR [--vacuum],--status}
+    python manage.py set-password USER_ID [--create --name NAME]
+"""
+import argparse
+import getpass
+from datetime import date
+
+from sqlalchemy import select, text
+
+import archive
+import auth
+import db
+import exports
+import importer
+import reports
+import migrations
+import shares
+import summaries
+from models import Admin
+
+
+def cmd_init_db(args):
+    db.init_db()
+    print(f"Schema ready at {db.engine.url.render_as_string(hide_password=True)}")
+
+
+def cmd_migrate(args):
+    if args.status:
+        for version, description, applied in migrations.status(db.engine):
+            print(f"[{'x' if applied else ' '}] {version:03d} {description}")
+        return
+    applied = db.init_db()
+    print(f"Applied {len(applied)} migration(s); schema at version {migrations.head()}")
+
+
+def cmd_summaries(args):
+    if args.action == "rebuild":
+        with db.engine.begin() as conn:
+            buckets = summaries.rebuild(conn)
+        print(f"Rebuilt register_summary: {buckets} bucket(s)")
+        return
+    with db.engine.connect() as conn:
+        mismatches = summaries.verify(conn)
+    for key, stored, expected in mismatches:
+        print(f"MISMATCH {key}: stored={stored} expected={expected}")
+    if mismatches:
+        raise SystemExit(f"{len(mismatches)} bucket(s) differ; run 'summaries rebuild'")
+    print("register_summary matches the registers")
+
+
+def cmd_export(args):
+    filters = reports.ReportFilter(start=args.start, end=args.end)
+    with db.Session() as session, open(args.out, "wb") as out:
+        exports.export(db.engine, session, args.name, args.format, out, filters)
+    print(f"Wrote {args.out}")
+
+
+def cmd_import(args):
+    with open(args.file, newline="", encoding="utf-8-sig") as fh:
+        result = importer.import_csv(
+            db.engine, args.target, fh,
+            dry_run=args.dry_run, skip_errors=args.skip_errors
+        )
+    for line, message in result.errors:
+        print(f"line {line}: {message}")
+    print(
+        f"{result.rows} row(s) read, {result.valid} valid, {len(result.errors)} error(s), "
+        f"{result.inserted} inserted in {result.elapsed:.2f}s "
+        f"({result.rows_per_second:,.0f} rows/s)"
+    )
+    if result.dry_run:
+        print("Dry run: nothing was written")
+    elif not result.committed:
+        raise SystemExit("Nothing was written; fix the errors or pass --skip-errors")
+
+
+def cmd_shares(args):
+    result = shares.compute_all(db.engine, args.paid_date, args.ended_by, dry_run=args.dry_run)
+    print(
+        f"{result.inserted} share(s) totalling {result.total_amount:,.2f} "
+        f"in {result.elapsed:.2f}s"
+    )
+    if result.skipped_incomplete:
+        print(f"{result.skipped_incomplete} assignment(s) skipped: missing students, rate or duration")
+    if args.dry_run:
+        print("Dry run: nothing was written")
+
+
+def cmd_archive(args):
+    if args.status:
+        with db.engine.connect() as conn:
+            for p in archive.partitions(conn):
+                print(f"{p.table_name:<18}{p.year:>6}{p.rows:>12,}{p.amount:>18,.2f}"
+                      f"{p.size_bytes / 1e6:>9.1f} MB  {p.path}")
+        return
+    if args.through is None:
+        raise SystemExit("archive needs --through YEAR or --status")
+    done = archive.archive_closed(db.engine, args.through)
+    print(f"Archived {len(done)} partition(s), {sum(r.rows for r in done):,} row(s)")
+    if args.vacuum and done and db.engine.dialect.name == "sqlite":
+        # Deleted rows leave free pages; VACUUM hands them back to the filesystem.
+        with db.engine.connect() as conn:
+            conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
+        print("Vacuumed the database file")
+
+
+def cmd_set_password(args):
+    password = getpass.getpass(f"New password for {args.user_id}: ")
+    if not password or password != getpass.getpass("Repeat it: "):
+        raise SystemExit("Passwords are empty or do not match")
+    with db.Session() as session:
+        admin = session.execute(select(Admin).where(Admin.user_id == args.user_id)).scalar()
+        if admin is None:
+            if not args.create:
+                raise SystemExit(f"No admin {args.user_id!r}; pass --create to add one")
+            # Created from the command line, so with access to everything.
+            admin = Admin(user_id=args.user_id, name=args.name, all_institutes=True)
+            session.add(admin)
+        admin.password = auth.hash_password(password)
+        session.commit()
+    print(f"Password set for {args.user_id}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Institute Management System maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("init-db", help="create missing tables and apply migrations")
+    p.set_defaults(func=cmd_init_db)
+
+    p = sub.add_parser("migrate", help="apply pending schema migrations")
+    p.add_argument("--status", action="store_true", help="list migrations and exit")
+    p.set_defaults(func=cmd_migrate)
+
+    p = sub.add_parser("summaries", help="rebuild or verify the report rollup")
+    p.add_argument("action", choices=("rebuild", "verify"))
+    p.set_defaults(func=cmd_summaries)
+
+    p = sub.add_parser("export", help="stream a register or report to a file")
+    p.add_argument("name", choices=sorted(exports.EXPORTS))
+    p.add_argument("--format", choices=sorted(exports.FORMATS), default="csv")
+    p.add_argument("--out", required=True)
+    p.add_argument("--from", dest="start", type=date.fromisoformat)
+    p.add_argument("--to", dest="end", type=date.fromisoformat)
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("import", help="bulk load a CSV file")
+    p.add_argument("target", choices=sorted(importer.TARGETS))
+    p.add_argument("file")
+    p.add_argument("--dry-run", action="store_true", help="validate only, write nothing")
+    p.add_argument("--skip-errors", action="store_true", help="import the valid rows even if some fail")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("shares", help="save the share of every unpaid assignment")
+    p.add_argument("--paid-date", type=date.fromisoformat, required=True)
+    p.add_argument("--ended-by", type=date.fromisoformat, help="only sections ending on or before this date")
+    p.add_argument("--dry-run", action="store_true", help="compute only, write nothing")
+    p.set_defaults(func=cmd_shares)
+
+    p = sub.add_parser("archive", help="move closed years of the registers to Parquet snapshots")
+    p.add_argument("--through", type=int, help="last calendar year to archive")
+    p.add_argument("--vacuum", action="store_true", help="shrink the SQLite file afterwards")
+    p.add_argument("--status", action="store_true", help="list archived partitions and exit")
+    p.set_defaults(func=cmd_archive)
+
+    p = sub.add_parser("set-password", help="set an admin's password (prompts for it)")
+    p.add_argument("user_id")
+    p.add_argument("--create", action="store_true", help="add the admin, with access to all institutes")
+    p.add_argument("--name")
+    p.set_defaults(func=cmd_set_password)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
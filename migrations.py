@@ -0,0 +1,313 @@
+"""Versioned schema migrations.
+
+``Base.metadata.create_all`` only creates missing tables; it never touches
+tables that already exist. Anything that has to change an existing
+``institutes.db`` (indexes, constraints, new columns, backfills) is written
+as a numbered migration below and applied once, in order, by ``upgrade``.
+
+A brand new database is created straight from the models and stamped with
+the latest version, so migrations only ever run against older files.
+Migrations hold their own DDL instead of reading it from the models: once
+released, a migration must keep doing exactly what it did.
+"""
+import re
+from datetime import datetime
+
+from sqlalchemy import (
+    Column, DateTime, Integer, MetaData, String, Table, inspect, text
+)
+from sqlalchemy.exc import OperationalError
+
+import auth
+from models import Base
+
+metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', metadata,
+    Column('version', Integer, primary_key=True),
+    Column('description', String, nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+class MigrationError(RuntimeError):
+    pass
+
+
+MIGRATIONS = []
+# Called with the engine after every ``upgrade``, to drop schema facts cached
+# elsewhere (search.py remembers which full-text indexes exist).
+UPGRADE_HOOKS = []
+
+
+def migration(version, description):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+def after_upgrade(fn):
+    UPGRADE_HOOKS.append(fn)
+    return fn
+
+
+# --- Helpers for writing migrations ---
+def create_index(conn, name, table, columns, unique=False):
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    conn.execute(text(
+        f"CREATE {kind} IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+    ))
+
+
+def drop_index(conn, name):
+    conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+def create_fts5(conn, table, columns):
+    """FTS5 index ``<table>_fts`` over ``columns`` of ``table``, filled from
+    its rows and kept in step by triggers.
+
+    The index stores no copy of the text (external content on ``table``).
+    SQLite only; returns False on other databases or a build without FTS5.
+    """
+    if conn.dialect.name != 'sqlite':
+        return False
+    fts = f"{table}_fts"
+    cols = ', '.join(columns)
+    new = ', '.join(f"new.{c}" for c in columns)
+    old = ', '.join(f"old.{c}" for c in columns)
+    try:
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, "
+            f"content='{table}', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        ))
+    except OperationalError:
+        return False
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END"
+    ))
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END"
+    ))
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END"
+    ))
+    conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+    return True
+
+
+def has_column(conn, table, column):
+    return column in {c['name'] for c in inspect(conn).get_columns(table)}
+
+
+def add_column(conn, table, column_ddl):
+    # ``column_ddl`` is e.g. "page_count INTEGER"; skipped when create_all
+    # already built the table with the column in it.
+    if not has_column(conn, table, column_ddl.split()[0]):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column_ddl}"))
+
+
+# --- Migrations ---
+@migration(1, "foreign key, date and report covering indexes")
+def _m001_indexes(conn):
+    duplicates = conn.execute(text(
+        "SELECT institute_id, class_id, section_id, COUNT(*) FROM assignments "
+        "GROUP BY institute_id, class_id, section_id HAVING COUNT(*) > 1"
+    )).fetchall()
+    if duplicates:
+        listed = ", ".join(
+            f"institute {i} / class {c} / section {s} ({n}x)"
+            for i, c, s, n in duplicates
+        )
+        raise MigrationError(
+            "Cannot add the unique assignment index, duplicate assignments "
+            f"exist: {listed}. Merge or delete them and run the migration again."
+        )
+
+    create_index(conn, 'ix_sections_class_id', 'sections', ['class_id'])
+    create_index(conn, 'uq_assignments_institute_class_section', 'assignments',
+                 ['institute_id', 'class_id', 'section_id'], unique=True)
+    create_index(conn, 'ix_assignments_class_id', 'assignments', ['class_id'])
+    create_index(conn, 'ix_assignments_section_id', 'assignments', ['section_id'])
+    for table in ('letters_dispatch', 'letters_receive'):
+        create_index(conn, f'ix_{table}_date', table, ['date'])
+    for table in ('income_register', 'expense_register'):
+        create_index(conn, f'ix_{table}_institute_id_amount', table, ['institute_id', 'amount'])
+        create_index(conn, f'ix_{table}_class_id_amount', table, ['class_id', 'amount'])
+        create_index(conn, f'ix_{table}_section_id', table, ['section_id'])
+        create_index(conn, f'ix_{table}_date', table, ['date'])
+
+
+@migration(2, "register_summary rollup backfill")
+def _m002_register_summary(conn):
+    # register -> (measure, date column, amount column)
+    registers = {
+        'income_register': ('income', 'date', 'amount'),
+        'expense_register': ('expense', 'date', 'amount'),
+        'institute_share': ('share', 'paid_date', 'total_amount'),
+    }
+    measures = [m for m, _, _ in registers.values()]
+    month = ("to_char({}, 'YYYY-MM')" if conn.dialect.name == 'postgresql'
+             else "strftime('%Y-%m', {})")
+    parts = []
+    for table, (measure, date_col, amount_col) in registers.items():
+        values = ', '.join(
+            f"COALESCE({amount_col}, 0) AS {m}, 1 AS {m}_count" if m == measure
+            else f"0.0 AS {m}, 0 AS {m}_count"
+            for m in measures
+        )
+        parts.append(
+            f"SELECT COALESCE(institute_id, 0) AS institute_id, COALESCE(class_id, 0) AS class_id, "
+            f"COALESCE(section_id, 0) AS section_id, "
+            f"COALESCE({month.format(date_col)}, '') AS month, {values} FROM {table}"
+        )
+    sums = ', '.join(f"SUM({m}), SUM({m}_count)" for m in measures)
+    columns = ', '.join(f"{m}, {m}_count" for m in measures)
+    conn.execute(text("DELETE FROM register_summary"))
+    conn.execute(text(
+        f"INSERT INTO register_summary (institute_id, class_id, section_id, month, {columns}) "
+        f"SELECT institute_id, class_id, section_id, month, {sums} "
+        f"FROM ({' UNION ALL '.join(parts)}) raw "
+        f"GROUP BY institute_id, class_id, section_id, month"
+    ))
+
+
+@migration(3, "content-addressed agreement files")
+def _m003_agreement_files(conn):
+    add_column(conn, 'institutes', 'agreement_sha256 VARCHAR(64)')
+
+
+@migration(4, "institute share lookup by assignment")
+def _m004_institute_share_assignment(conn):
+    create_index(conn, 'ix_institute_share_assignment', 'institute_share',
+                 ['institute_id', 'class_id', 'section_id'])
+
+
+@migration(5, "full-text search indexes")
+def _m005_search(conn):
+    create_fts5(conn, 'institutes', ['name', 'address', 'focal_person'])
+    create_fts5(conn, 'letters_dispatch', ['reference', 'recipient'])
+    create_fts5(conn, 'letters_receive', ['reference', 'sender'])
+
+
+@migration(6, "admin institute permissions")
+def _m006_admin_institutes(conn):
+    add_column(conn, 'admins', 'all_institutes BOOLEAN NOT NULL DEFAULT FALSE')
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS admin_institutes ("
+        " admin_id INTEGER NOT NULL REFERENCES admins (id),"
+        " institute_id INTEGER NOT NULL REFERENCES institutes (id),"
+        " PRIMARY KEY (admin_id, institute_id))"
+    ))
+    create_index(conn, 'ix_admin_institutes_institute_id', 'admin_institutes', ['institute_id'])
+    existing = set(conn.execute(text("SELECT id FROM institutes")).scalars())
+    for admin_id, permission in conn.execute(
+        text("SELECT id, institute_permission FROM admins")
+    ).all():
+        tokens = [t for t in re.split(r"[\s,;]+", (permission or "").strip().lower()) if t]
+        # Blank or "all" meant no restriction: nothing ever read the field.
+        if not tokens or tokens == ['all'] or tokens == ['*']:
+            conn.execute(text("UPDATE admins SET all_institutes = TRUE WHERE id = :id"),
+                         {'id': admin_id})
+            continue
+        ids = {int(t) for t in tokens if t.isdigit()} & existing
+        conn.execute(
+            text("DELETE FROM admin_institutes WHERE admin_id = :a"), {'a': admin_id}
+        )
+        if ids:
+            conn.execute(
+                text("INSERT INTO admin_institutes (admin_id, institute_id) VALUES (:a, :i)"),
+                [{'a': admin_id, 'i': i} for i in sorted(ids)],
+            )
+
+
+@migration(7, "hash admin passwords")
+def _m007_hash_passwords(conn):
+    for admin_id, password in conn.execute(text("SELECT id, password FROM admins")).all():
+        if auth.is_hashed(password):
+            continue
+        # A blank password would let anyone in; the admin needs a new one.
+        conn.execute(
+            text("UPDATE admins SET password = :p WHERE id = :id"),
+            {'p': auth.hash_password(password) if password else None, 'id': admin_id},
+        )
+
+
+@migration(8, "first rate version of every institute")
+def _m008_first_rates(conn):
+    # Institutes without any version get their current rate from the start.
+    conn.execute(text(
+        "INSERT INTO institute_rates (institute_id, effective_from, rate) "
+        "SELECT id, '1900-01-01', rate_per_student FROM institutes i "
+        "WHERE rate_per_student IS NOT NULL AND NOT EXISTS "
+        "(SELECT 1 FROM institute_rates r WHERE r.institute_id = i.id)"
+    ))
+
+
+# --- Runner ---
+def head():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def current_version(conn):
+    if not inspect(conn).has_table('schema_migrations'):
+        return 0
+    version = conn.execute(text("SELECT MAX(version) FROM schema_migrations")).scalar()
+    return version or 0
+
+
+def _record(conn, version, description):
+    conn.execute(schema_migrations.insert().values(
+        version=version, description=description, applied_at=datetime.now()
+    ))
+
+
+def pending(conn):
+    current = current_version(conn)
+    return [m for m in MIGRATIONS if m[0] > current]
+
+
+def upgrade(engine, log=print):
+    """Bring the schema at ``engine`` up to date. Returns applied versions."""
+    try:
+        return _upgrade(engine, log)
+    finally:
+        for hook in UPGRADE_HOOKS:
+            hook(engine)
+
+
+def _upgrade(engine, log):
+    with engine.begin() as conn:
+        fresh = not inspect(conn).has_table('institutes') and current_version(conn) == 0
+        metadata.create_all(conn)
+        Base.metadata.create_all(conn)
+        if fresh:
+            # Tables were just built from the models, which already match head.
+            for version, description, _ in MIGRATIONS:
+                _record(conn, version, description)
+            return []
+
+    applied = []
+    for version, description, fn in MIGRATIONS:
+        # One transaction per migration, so a failure leaves earlier steps in place.
+        with engine.begin() as conn:
+            if version <= current_version(conn):
+                continue
+            log(f"Applying migration {version}: {description}")
+            fn(conn)
+            _record(conn, version, description)
+        applied.append(version)
+    return applied
+
+
+def status(engine):
+    with engine.connect() as conn:
+        current = current_version(conn)
+    return [(v, d, v <= current) for v, d, _ in MIGRATIONS]
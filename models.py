@@ -0,0 +1,259 @@
+from sqlalchemy import (
+    Boolean, Column, Integer, String, Text, Date, DateTime, ForeignKey, Float, Index,
+    UniqueConstraint
+)
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
+
+# Model layer shared by the Streamlit app and the command line tools.
+# Nothing here may import streamlit.
+Base = declarative_base()
+
+# --- Model definitions ---
+class Institute(Base):
+    __tablename__ = 'institutes'
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    address = Column(String)
+    focal_person = Column(String)
+    contact = Column(String)
+    agreement_date = Column(Date)
+    rate_per_student = Column(Integer)
+    agreement_path = Column(String)
+    agreement_sha256 = Column(String(64), ForeignKey('agreement_files.sha256'))
+    assignments = relationship('Assignment', back_populates='institute')
+    agreement = relationship('AgreementFile')
+
+class InstituteRate(Base):
+    # Rate per student per month from ``effective_from`` until the next
+    # version's date; see rates.py. ``Institute.rate_per_student`` holds
+    # the rate in effect today.
+    __tablename__ = 'institute_rates'
+    __table_args__ = (
+        Index('uq_institute_rates_institute_from', 'institute_id', 'effective_from', unique=True),
+    )
+    id = Column(Integer, primary_key=True)
+    institute_id = Column(Integer, ForeignKey('institutes.id'), nullable=False)
+    effective_from = Column(Date, nullable=False)
+    rate = Column(Integer, nullable=False)
+
+class AgreementFile(Base):
+    # One row per distinct agreement PDF, stored by content hash (agreements.py).
+    __tablename__ = 'agreement_files'
+    sha256 = Column(String(64), primary_key=True)
+    path = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+    page_count = Column(Integer)
+    original_name = Column(String)
+    created_at = Column(DateTime)
+
+class ClassModel(Base):
+    __tablename__ = 'classes'
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    agency = Column(String)
+    sections = relationship('Section', back_populates='class_model')
+    assignments = relationship('Assignment', back_populates='class_model')
+
+class Section(Base):
+    __tablename__ = 'sections'
+    __table_args__ = (
+        Index('ix_sections_class_id', 'class_id'),
+    )
+    id = Column(Integer, primary_key=True)
+    class_id = Column(Integer, ForeignKey('classes.id'), nullable=False)
+    name = Column(String, nullable=False)
+    start_date = Column(Date)
+    end_date = Column(Date)
+    duration_months = Column(Integer)
+    class_model = relationship('ClassModel', back_populates='sections')
+    assignments = relationship('Assignment', back_populates='section')
+
+class Assignment(Base):
+    __tablename__ = 'assignments'
+    __table_args__ = (
+        Index('uq_assignments_institute_class_section',
+              'institute_id', 'class_id', 'section_id', unique=True),
+        Index('ix_assignments_class_id', 'class_id'),
+        Index('ix_assignments_section_id', 'section_id'),
+    )
+    id = Column(Integer, primary_key=True)
+    institute_id = Column(Integer, ForeignKey('institutes.id'), nullable=False)
+    class_id = Column(Integer, ForeignKey('classes.id'), nullable=False)
+    section_id = Column(Integer, ForeignKey('sections.id'), nullable=False)
+    total_students = Column(Integer)
+    institute = relationship('Institute', back_populates='assignments')
+    class_model = relationship('ClassModel', back_populates='assignments')
+    section = relationship('Section', back_populates='assignments')
+
+class LetterDispatch(Base):
+    __tablename__ = 'letters_dispatch'
+    __table_args__ = (
+        Index('ix_letters_dispatch_date', 'date'),
+    )
+    id = Column(Integer, primary_key=True)
+    date = Column(Date)
+    reference = Column(String)
+    recipient = Column(String)
+
+class LetterReceive(Base):
+    __tablename__ = 'letters_receive'
+    __table_args__ = (
+        Index('ix_letters_receive_date', 'date'),
+    )
+    id = Column(Integer, primary_key=True)
+    date = Column(Date)
+    reference = Column(String)
+    sender = Column(String)
+
+class IncomeRegister(Base):
+    __tablename__ = 'income_register'
+    # (fk, amount) pairs cover the class- and institute-wise report sums.
+    __table_args__ = (
+        Index('ix_income_register_institute_id_amount', 'institute_id', 'amount'),
+        Index('ix_income_register_class_id_amount', 'class_id', 'amount'),
+        Index('ix_income_register_section_id', 'section_id'),
+        Index('ix_income_register_date', 'date'),
+    )
+    id = Column(Integer, primary_key=True)
+    date = Column(Date)
+    amount = Column(Float)
+    institute_id = Column(Integer, ForeignKey('institutes.id'))
+    class_id = Column(Integer, ForeignKey('classes.id'))
+    section_id = Column(Integer, ForeignKey('sections.id'))
+    institute = relationship('Institute')
+    class_model = relationship('ClassModel')
+    section = relationship('Section')
+
+class ExpenseRegister(Base):
+    __tablename__ = 'expense_register'
+    # (fk, amount) pairs cover the class- and institute-wise report sums.
+    __table_args__ = (
+        Index('ix_expense_register_institute_id_amount', 'institute_id', 'amount'),
+        Index('ix_expense_register_class_id_amount', 'class_id', 'amount'),
+        Index('ix_expense_register_section_id', 'section_id'),
+        Index('ix_expense_register_date', 'date'),
+    )
+    id = Column(Integer, primary_key=True)
+    date = Column(Date)
+    amount = Column(Float)
+    institute_id = Column(Integer, ForeignKey('institutes.id'))
+    class_id = Column(Integer, ForeignKey('classes.id'))
+    section_id = Column(Integer, ForeignKey('sections.id'))
+    institute = relationship('Institute')
+    class_model = relationship('ClassModel')
+    section = relationship('Section')
+
+class InstituteShare(Base):
+    __tablename__ = 'institute_share'
+    # Looked up by assignment to tell which assignments are already paid.
+    __table_args__ = (
+        Index('ix_institute_share_assignment', 'institute_id', 'class_id', 'section_id'),
+    )
+    id = Column(Integer, primary_key=True)
+    institute_id = Column(Integer, ForeignKey('institutes.id'))
+    class_id = Column(Integer, ForeignKey('classes.id'))
+    section_id = Column(Integer, ForeignKey('sections.id'))
+    total_students = Column(Integer)
+    rate_per_student = Column(Integer)
+    duration_months = Column(Integer)
+    total_amount = Column(Float)
+    paid_date = Column(Date)
+    institute = relationship('Institute')
+    class_model = relationship('ClassModel')
+    section = relationship('Section')
+
+class Admin(Base):
+    __tablename__ = 'admins'
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+    designation = Column(String)
+    user_id = Column(String, unique=True)
+    password = Column(String)  # scrypt hash, see auth.py
+    # Free text of the old admin form; migration 6 copied it into
+    # admin_institutes / all_institutes, which are what scoping.py reads.
+    institute_permission = Column(String)
+    all_institutes = Column(Boolean, nullable=False, default=False)
+    institutes = relationship('AdminInstitute', cascade='all, delete-orphan')
+
+class AdminInstitute(Base):
+    # Institutes a restricted admin may see and edit.
+    __tablename__ = 'admin_institutes'
+    __table_args__ = (
+        Index('ix_admin_institutes_institute_id', 'institute_id'),
+    )
+    admin_id = Column(Integer, ForeignKey('admins.id'), primary_key=True)
+    institute_id = Column(Integer, ForeignKey('institutes.id'), primary_key=True)
+
+class RegisterSummary(Base):
+    # Monthly rollup of income, expense and institute share amounts, kept in
+    # step with the registers by summaries.py. Missing keys are stored as 0
+    # and undated rows under month '' so the unique key always applies.
+    __tablename__ = 'register_summary'
+    __table_args__ = (
+        UniqueConstraint('institute_id', 'class_id', 'section_id', 'month',
+                         name='uq_register_summary_key'),
+        Index('ix_register_summary_class_id', 'class_id'),
+        Index('ix_register_summary_month', 'month'),
+    )
+    id = Column(Integer, primary_key=True)
+    institute_id = Column(Integer, nullable=False, default=0)
+    class_id = Column(Integer, nullable=False, default=0)
+    section_id = Column(Integer, nullable=False, default=0)
+    month = Column(String(7), nullable=False, default='')
+    income = Column(Float, nullable=False, default=0)
+    income_count = Column(Integer, nullable=False, default=0)
+    expense = Column(Float, nullable=False, default=0)
+    expense_count = Column(Integer, nullable=False, default=0)
+    share = Column(Float, nullable=False, default=0)
+    share_count = Column(Integer, nullable=False, default=0)
+
+class Job(Base):
+    # Background work queued from the app; see jobs.py.
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        Index('ix_jobs_status', 'status'),
+    )
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    params = Column(Text)  # JSON keyword arguments for the task
+    status = Column(String, nullable=False, default='queued')
+    progress = Column(Float, nullable=False, default=0.0)  # 0..1
+    message = Column(String)
+    result_path = Column(String)
+    error = Column(Text)
+    created_at = Column(DateTime)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+class ArchivedPartition(Base):
+    # One Parquet file holding a closed year of a register; see archive.py.
+    # Its rows are no longer in the live table.
+    __tablename__ = 'archived_partitions'
+    __table_args__ = (
+        Index('ix_archived_partitions_table_year', 'table_name', 'year'),
+    )
+    id = Column(Integer, primary_key=True)
+    table_name = Column(String, nullable=False)
+    year = Column(Integer, nullable=False)
+    path = Column(String, nullable=False, unique=True)
+    rows = Column(Integer, nullable=False, default=0)
+    amount = Column(Float, nullable=False, default=0)
+    size_bytes = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime)
+
+class AuditLog(Base):
+    # Append-only record of ORM writes; see audit.py. ``changes`` is JSON:
+    # {column: value} for inserts and deletes, {column: [old, new]} for updates.
+    __tablename__ = 'audit_log'
+    __table_args__ = (
+        Index('ix_audit_log_row', 'table_name', 'row_id', 'changed_at'),
+        Index('ix_audit_log_changed_at', 'changed_at'),
+    )
+    id = Column(Integer, primary_key=True)
+    changed_at = Column(DateTime, nullable=False)
+    admin_id = Column(Integer)
+    table_name = Column(String, nullable=False)
+    row_id = Column(String, nullable=False)
+    action = Column(String(6), nullable=False)
+    changes = Column(Text, nullable=False)
@@ -0,0 +1,48 @@
+"""Institute -> class -> section selectboxes shared by the app's forms.
+
+Widgets inside ``st.form`` only report their value on submit, so a section
+list that depends on the chosen class cannot follow it there. The picker is
+drawn outside the form, inside an ``st.fragment``, so changing a choice
+reruns that fragment alone and the dependent lists update immediately.
+"""
+import streamlit as st
+
+import refdata
+
+
+def _select(label, options, key, empty):
+    if not options:
+        st.selectbox(label, [empty], key=f"{key}_empty", disabled=True)
+        return None
+    return st.selectbox(label, list(options), format_func=options.get, key=key)
+
+
+def assignment_picker(session, key, assigned=True):
+    """Pick an institute, then a class, then a section.
+
+    With ``assigned`` only the classes and sections assigned to the chosen
+    institute are offered (for entries booked against an assignment);
+    otherwise the sections not yet assigned to it (for new assignments).
+    Returns ``(institute_id, class_id, section_id)``, ``None`` for any level
+    that has nothing to choose from.
+    """
+    iid = _select("Institute", refdata.institutes(session), f"{key}_inst", "No institutes")
+    taken = refdata.assignments(session, iid) if iid is not None else {}
+
+    if assigned:
+        class_ids = {c for c, _ in taken}
+        class_options = {c: label for c, label in refdata.classes(session).items() if c in class_ids}
+    else:
+        class_options = refdata.classes_with_sections(session) if iid is not None else {}
+    cid = _select("Class", class_options, f"{key}_cls",
+                  "No assigned classes" if assigned else "No classes with sections")
+
+    sec_options = {}
+    if cid is not None:
+        sec_options = {
+            s: label for s, label in refdata.sections(session, cid).items()
+            if ((cid, s) in taken) == assigned
+        }
+    sid = _select("Section", sec_options, f"{key}_sec",
+                  "No sections available" if assigned else "All sections already assigned")
+    return iid, cid, sid
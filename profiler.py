@@ -0,0 +1,318 @@
+"""Query profiling for the app's engine.
+
+``install`` hooks the engine's cursor events: every statement is timed, the
+rows its result hands back are counted, and it is credited to the labels
+``track`` has pushed on the issuing thread (a view, then a form inside it).
+The outermost ``track`` block is one *run*, normally one script rerun; the
+last ``MAX_RUNS`` runs and per-statement totals are kept in memory for the
+Admin Panel. Statements slower than ``SLOW_QUERY_MS`` are written with their
+query plan to ``logs/slow_queries.log``, rotated at ``SLOW_LOG_BYTES``.
+"""
+import functools
+import logging
+import logging.handlers
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from sqlalchemy import event
+
+SLOW_QUERY_MS = 200
+SLOW_LOG = os.path.join("logs", "slow_queries.log")
+SLOW_LOG_BYTES = 1_000_000
+SLOW_LOG_BACKUPS = 5
+# The same statement this many times in one run looks like an N+1 loop.
+N_PLUS_ONE_MIN = 10
+MAX_RUNS = 200
+MAX_STATEMENTS = 500
+MINUTES_KEPT = 120
+BACKGROUND = "(background)"
+
+slow_log = logging.getLogger("ims.slow_queries")
+
+_lock = threading.Lock()
+_local = threading.local()
+statements = OrderedDict()  # SQL text -> StatementStats, least recently run first
+runs = deque(maxlen=MAX_RUNS)
+
+
+@dataclass
+class StatementStats:
+    statement: str
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    rows: int = 0
+    last_seen: datetime = None
+    scopes: Counter = field(default_factory=Counter)
+    # [minute, executions, seconds], oldest first
+    minutes: deque = field(default_factory=lambda: deque(maxlen=MINUTES_KEPT))
+
+
+@dataclass
+class QueryRecord:
+    statement: str
+    scope: str
+    elapsed: float
+    many: bool = False
+    rows: int = 0
+
+
+@dataclass
+class RunStats:
+    label: str
+    started: datetime
+    queries: list = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def query_time(self):
+        return sum(q.elapsed for q in self.queries)
+
+    @property
+    def p95(self):
+        if not self.queries:
+            return 0.0
+        times = sorted(q.elapsed for q in self.queries)
+        return times[min(len(times) - 1, int(0.95 * len(times)))]
+
+    @property
+    def rows(self):
+        return sum(q.rows for q in self.queries)
+
+    def by_scope(self):
+        return Counter(q.scope for q in self.queries)
+
+    def repeats(self):
+        """``{(scope, statement): executions}`` for likely N+1 patterns."""
+        seen = Counter((q.scope, q.statement) for q in self.queries if not q.many)
+        return {k: n for k, n in seen.items() if n >= N_PLUS_ONE_MIN}
+
+
+# --- Attribution ---
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+@contextmanager
+def track(label):
+    """Credit queries in the block to ``label``; the outermost block is a run."""
+    stack = _stack()
+    outer = not stack
+    if outer:
+        _local.run = RunStats(label, datetime.now())
+    stack.append(label)
+    started = time.perf_counter()
+    try:
+        yield _local.run
+    finally:
+        stack.pop()
+        if outer:
+            run, _local.run = _local.run, None
+            run.elapsed = time.perf_counter() - started
+            runs.append(run)
+
+
+def tracked(label):
+    """``track`` as a decorator, e.g. for a form's ``st.fragment``."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with track(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# --- Engine hooks ---
+class _CountingCursor:
+    """DB-API cursor proxy counting the rows the result fetches through it."""
+
+    def __init__(self, cursor, counters):
+        self._cursor = cursor
+        self._counters = counters
+
+    def _add(self, n):
+        # The statement's stats are shared with every other thread.
+        with _lock:
+            for c in self._counters:
+                c.rows += n
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._add(1)
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._cursor.fetchmany(*args)
+        self._add(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._add(len(rows))
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def _before(conn, cursor, statement, parameters, context, executemany):
+    # One statement runs on a connection at a time. A statement that raises
+    # never reaches _after; the next one overwrites its start time.
+    conn.info["profiler_started"] = time.perf_counter()
+
+
+def _after(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info.pop("profiler_started")
+    stack = getattr(_local, "stack", None)
+    scope = " / ".join(stack) if stack else BACKGROUND
+    now = datetime.now()
+    minute = now.strftime("%Y-%m-%d %H:%M")
+
+    with _lock:
+        stats = statements.get(statement)
+        if stats is None:
+            stats = statements[statement] = StatementStats(statement)
+            if len(statements) > MAX_STATEMENTS:
+                statements.popitem(last=False)
+        else:
+            statements.move_to_end(statement)
+        stats.count += 1
+        stats.total += elapsed
+        stats.max = max(stats.max, elapsed)
+        stats.last_seen = now
+        stats.scopes[scope] += 1
+        if stats.minutes and stats.minutes[-1][0] == minute:
+            stats.minutes[-1][1] += 1
+            stats.minutes[-1][2] += elapsed
+        else:
+            stats.minutes.append([minute, 1, elapsed])
+
+    record = QueryRecord(statement, scope, elapsed, many=executemany)
+    run = getattr(_local, "run", None)
+    if run is not None:
+        run.queries.append(record)
+    if cursor.description is None:
+        # Writes report their row count; nothing will be fetched.
+        if cursor.rowcount and cursor.rowcount > 0:
+            record.rows = cursor.rowcount
+            with _lock:
+                stats.rows += cursor.rowcount
+    elif context is not None:
+        # The result object reads rows from context.cursor after this hook.
+        context.cursor = _CountingCursor(cursor, (record, stats))
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        plan = None if executemany else _plan(conn, statement, parameters)
+        slow_log.warning(
+            "%.1f ms [%s]\n%s\nparameters: %r\nplan:\n%s",
+            elapsed * 1000, scope, statement, parameters, plan or "(not available)",
+        )
+
+
+def _plan(conn, statement, parameters):
+    if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        return None
+    prefix = {"sqlite": "EXPLAIN QUERY PLAN ", "postgresql": "EXPLAIN "}.get(conn.dialect.name)
+    if prefix is None:
+        return None
+    # A raw DB-API cursor, so the EXPLAIN itself is not profiled.
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return "\n".join(str(row[-1]) for row in cursor.fetchall())
+    except Exception as e:
+        return f"(failed: {e})"
+    finally:
+        cursor.close()
+
+
+def _open_slow_log():
+    if slow_log.handlers:
+        return
+    os.makedirs(os.path.dirname(SLOW_LOG), exist_ok=True)
+    handler = logging.handlers.RotatingFileHandler(
+        SLOW_LOG, maxBytes=SLOW_LOG_BYTES, backupCount=SLOW_LOG_BACKUPS, delay=True
+    )
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    slow_log.addHandler(handler)
+    slow_log.setLevel(logging.WARNING)
+    slow_log.propagate = False
+
+
+def install(engine):
+    """Profile every statement ``engine`` runs. Safe to call more than once."""
+    _open_slow_log()
+    if not event.contains(engine, "before_cursor_execute", _before):
+        event.listen(engine, "before_cursor_execute", _before)
+        event.listen(engine, "after_cursor_execute", _after)
+
+
+def reset():
+    with _lock:
+        statements.clear()
+        runs.clear()
+
+
+# --- Dashboard data ---
+def hottest(limit=20):
+    """Statements by total time spent, as dashboard rows."""
+    with _lock:
+        top = sorted(statements.values(), key=lambda s: s.total, reverse=True)[:limit]
+        return [
+            {
+                "Statement": s.statement,
+                "Runs": s.count,
+                "Total ms": s.total * 1000,
+                "Avg ms": s.total / s.count * 1000,
+                "Max ms": s.max * 1000,
+                "Rows": s.rows,
+                "Issued by": ", ".join(f"{scope} ({n})" for scope, n in s.scopes.most_common(3)),
+                "Last run": s.last_seen,
+            }
+            for s in top
+        ]
+
+
+def timeline(limit=5):
+    """``(minute, statement number, ms)`` rows for the ``limit`` hottest statements."""
+    with _lock:
+        top = sorted(statements.values(), key=lambda s: s.total, reverse=True)[:limit]
+        return [
+            (minute, f"#{i}", seconds * 1000)
+            for i, s in enumerate(top, 1)
+            for minute, _, seconds in s.minutes
+        ]
+
+
+def recent_runs():
+    return [
+        {
+            "Started": r.started, "View": r.label, "Queries": r.count,
+            "Query ms": r.query_time * 1000, "p95 ms": r.p95 * 1000,
+            "Rows": r.rows, "Run ms": r.elapsed * 1000,
+        }
+        for r in list(runs)
+    ]
+
+
+def repeated_statements():
+    """Likely N+1 patterns from the recent runs, most repeated first."""
+    found = [
+        {"Started": r.started, "Issued by": scope, "Executions": n, "Statement": stmt}
+        for r in list(runs)
+        for (scope, stmt), n in r.repeats().items()
+    ]
+    return sorted(found, key=lambda f: f["Executions"], reverse=True)
@@ -0,0 +1,208 @@
+"""Rate per student over time, and shares prorated by the day.
+
+Each ``InstituteRate`` row is the rate from its ``effective_from`` date until
+the next row of the same institute. The unique (institute, effective_from)
+index answers "rate on date" for one institute with a single index seek;
+``RateHistory`` keeps the start dates of many institutes sorted in memory and
+answers with a binary search, for batch work. A new institute starts with
+one row from ``OPEN_START`` at its rate (``first_version``); one without any
+rows, e.g. created without a rate, has had ``Institute.rate_per_student``
+all along.
+
+A share is ``students * rate`` for every month the section runs, counted by
+the day: each day is worth ``1 / days in its month`` of that day's rate. A
+section from 15 January to 14 March is 17/31 + 28/28 + 14/31 months, and a
+rate change on 1 February prices the rest at the new rate. Sections without
+dates fall back to ``duration_months`` at today's rate.
+
+``set_rate`` records a new rate from a date and recomputes the unpaid shares
+of the sections that overlap the period it changes. Paid shares keep the
+amount that was paid; the ones the new rate would price differently are
+counted in the result instead.
+"""
+import calendar
+from bisect import bisect_right
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from sqlalchemy import select
+
+from models import Institute, InstituteRate, InstituteShare, Section
+
+# effective_from of the rate an institute had before its first recorded change
+OPEN_START = date(1900, 1, 1)
+# Institutes per IN list when loading histories.
+LOAD_CHUNK = 500
+
+
+@dataclass
+class Repricing:
+    repriced: int = 0
+    # Paid shares the new rate would price differently, left as paid.
+    paid_differs: int = 0
+    paid_difference: float = 0.0
+
+
+def _days_in_month(d):
+    return calendar.monthrange(d.year, d.month)[1]
+
+
+def months(start, end):
+    """Exact months from ``start`` to ``end``, both days included."""
+    if end < start:
+        return 0.0
+    if (start.year, start.month) == (end.year, end.month):
+        return ((end - start).days + 1) / _days_in_month(start)
+    first = (_days_in_month(start) - start.day + 1) / _days_in_month(start)
+    whole = (end.year * 12 + end.month) - (start.year * 12 + start.month) - 1
+    return first + whole + end.day / _days_in_month(end)
+
+
+class RateHistory:
+    def __init__(self, versions, current):
+        # institute id -> (sorted start dates, rates)
+        self._starts = {i: [f for f, _ in v] for i, v in versions.items()}
+        self._rates = {i: [r for _, r in v] for i, v in versions.items()}
+        self._current = current
+
+    def rate_on(self, institute_id, day):
+        starts = self._starts.get(institute_id)
+        if not starts:
+            return self._current.get(institute_id)
+        i = bisect_right(starts, day)
+        return self._rates[institute_id][i - 1] if i else None
+
+    def _next_change(self, institute_id, day):
+        starts = self._starts.get(institute_id) or ()
+        i = bisect_right(starts, day)
+        return starts[i] if i < len(starts) else None
+
+    def prorated(self, institute_id, start, end):
+        """Sum of the daily rate from ``start`` to ``end``, in rate-months;
+        ``None`` if some day has no rate."""
+        total, d = 0.0, start
+        while d <= end:
+            # One stretch per rate version the section overlaps.
+            change = self._next_change(institute_id, d)
+            last = end if change is None or change > end else change - timedelta(days=1)
+            rate = self.rate_on(institute_id, d)
+            if rate is None:
+                return None
+            total += rate * months(d, last)
+            d = last + timedelta(days=1)
+        return total
+
+    def share(self, institute_id, students, start, end, duration_months=None):
+        """``(amount, rate at the start)``; amount ``None`` if data is missing."""
+        if students is None:
+            return None, None
+        if start and end:
+            per_student = self.prorated(institute_id, start, end)
+            rate = self.rate_on(institute_id, start)
+        else:
+            rate = self.rate_on(institute_id, date.today())
+            per_student = rate * duration_months if rate is not None and duration_months else None
+        if per_student is None:
+            return None, rate
+        return round(students * per_student, 2), rate
+
+
+def load(conn, institute_ids=None):
+    """``RateHistory`` of ``institute_ids`` (all institutes if ``None``)."""
+    ids = None if institute_ids is None else sorted(set(institute_ids))
+    chunks = [None] if ids is None else [ids[i:i + LOAD_CHUNK] for i in range(0, len(ids), LOAD_CHUNK)]
+    versions, current = defaultdict(list), {}
+    for chunk in chunks:
+        v_stmt = select(InstituteRate.institute_id, InstituteRate.effective_from, InstituteRate.rate)
+        c_stmt = select(Institute.id, Institute.rate_per_student)
+        if chunk is not None:
+            v_stmt = v_stmt.where(InstituteRate.institute_id.in_(chunk))
+            c_stmt = c_stmt.where(Institute.id.in_(chunk))
+        for institute_id, start, rate in conn.execute(v_stmt.order_by(InstituteRate.effective_from)):
+            versions[institute_id].append((start, rate))
+        current.update(conn.execute(c_stmt).all())
+    return RateHistory(versions, current)
+
+
+def rate_on(conn, institute_id, day):
+    """The rate of one institute on ``day`` (one index seek)."""
+    versioned = conn.execute(
+        select(InstituteRate.rate)
+        .where(InstituteRate.institute_id == institute_id, InstituteRate.effective_from <= day)
+        .order_by(InstituteRate.effective_from.desc()).limit(1)
+    ).first()
+    if versioned is not None:
+        return versioned[0]
+    has_versions = conn.execute(
+        select(InstituteRate.id).where(InstituteRate.institute_id == institute_id).limit(1)
+    ).first()
+    if has_versions:
+        return None
+    return conn.execute(select(Institute.rate_per_student).where(Institute.id == institute_id)).scalar()
+
+
+def first_version(institute_id, rate):
+    """Values of the row that starts a new institute's history (``None``
+    without a rate)."""
+    if rate is None:
+        return None
+    return {'institute_id': institute_id, 'effective_from': OPEN_START, 'rate': rate}
+
+
+def versions(session, institute_id):
+    return session.execute(
+        select(InstituteRate).where(InstituteRate.institute_id == institute_id)
+        .order_by(InstituteRate.effective_from)
+    ).scalars().all()
+
+
+# --- Changes ---
+def set_rate(session, institute_id, rate, effective_from):
+    """Record ``rate`` from ``effective_from`` on and reprice the unpaid
+    shares it affects; returns a ``Repricing``. The caller commits."""
+    inst = session.get(Institute, institute_id)
+    existing = versions(session, institute_id)
+    if not existing and inst.rate_per_student is not None and effective_from > OPEN_START:
+        # Keep the rate the institute had so far for the days before.
+        session.add(InstituteRate(institute_id=institute_id, effective_from=OPEN_START,
+                                  rate=inst.rate_per_student))
+    same_day = next((v for v in existing if v.effective_from == effective_from), None)
+    if same_day is not None:
+        same_day.rate = rate
+    else:
+        session.add(InstituteRate(institute_id=institute_id, effective_from=effective_from, rate=rate))
+    later = [v.effective_from for v in existing if v.effective_from > effective_from]
+    session.flush()
+    inst.rate_per_student = rate_on(session.connection(), institute_id, date.today())
+    return recompute(session, institute_id, effective_from, min(later) if later else None)
+
+
+def recompute(session, institute_id, since, until=None):
+    """Reprice unpaid shares of ``institute_id`` whose section runs on any
+    day from ``since`` up to (not including) ``until``; paid ones are only
+    compared."""
+    stmt = (
+        select(InstituteShare, Section.start_date, Section.end_date)
+        .join(Section, Section.id == InstituteShare.section_id)
+        .where(InstituteShare.institute_id == institute_id, Section.end_date >= since)
+    )
+    if until is not None:
+        stmt = stmt.where(Section.start_date < until)
+    history = load(session.connection(), [institute_id])
+    result = Repricing()
+    for share, start, end in session.execute(stmt).all():
+        amount, rate = history.share(institute_id, share.total_students, start, end,
+                                     share.duration_months)
+        if amount is None or (share.total_amount is not None
+                              and abs(amount - share.total_amount) <= 0.005):
+            continue
+        if share.paid_date is not None:
+            result.paid_differs += 1
+            result.paid_difference += amount - (share.total_amount or 0)
+            continue
+        # Through the ORM, so the rollup and the audit log follow.
+        share.total_amount, share.rate_per_student = amount, rate
+        result.repriced += 1
+    result.paid_difference = round(result.paid_difference, 2)
+    return result
@@ -0,0 +1,143 @@
+"""Cached id -> label maps for the institute, class and section pickers.
+
+Each cached map remembers the generation of the tables it was read from.
+Committing a write to one of those tables bumps its generation, so the next
+read reloads the map; until then rendering the pickers runs no queries.
+Generations live in this process: a write made by another process (e.g.
+``manage.py import``) shows up after a restart or the next in-app write.
+
+The maps are shared by all sessions, so they are read without the
+permission filter of scoping.py; ``institutes`` drops the institutes the
+session may not see on the way out.
+"""
+import threading
+from collections import defaultdict
+from itertools import chain
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from models import (
+    Institute, ClassModel, Section, Assignment, Admin, AdminInstitute, IncomeRegister,
+    ExpenseRegister, InstituteShare, InstituteRate
+)
+
+# Tables past Assignment only carry a generation, for the permission cache in
+# scoping.py and the dashboard cache in dashboard.py.
+TRACKED = (Institute, ClassModel, Section, Assignment, Admin, AdminInstitute, IncomeRegister,
+           ExpenseRegister, InstituteShare, InstituteRate)
+UNSCOPED = {'unscoped': True}
+_TRACKED_TABLES = {m.__tablename__ for m in TRACKED}
+
+_generations = defaultdict(int)
+_cache = {}
+_lock = threading.Lock()
+
+
+def generation(*tables):
+    return tuple(_generations[t] for t in tables)
+
+
+def bump(*tables):
+    """Invalidate maps read from ``tables`` (for writes outside the ORM)."""
+    with _lock:
+        for t in tables:
+            _generations[t] += 1
+
+
+# --- Invalidation ---
+@event.listens_for(Session, 'after_flush')
+def _note_writes(session, flush_context):
+    touched = {
+        obj.__tablename__
+        for obj in chain(session.new, session.dirty, session.deleted)
+        if isinstance(obj, TRACKED)
+    }
+    if touched:
+        session.info.setdefault('refdata_touched', set()).update(touched)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_committed(session):
+    touched = session.info.pop('refdata_touched', None)
+    if touched:
+        bump(*touched)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back(session):
+    session.info.pop('refdata_touched', None)
+
+
+def _cached(name, tables, load, session):
+    # Read the generation before loading: if a write commits meanwhile, the
+    # entry is stored under the older generation and reloaded next time.
+    gen = generation(*tables)
+    hit = _cache.get(name)
+    if hit is not None and hit[0] == gen:
+        return hit[1]
+    value = load(session)
+    with _lock:
+        _cache[name] = (gen, value)
+    return value
+
+
+# --- Maps ---
+def _labels(session, model):
+    return {
+        id_: f"{id_}: {name}"
+        for id_, name in session.execute(
+            select(model.id, model.name).order_by(model.id), execution_options=UNSCOPED
+        )
+    }
+
+
+def institutes(session):
+    """``{institute id: label}`` of the institutes ``session`` may see."""
+    labels = _cached('institutes', ('institutes',),
+                     lambda s: _labels(s, Institute), session)
+    scope = session.info.get('scope')
+    if scope is None:
+        return labels
+    return {id_: label for id_, label in labels.items() if scope.allows(id_)}
+
+
+def classes(session):
+    """``{class id: label}``."""
+    return _cached('classes', ('classes',),
+                   lambda s: _labels(s, ClassModel), session)
+
+
+def sections(session, class_id):
+    """``{section id: label}`` for one class, loaded the first time it is asked for."""
+    def load(s):
+        return {
+            id_: f"{id_}: {name}"
+            for id_, name in s.execute(
+                select(Section.id, Section.name)
+                .where(Section.class_id == class_id).order_by(Section.id)
+            )
+        }
+    return _cached(('sections', class_id), ('sections',), load, session)
+
+
+def classes_with_sections(session):
+    """``{class id: label}`` for classes that have at least one section."""
+    def load(s):
+        with_sections = set(s.execute(select(Section.class_id).distinct()).scalars())
+        return {id_: label for id_, label in classes(s).items() if id_ in with_sections}
+    return _cached('classes_with_sections', ('classes', 'sections'), load, session)
+
+
+def assignments(session, institute_id):
+    """``{(class id, section id): total students}`` assigned to one institute."""
+    def load(s):
+        return {
+            (c, sec): students
+            for c, sec, students in s.execute(
+                select(Assignment.class_id, Assignment.section_id, Assignment.total_students)
+                .where(Assignment.institute_id == institute_id),
+                execution_options=UNSCOPED,
+            )
+        }
+    return _cached(('assignments', institute_id), ('assignments',), load, session)
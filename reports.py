@@ -0,0 +1,312 @@
+import calendar
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from sqlalchemy import Date, Float, Integer, and_, column, func, literal, or_, select, union_all, values
+
+import archive
+import scoping
+
+from models import (
+    Institute, ClassModel, Section, IncomeRegister, ExpenseRegister,
+    InstituteShare, LetterDispatch, LetterReceive, RegisterSummary
+)
+from summaries import month_key
+
+# Query builders for the Reports tab. They return ``Query`` objects so the
+# app can hand ``.statement`` to pandas and scripts can reuse the same SQL.
+# Every filter is a WHERE clause in the generated statement.
+#
+# Amounts come from the ``register_summary`` rollup (see summaries.py) for
+# whole months, whose size depends on institutes x sections x months rather
+# than register rows; only the partial months at the edges of a date range
+# touch the registers themselves. Closed years moved to archive snapshots
+# (archive.py) are read from there and joined in as inline VALUES rows.
+
+MAX_ROWS = 1000
+
+
+@dataclass(frozen=True)
+class ReportFilter:
+    start: date = None
+    end: date = None
+    institute_id: int = None
+    class_id: int = None
+    section_id: int = None
+
+    def keys(self):
+        return {
+            'institute_id': self.institute_id,
+            'class_id': self.class_id,
+            'section_id': self.section_id,
+        }
+
+
+NO_FILTER = ReportFilter()
+
+
+def _key_clauses(cols, filters):
+    return [cols[k] == v for k, v in filters.keys().items() if v is not None]
+
+
+# --- Date ranges over the monthly rollup ---
+def _month_end(d):
+    return d.replace(day=calendar.monthrange(d.year, d.month)[1])
+
+
+def split_range(start=None, end=None):
+    """Split ``[start, end]`` into whole rollup months and leftover days.
+
+    Returns ``(months, days)``: ``months`` is ``None`` when no whole month
+    is covered, else ``(first, last)`` month keys where ``None`` means
+    unbounded; ``days`` lists the ``(lo, hi)`` date ranges that must be read
+    from the raw registers.
+    """
+    if start and end and start > end:
+        return None, []
+    first = last = None
+    days = []
+    if start and start.day != 1:
+        edge_end = _month_end(start) if not end else min(_month_end(start), end)
+        days.append((start, edge_end))
+        start = edge_end + timedelta(days=1)
+    if end and (not start or start <= end) and end != _month_end(end):
+        edge_start = end.replace(day=1) if not start else max(end.replace(day=1), start)
+        days.append((edge_start, end))
+        end = edge_start - timedelta(days=1)
+    if start and end and start > end:
+        return None, days
+    if start:
+        first = month_key(start)
+    if end:
+        last = month_key(end)
+    return (first, last), days
+
+
+def _rollup_filter(months):
+    first, last = months
+    # Undated rows (month '') only count when the range is unbounded.
+    clauses = [RegisterSummary.month != ''] if first or last else []
+    if first:
+        clauses.append(RegisterSummary.month >= first)
+    if last:
+        clauses.append(RegisterSummary.month <= last)
+    return and_(*clauses)
+
+
+# measure -> (register, date column, amount column)
+SOURCES = {
+    'income': (IncomeRegister, IncomeRegister.date, IncomeRegister.amount),
+    'expense': (ExpenseRegister, ExpenseRegister.date, ExpenseRegister.amount),
+    'share': (InstituteShare, InstituteShare.paid_date, InstituteShare.total_amount),
+}
+MEASURES = tuple(SOURCES)
+KEYS = ('institute_id', 'class_id', 'section_id')
+
+
+def _archived_days(session, days, filters, by):
+    """Edge-day amounts of archived rows, one select per register.
+
+    Only the ``by`` key is kept (the others read 0), which is all
+    ``_totals`` groups on and keeps the inline rows few.
+    """
+    parts = []
+    for table_name, (_, measure) in archive.REGISTERS.items():
+        rows = archive.totals(session.connection(), table_name, days, filters.keys(),
+                              by=(by,), scope=scoping.current(session))
+        if not rows:
+            continue
+        data = values(
+            column(by, Integer), column('amount', Float), column('n', Integer),
+            name=f'archived_{measure}', literal_binds=True,
+        ).data(rows).cte()
+        parts.append(select(
+            *((data.c[by] if k == by else literal(0)).label(k) for k in KEYS),
+            *((data.c.amount if m == measure else literal(0.0)).label(m) for m in MEASURES),
+            *((data.c.n if m == measure else literal(0)).label(m + '_count') for m in MEASURES),
+        ))
+    return parts
+
+
+def _measure_rows(session, filters, by):
+    """Filtered amounts and row counts per (institute, class, section).
+
+    The rollup and the edge-day register rows are stacked with UNION ALL,
+    each register filling only its own measure columns. Archived rows carry
+    only the ``by`` key.
+    """
+    months, days = split_range(filters.start, filters.end)
+    parts = []
+    if months is not None:
+        cols = {k: getattr(RegisterSummary, k) for k in KEYS}
+        parts.append(
+            select(
+                *(cols[k].label(k) for k in KEYS),
+                *(getattr(RegisterSummary, m).label(m) for m in MEASURES),
+                *(getattr(RegisterSummary, m + '_count').label(m + '_count') for m in MEASURES),
+            ).where(_rollup_filter(months), *_key_clauses(cols, filters))
+        )
+    if days:
+        for measure, (model, date_col, amount_col) in SOURCES.items():
+            cols = {k: getattr(model, k) for k in KEYS}
+            parts.append(
+                select(
+                    *(cols[k].label(k) for k in KEYS),
+                    *((amount_col if m == measure else literal(0.0)).label(m)
+                      for m in MEASURES),
+                    *(literal(1 if m == measure else 0).label(m + '_count')
+                      for m in MEASURES),
+                ).where(
+                    or_(*(date_col.between(lo, hi) for lo, hi in days)),
+                    *_key_clauses(cols, filters)
+                )
+            )
+        parts.extend(_archived_days(session, days, filters, by))
+    if not parts:
+        # Empty range: still a well-formed subquery, just without rows.
+        parts.append(
+            select(
+                *(literal(0).label(k) for k in KEYS),
+                *(literal(0.0).label(m) for m in MEASURES),
+                *(literal(0).label(m + '_count') for m in MEASURES),
+            ).where(literal(False))
+        )
+    return union_all(*parts).subquery()
+
+
+def _totals(session, filters, by):
+    """``_measure_rows`` summed once per value of the ``by`` key column."""
+    rows = _measure_rows(session, filters, by)
+    return (
+        select(
+            rows.c[by],
+            *(func.sum(rows.c[m]).label(m) for m in MEASURES),
+            *(func.sum(rows.c[m + '_count']).label(m + '_count') for m in MEASURES),
+        )
+        .group_by(rows.c[by])
+        .subquery()
+    )
+
+
+# --- Reports ---
+def _by_class(session, filters, measure, label):
+    totals = _totals(session, filters, 'class_id')
+    return (
+        session.query(
+            ClassModel.id.label('ID'),
+            ClassModel.name.label('Class'),
+            totals.c[measure].label(label),
+        )
+        .join(totals, totals.c.class_id == ClassModel.id)
+        .filter(totals.c[measure + '_count'] > 0)
+        .order_by(ClassModel.name, ClassModel.id)
+    )
+
+
+def income_by_class(session, filters=NO_FILTER):
+    return _by_class(session, filters, 'income', 'Total Income')
+
+
+def expense_by_class(session, filters=NO_FILTER):
+    return _by_class(session, filters, 'expense', 'Total Expense')
+
+
+def class_sections(session, filters):
+    """Section-level drill-down of one class (``filters.class_id``)."""
+    totals = _totals(session, filters, 'section_id')
+    return (
+        session.query(
+            Section.id.label('ID'),
+            Section.name.label('Section'),
+            totals.c.income.label('Income'),
+            totals.c.expense.label('Expense'),
+        )
+        .join(totals, totals.c.section_id == Section.id)
+        .filter(or_(totals.c.income_count > 0, totals.c.expense_count > 0))
+        .order_by(Section.name, Section.id)
+    )
+
+
+def register_entries(session, filters, limit=MAX_ROWS):
+    """Individual income and expense rows matching ``filters``, newest first."""
+    parts = []
+    for measure in ('income', 'expense'):
+        model, date_col, amount_col = SOURCES[measure]
+        cols = {k: getattr(model, k) for k in KEYS}
+        clauses = _key_clauses(cols, filters)
+        if filters.start:
+            clauses.append(date_col >= filters.start)
+        if filters.end:
+            clauses.append(date_col <= filters.end)
+        parts.append(
+            select(
+                literal(measure.title()).label('Type'),
+                model.id.label('Entry'),
+                date_col.label('Date'),
+                amount_col.label('Amount'),
+                model.institute_id.label('institute_id'),
+            ).where(*clauses)
+        )
+        archived = archive.entries(session.connection(), model.__tablename__, filters, limit,
+                                   scope=scoping.current(session))
+        if archived:
+            data = values(
+                column('id', Integer), column('date', Date), column('amount', Float),
+                column('institute_id', Integer), name=f'archived_{measure}',
+            ).data(archived).cte()
+            parts.append(select(
+                literal(measure.title()).label('Type'), data.c.id.label('Entry'),
+                data.c.date.label('Date'), data.c.amount.label('Amount'),
+                data.c.institute_id.label('institute_id'),
+            ))
+    entries = union_all(*parts).subquery()
+    return (
+        session.query(
+            entries.c.Type, entries.c.Entry, entries.c.Date,
+            Institute.name.label('Institute'), entries.c.Amount,
+        )
+        .outerjoin(Institute, Institute.id == entries.c.institute_id)
+        .order_by(entries.c.Date.desc(), entries.c.Entry.desc())
+        .limit(limit)
+    )
+
+
+def _letters(session, model, party, filters, limit):
+    query = session.query(model.id, model.date, model.reference, party)
+    if filters.start:
+        query = query.filter(model.date >= filters.start)
+    if filters.end:
+        query = query.filter(model.date <= filters.end)
+    return query.order_by(model.date.desc(), model.id.desc()).limit(limit)
+
+
+def dispatch_register(session, filters=NO_FILTER, limit=MAX_ROWS):
+    return _letters(session, LetterDispatch, LetterDispatch.recipient, filters, limit)
+
+
+def receive_register(session, filters=NO_FILTER, limit=MAX_ROWS):
+    return _letters(session, LetterReceive, LetterReceive.sender, filters, limit)
+
+
+def profit_loss_by_institute(session, filters=NO_FILTER):
+    """Income, expense, institute share payouts and net per institute.
+
+    One statement over the rollup plus edge-day register rows, grouped by
+    institute id so that institutes sharing a name stay separate rows.
+    """
+    totals = _totals(session, filters, 'institute_id')
+    income, expense, share = (func.coalesce(totals.c[m], 0) for m in MEASURES)
+    query = (
+        session.query(
+            Institute.id.label('ID'),
+            Institute.name.label('Institute'),
+            income.label('Income'),
+            expense.label('Expense'),
+            share.label('Institute Share'),
+            (income - expense - share).label('Profit/Loss'),
+        )
+        .outerjoin(totals, totals.c.institute_id == Institute.id)
+    )
+    if filters.institute_id is not None:
+        query = query.filter(Institute.id == filters.institute_id)
+    return query.order_by(Institute.name, Institute.id)
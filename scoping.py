@@ -0,0 +1,116 @@
+"""Limit a session to the institutes its admin is allowed to see.
+
+``scope(session, admin_id)`` resolves the admin's permitted institutes once
+(an ``all_institutes`` admin is unrestricted) and keeps them in
+``session.info``. Every ORM statement that session runs afterwards - selects,
+``session.get``, lazy loads, bulk updates and deletes - gets a
+``with_loader_criteria`` filter on each model in ``SCOPED``, including inside
+subqueries, so report statements only read the admin's rollup buckets and
+register rows. Statements run outside the session (pandas on the engine,
+exports, background jobs) pass through ``restrict``. The resolved set is
+reused until a commit changes ``admins`` or ``admin_institutes``.
+"""
+from dataclasses import dataclass
+
+from sqlalchemy import event, select, true
+from sqlalchemy.orm import Session, with_loader_criteria
+
+import refdata
+from models import (
+    Admin, AdminInstitute, Institute, InstituteRate, Assignment, IncomeRegister, ExpenseRegister,
+    InstituteShare, RegisterSummary
+)
+
+# Larger permission sets are matched with a subquery on admin_institutes
+# instead of an inline IN list.
+INLINE_MAX = 500
+PERMISSION_TABLES = ('admins', 'admin_institutes')
+# model -> its institute column
+SCOPED = {
+    Institute: 'id',
+    InstituteRate: 'institute_id',
+    Assignment: 'institute_id',
+    IncomeRegister: 'institute_id',
+    ExpenseRegister: 'institute_id',
+    InstituteShare: 'institute_id',
+    RegisterSummary: 'institute_id',
+}
+# Execution option that skips the filter, for process-wide caches.
+UNSCOPED = refdata.UNSCOPED
+
+
+@dataclass(frozen=True)
+class Scope:
+    admin_id: int
+    institute_ids: frozenset
+
+    def allows(self, institute_id):
+        return institute_id in self.institute_ids
+
+    def clause(self, col):
+        if len(self.institute_ids) <= INLINE_MAX:
+            return col.in_(sorted(self.institute_ids))
+        return col.in_(
+            select(AdminInstitute.institute_id).where(AdminInstitute.admin_id == self.admin_id)
+        )
+
+
+def load(conn, admin_id):
+    """``Scope`` for ``admin_id``, or ``None`` if the admin sees everything."""
+    everything = conn.execute(
+        select(Admin.all_institutes).where(Admin.id == admin_id)
+    ).scalar()
+    if everything:
+        return None
+    ids = frozenset(conn.execute(
+        select(AdminInstitute.institute_id).where(AdminInstitute.admin_id == admin_id)
+    ).scalars())
+    return Scope(admin_id, ids)
+
+
+def scope(session, admin_id):
+    """Restrict ``session`` to ``admin_id``'s institutes (``None`` lifts it)."""
+    if admin_id is None:
+        session.info.pop('scope', None)
+        session.info.pop('scope_key', None)
+        return None
+    # Generation first: a permission change committed during the load is
+    # picked up on the next call.
+    key = (admin_id, refdata.generation(*PERMISSION_TABLES))
+    if session.info.get('scope_key') != key:
+        session.info['scope'] = load(session.connection(), admin_id)
+        session.info['scope_key'] = key
+    return session.info['scope']
+
+
+def current(session):
+    """The session's ``Scope``, or ``None`` when unrestricted."""
+    return session.info.get('scope')
+
+
+def criteria(scope_):
+    # Plain expressions rather than lambdas: the ids are bound parameters of
+    # the statement, so cached SQL is shared between admins.
+    return [
+        with_loader_criteria(model, scope_.clause(getattr(model, attr)), include_aliases=True)
+        for model, attr in SCOPED.items()
+    ]
+
+
+def restrict(stmt, scope_):
+    """``stmt`` limited to ``scope_``; for statements run outside the session."""
+    return stmt if scope_ is None else stmt.options(*criteria(scope_))
+
+
+def institute_clause(scope_, col):
+    """WHERE clause for hand-written Core statements (``True`` when unrestricted)."""
+    return true() if scope_ is None else scope_.clause(col)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _apply_scope(state):
+    scope_ = state.session.info.get('scope')
+    if scope_ is None or state.execution_options.get('unscoped'):
+        return
+    if state.is_select or state.is_update or state.is_delete:
+        state.statement = state.statement.options(*criteria(scope_))
@@ -0,0 +1,175 @@
+"""Full-text search over institutes and the letter registers.
+
+On SQLite every searchable table has an FTS5 index, ``<table>_fts``, built
+by migration 5 (or with the table on a new database) and kept in sync by
+triggers, so rows written by the bulk importer are indexed too. Each word of
+a query matches as a prefix and hits are ranked with bm25, name and
+reference columns weighing most.
+
+Other databases, and SQLite builds without FTS5, fall back to
+``LikeSearch``, a substring match that needs no index. A backend for another
+dialect (PostgreSQL ``tsvector``, say) is plugged in with ``register``.
+Whether an index exists is looked up once per engine and forgotten when
+the schema is upgraded.
+
+Given a ``scope`` (scoping.py), institute hits are limited to the admin's
+institutes; letters are not tied to an institute and are always searched.
+"""
+import re
+import time
+import weakref
+from dataclasses import dataclass
+
+from sqlalchemy import and_, event, inspect, or_, select, text
+
+import migrations
+import scoping
+from models import Institute, LetterDispatch, LetterReceive
+
+MAX_TERMS = 8
+DEFAULT_LIMIT = 20
+
+# engine -> {fts table: exists}
+_indexes = weakref.WeakKeyDictionary()
+
+
+@dataclass(frozen=True)
+class Source:
+    label: str
+    model: type
+    # searchable column -> bm25 weight, in the index's column order
+    columns: dict
+    # extra columns shown with each hit
+    shown: tuple = ()
+    # column holding the row's institute id, if it has one
+    institute: str = None
+
+
+SOURCES = {
+    'institutes': Source("Institutes", Institute,
+                         {'name': 10.0, 'address': 1.0, 'focal_person': 5.0}, ('contact',), 'id'),
+    'letters_dispatch': Source("Dispatched letters", LetterDispatch,
+                               {'reference': 10.0, 'recipient': 5.0}, ('date',)),
+    'letters_receive': Source("Received letters", LetterReceive,
+                              {'reference': 10.0, 'sender': 5.0}, ('date',)),
+}
+
+
+@dataclass
+class Results:
+    backend: str
+    hits: dict  # source name -> list of row mappings, best first
+    elapsed: float = 0.0
+
+    @property
+    def total(self):
+        return sum(len(rows) for rows in self.hits.values())
+
+
+def terms(query):
+    """Lower-cased words of ``query``; punctuation only separates them."""
+    return re.findall(r"\w+", (query or "").lower())[:MAX_TERMS]
+
+
+# --- Backends ---
+class LikeSearch:
+    """Every word must occur somewhere in the row; newest rows first."""
+    name = "like"
+
+    def available(self, conn, source):
+        return True
+
+    def search(self, conn, source, words, limit, scope=None):
+        model = source.model
+        cols = [getattr(model, c) for c in source.columns]
+        match = and_(*(
+            or_(*(c.ilike(f"%{w.replace('_', '/_')}%", escape='/') for c in cols))
+            for w in words
+        ))
+        stmt = (
+            select(model.id.label('ID'), *cols, *(getattr(model, c) for c in source.shown))
+            .where(match).order_by(model.id.desc()).limit(limit)
+        )
+        if scope is not None and source.institute:
+            stmt = stmt.where(scoping.institute_clause(scope, getattr(model, source.institute)))
+        return conn.execute(stmt).mappings().all()
+
+
+class Fts5Search(LikeSearch):
+    """bm25-ranked prefix match against the ``<table>_fts`` index."""
+    name = "fts5"
+
+    def available(self, conn, source):
+        fts = f"{source.model.__tablename__}_fts"
+        known = _indexes.setdefault(conn.engine, {})
+        if fts not in known:
+            known[fts] = inspect(conn).has_table(fts)
+        return known[fts]
+
+    def search(self, conn, source, words, limit, scope=None):
+        table = source.model.__tablename__
+        fts = f"{table}_fts"
+        weights = ', '.join(str(w) for w in source.columns.values())
+        cols = ', '.join(f"t.{c}" for c in (*source.columns, *source.shown))
+        # Each word quoted (no FTS syntax from user input) and prefix-matched.
+        match = ' '.join(f'"{w}"*' for w in words)
+        params = {'match': match, 'limit': limit}
+        allowed = ""
+        if scope is not None and source.institute:
+            allowed = (f"AND t.{source.institute} IN "
+                       f"(SELECT institute_id FROM admin_institutes WHERE admin_id = :admin_id) ")
+            params['admin_id'] = scope.admin_id
+        stmt = text(
+            f"SELECT t.id AS \"ID\", {cols}, "
+            f"snippet({fts}, -1, '[', ']', '...', 8) AS \"Match\" "
+            f"FROM {fts} JOIN {table} t ON t.id = {fts}.rowid "
+            f"WHERE {fts} MATCH :match {allowed}ORDER BY bm25({fts}, {weights}) LIMIT :limit"
+        )
+        return conn.execute(stmt, params).mappings().all()
+
+
+BACKENDS = {'sqlite': Fts5Search()}
+FALLBACK = LikeSearch()
+
+
+def register(dialect, backend):
+    """Use ``backend`` for databases of ``dialect`` (e.g. 'postgresql')."""
+    BACKENDS[dialect] = backend
+
+
+def backend_for(conn, source):
+    backend = BACKENDS.get(conn.dialect.name)
+    if backend is not None and backend.available(conn, source):
+        return backend
+    return FALLBACK
+
+
+def search(conn, query, sources=tuple(SOURCES), limit=DEFAULT_LIMIT, scope=None):
+    """Top ``limit`` hits for ``query`` in each of ``sources``."""
+    started = time.perf_counter()
+    words = terms(query)
+    hits, used = {}, set()
+    if words:
+        for name in sources:
+            source = SOURCES[name]
+            backend = backend_for(conn, source)
+            used.add(backend.name)
+            hits[name] = backend.search(conn, source, words, limit, scope)
+    return Results('/'.join(sorted(used)), hits, time.perf_counter() - started)
+
+
+@migrations.after_upgrade
+def _forget_indexes(engine):
+    _indexes.pop(engine, None)
+
+
+# A new database gets its indexes from create_all; older ones from migration 5.
+def _index_on_create(source):
+    def after_create(table, conn, **kw):
+        migrations.create_fts5(conn, table.name, list(source.columns))
+        _indexes.pop(conn.engine, None)
+    return after_create
+
+
+for _source in SOURCES.values():
+    event.listen(_source.model.__table__, 'after_create', _index_on_create(_source))
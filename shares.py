@@ -0,0 +1,144 @@
+"""Institute shares for every unpaid assignment at once.
+
+The share of an assignment is its ``total_students`` times the institute's
+rate for each day its section runs, prorated by the day (see rates.py). An
+assignment counts as paid once an ``institute_share`` row exists for its
+institute, class and section. ``compute_all`` reads the unpaid assignments
+with one query, prices them against the rate history in memory and writes
+them with one multi-row INSERT; a per-day, per-version sum does not fit an
+INSERT ... SELECT. The INSERT skips the ORM hooks, so it updates the rollup
+and logs each new share to ``audit_log`` itself.
+"""
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+
+from sqlalchemy import exists, select
+
+import audit
+import rates
+import scoping
+import summaries
+from models import Institute, ClassModel, Section, Assignment, InstituteShare
+from reports import NO_FILTER, MAX_ROWS
+
+
+@dataclass
+class BatchResult:
+    inserted: int = 0
+    total_amount: float = 0.0
+    skipped_incomplete: int = 0
+    elapsed: float = 0.0
+
+
+def _unpaid(ended_by, filters, scope=None):
+    """WHERE clauses for assignments without a share yet, within ``scope``."""
+    clauses = [~exists().where(
+        InstituteShare.institute_id == Assignment.institute_id,
+        InstituteShare.class_id == Assignment.class_id,
+        InstituteShare.section_id == Assignment.section_id,
+    )]
+    if ended_by:
+        clauses.append(Section.end_date <= ended_by)
+    for key, value in filters.keys().items():
+        if value is not None:
+            clauses.append(getattr(Assignment, key) == value)
+    if scope is not None:
+        clauses.append(scoping.institute_clause(scope, Assignment.institute_id))
+    return clauses
+
+
+def _pending(conn, ended_by, filters, scope, named=False):
+    """Unpaid assignments with what pricing them needs, each with its
+    ``(amount, rate)``; amount is ``None`` when data is missing."""
+    columns = [
+        Assignment.institute_id, Assignment.class_id, Assignment.section_id,
+        Assignment.total_students, Section.start_date, Section.end_date,
+        Section.duration_months,
+    ]
+    stmt = (
+        select(*columns)
+        .select_from(Assignment)
+        .join(Section, Section.id == Assignment.section_id)
+    )
+    if named:
+        stmt = (
+            stmt.add_columns(Institute.name.label('institute'), ClassModel.name.label('class_name'),
+                             Section.name.label('section'))
+            .join(Institute, Institute.id == Assignment.institute_id)
+            .join(ClassModel, ClassModel.id == Assignment.class_id)
+        )
+    rows = conn.execute(stmt.where(*_unpaid(ended_by, filters, scope)).order_by(Assignment.id)).all()
+    history = rates.load(conn, {r.institute_id for r in rows})
+    return [
+        (r, *history.share(r.institute_id, r.total_students, r.start_date, r.end_date,
+                           r.duration_months))
+        for r in rows
+    ]
+
+
+def preview(session, ended_by=None, filters=NO_FILTER, limit=MAX_ROWS):
+    """Named preview rows (largest first) for the Accounts tab."""
+    priced = [p for p in _pending(session, ended_by, filters, None, named=True) if p[1] is not None]
+    priced.sort(key=lambda p: -p[1])
+    return [
+        {'ID': r.institute_id, 'Institute': r.institute, 'Class': r.class_name,
+         'Section': r.section, 'Start': r.start_date, 'Ended': r.end_date,
+         'Students': r.total_students, 'Rate': rate,
+         'Months': round(rates.months(r.start_date, r.end_date), 2) if r.start_date and r.end_date
+         else r.duration_months,
+         'Share': amount}
+        for r, amount, rate in priced[:limit]
+    ]
+
+
+def summary(conn, ended_by=None, filters=NO_FILTER, scope=None):
+    """``(unpaid assignments, total share, assignments missing data)``."""
+    amounts = [amount for _, amount, _ in _pending(conn, ended_by, filters, scope)]
+    complete = [a for a in amounts if a is not None]
+    return len(complete), round(sum(complete), 2), len(amounts) - len(complete)
+
+
+def compute_all(engine, paid_date, ended_by=None, filters=NO_FILTER, dry_run=False, scope=None,
+                admin_id=None):
+    """Insert the share of every unpaid assignment (of ``scope``'s
+    institutes) in one transaction, logged as made by ``admin_id``."""
+    started = time.perf_counter()
+    result = BatchResult()
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            rows, deltas = [], defaultdict(lambda: {'share': 0.0, 'share_count': 0})
+            for r, amount, rate in _pending(conn, ended_by, filters, scope):
+                if amount is None:
+                    result.skipped_incomplete += 1
+                    continue
+                rows.append({
+                    'institute_id': r.institute_id, 'class_id': r.class_id,
+                    'section_id': r.section_id, 'total_students': r.total_students,
+                    'rate_per_student': rate, 'duration_months': r.duration_months,
+                    'total_amount': amount, 'paid_date': paid_date,
+                })
+                delta = deltas[summaries.bucket_key(r.institute_id, r.class_id, r.section_id, paid_date)]
+                delta['share'] += amount
+                delta['share_count'] += 1
+            if rows:
+                result.inserted = len(rows)
+                ids = conn.execute(
+                    InstituteShare.__table__.insert().returning(
+                        InstituteShare.id, sort_by_parameter_order=True), rows
+                ).scalars().all()
+                # A Core INSERT skips the ORM flush hooks.
+                summaries.apply_deltas(conn, deltas)
+                audit.log_rows(conn, InstituteShare, [{'id': i, **r} for i, r in zip(ids, rows)],
+                               admin_id=admin_id)
+            result.total_amount = round(sum(r['total_amount'] for r in rows), 2)
+            if dry_run:
+                trans.rollback()
+            else:
+                trans.commit()
+        except BaseException:
+            trans.rollback()
+            raise
+    result.elapsed = time.perf_counter() - started
+    return result
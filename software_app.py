@@ -1,774 +1,1148 @@
-import os
-import streamlit as st
-from datetime import date
-from sqlalchemy import (
-    Column, Integer, String, Date, ForeignKey, Float,
-    create_engine, func
-)
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker
-import pandas as pd
-
-# --- Database setup ---
-DB_URL = "sqlite:///institutes.db"
-engine = create_engine(DB_URL, echo=False)
-Session = sessionmaker(bind=engine)
-session = Session()
-Base = declarative_base()
-
-# --- Model definitions ---
-class Institute(Base):
-    __tablename__ = 'institutes'
-    id = Column(Integer, primary_key=True)
-    name = Column(String, nullable=False)
-    address = Column(String)
-    focal_person = Column(String)
-    contact = Column(String)
-    agreement_date = Column(Date)
-    rate_per_student = Column(Integer)
-    agreement_path = Column(String)
-    assignments = relationship('Assignment', back_populates='institute')
-
-class ClassModel(Base):
-    __tablename__ = 'classes'
-    id = Column(Integer, primary_key=True)
-    name = Column(String, nullable=False)
-    agency = Column(String)
-    sections = relationship('Section', back_populates='class_model')
-    assignments = relationship('Assignment', back_populates='class_model')
-
-class Section(Base):
-    __tablename__ = 'sections'
-    id = Column(Integer, primary_key=True)
-    class_id = Column(Integer, ForeignKey('classes.id'), nullable=False)
-    name = Column(String, nullable=False)
-    start_date = Column(Date)
-    end_date = Column(Date)
-    duration_months = Column(Integer)
-    class_model = relationship('ClassModel', back_populates='sections')
-    assignments = relationship('Assignment', back_populates='section')
-
-class Assignment(Base):
-    __tablename__ = 'assignments'
-    id = Column(Integer, primary_key=True)
-    institute_id = Column(Integer, ForeignKey('institutes.id'), nullable=False)
-    class_id = Column(Integer, ForeignKey('classes.id'), nullable=False)
-    section_id = Column(Integer, ForeignKey('sections.id'), nullable=False)
-    total_students = Column(Integer)
-    institute = relationship('Institute', back_populates='assignments')
-    class_model = relationship('ClassModel', back_populates='assignments')
-    section = relationship('Section', back_populates='assignments')
-
-class LetterDispatch(Base):
-    __tablename__ = 'letters_dispatch'
-    id = Column(Integer, primary_key=True)
-    date = Column(Date)
-    reference = Column(String)
-    recipient = Column(String)
-
-class LetterReceive(Base):
-    __tablename__ = 'letters_receive'
-    id = Column(Integer, primary_key=True)
-    date = Column(Date)
-    reference = Column(String)
-    sender = Column(String)
-
-class IncomeRegister(Base):
-    __tablename__ = 'income_register'
-    id = Column(Integer, primary_key=True)
-    date = Column(Date)
-    amount = Column(Float)
-    institute_id = Column(Integer, ForeignKey('institutes.id'))
-    class_id = Column(Integer, ForeignKey('classes.id'))
-    section_id = Column(Integer, ForeignKey('sections.id'))
-    institute = relationship('Institute')
-    class_model = relationship('ClassModel')
-    section = relationship('Section')
-
-class ExpenseRegister(Base):
-    __tablename__ = 'expense_register'
-    id = Column(Integer, primary_key=True)
-    date = Column(Date)
-    amount = Column(Float)
-    institute_id = Column(Integer, ForeignKey('institutes.id'))
-    class_id = Column(Integer, ForeignKey('classes.id'))
-    section_id = Column(Integer, ForeignKey('sections.id'))
-    institute = relationship('Institute')
-    class_model = relationship('ClassModel')
-    section = relationship('Section')
-
-class InstituteShare(Base):
-    __tablename__ = 'institute_share'
-    id = Column(Integer, primary_key=True)
-    institute_id = Column(Integer, ForeignKey('institutes.id'))
-    class_id = Column(Integer, ForeignKey('classes.id'))
-    section_id = Column(Integer, ForeignKey('sections.id'))
-    total_students = Column(Integer)
-    rate_per_student = Column(Integer)
-    duration_months = Column(Integer)
-    total_amount = Column(Float)
-    paid_date = Column(Date)
-    institute = relationship('Institute')
-    class_model = relationship('ClassModel')
-    section = relationship('Section')
-
-class Admin(Base):
-    __tablename__ = 'admins'
-    id = Column(Integer, primary_key=True)
-    name = Column(String)
-    designation = Column(String)
-    user_id = Column(String, unique=True)
-    password = Column(String)
-    institute_permission = Column(String)
-
-Base.metadata.create_all(engine)
-
-# --- Style function for dataframes ---
-def style_dataframe(df):
-    return df.style.set_table_styles([
-        {'selector': 'th', 'props': [('background-color', '#5c2f0d'), ('color', '#ffffff'), ('font-weight', 'bold'), ('padding', '10px'), ('font-family', 'Roboto, sans-serif')]},
-        {'selector': 'td', 'props': [('border', '1px solid #e5e7eb'), ('padding', '10px'), ('background-color', '#f8fafc'), ('color', '#1f2937'), ('font-family', 'Roboto, sans-serif')]}
-    ])
-
-# --- App UI ---
-st.markdown("""
-    <style>
-        @import url('https://fonts.googleapis.com/css2?family=Roboto:wght@300;400;500;700&display=swap');
-        body {
-            background: linear-gradient(135deg, #f8fafc, #e5e7eb);
-            font-family: 'Roboto', sans-serif;
-        }
-        .stApp {
-            background: linear-gradient(120deg, #ffffff, #f8fafc);
-            color: #1f2937;
-            max-width: 100%;
-            margin: 0 auto;
-            padding: 0;
-            border-radius: 8px;
-            box-shadow: 0 2px 10px rgba(0, 0, 0, 0.05);
-        }
-        .app-header {
-            width: 100%;
-            text-align: left;
-            margin: 0;
-            padding: 0;
-        }
-        h1, h2, h3 {
-            color: #5c2f0d;
-            background: #bfa3f3;
-            padding: 10px 15px;
-            border-radius: 10px;
-            box-shadow: 0 1px 4px rgba(0, 0, 0, 0.05);
-            font-family: 'Roboto', sans-serif;
-            font-weight: 500;
-        }
-        h1 {
-            text-align: left !important;
-            margin-left: 0;
-            padding-left: 15px;
-            font-size: 2rem;
-            font-weight: 700;
-        }
-        .css-18e3th9 {
-            padding: 2rem;
-        }
-        .stButton > button {
-            background: #b91c1c;
-            color: #ffffff;
-            border: none;
-            border-radius: 6px;
-            padding: 8px 16px;
-            font-weight: 500;
-            font-family: 'Roboto', sans-serif;
-            transition: all 0.2s ease;
-            box-shadow: 0 1px 4px rgba(0, 0, 0, 0.1);
-        }
-        .stButton > button:hover {
-            background: #5c2f0d;
-            transform: translateY(-1px);
-            # box-shadow: 0 2px 6px rgba(0, 0, 0, 0.15);
-        }
-        .stButton > button:disabled {
-            background: #d1d5db;
-            color: #9ca3af;
-            cursor: not-allowed;
-            box-shadow: none;
-        }
-        .stTextInput > div > input, .stTextArea > div > textarea, .stSelectbox > div > select {
-            background-color: #ffffff;
-            border: 1px solid #d1d5db;
-            border-radius: 6px;
-            padding: 8px;
-            color: #1f2937;
-            font-family: 'Roboto', sans-serif;
-            transition: border-color 0.2s ease;
-            box-shadow: 0 1px 2px rgba(0, 0, 0, 0.05);
-        }
-        .stTextInput > div > input:focus, .stTextArea > div > textarea:focus, .stSelectbox > div > select:focus {
-            border-color: #b91c1c;
-            box-shadow: 0 0 6px rgba(185, 28, 28, 0.3);
-        }
-        .stDateInput > div > input {
-            background-color: #ffffff;
-            border: 1px solid #d1d5db;
-            border-radius: 6px;
-            padding: 8px;
-            font-family: 'Roboto', sans-serif;
-        }
-        .stFileUploader > div {
-            background-color: #ffffff;
-            border: 1px solid #d1d5db;
-            border-radius: 6px;
-            padding: 8px;
-        }
-        .stTabs > div > button {
-            background-color: #bfa3f3;
-            color: #ffffff;
-            border-radius: 6px 6px 0 0;
-            margin-right: 4px;
-            padding: 8px 16px;
-            font-weight: 500;
-            font-family: 'Roboto', sans-serif;
-            transition: background-color 0.2s ease;
-        }
-        .stTabs > div > button:hover {
-            background-color: #8b4513;
-        }
-        .stTabs > div > button[aria-selected="true"] {
-            background-color: #b91c1c;
-            color: #ffffff;
-        }
-        .stExpander {
-            background-color: #f8fafc;
-            border: 1px solid #e5e7eb;
-            border-radius: 6px;
-            box-shadow: 0 1px 2px rgba(0, 0, 0, 0.05);
-        }
-        .stMarkdown, .stText {
-            color: #1f2937;
-            font-family: 'Roboto', sans-serif;
-        }
-        .stAlert > div {
-            border-radius: 6px;
-            font-family: 'Roboto', sans-serif;
-        }
-            
-        .st-emotion-cache-16tyu1 h2{
-            padding: 1rem 12px;
-            }
-        .st-emotion-cache-16tyu1 h3{
-            padding: 0.75rem 12px 1rem;
-            margin-top: 10px
-            }
-        .st-emotion-cache-13lcgu3:hover{
-             border-color: #513683;
-            }
-        .st-emotion-cache-10c9vv9 p:hover{
-            color: #513683;
-            }
-        .st-emotion-cache-4uzi61{
-            margin-top: 20px;
-            }
-    </style>
-""", unsafe_allow_html=True)
-
-st.sidebar.markdown("""
-    <style>
-        .sidebar-info {
-            background: #ffffff;
-            padding: 20px;
-            border-radius: 6px;
-            border-left: 6px solid #b91c1c;
-            font-family: 'Roboto', sans-serif;
-            box-shadow: 0 1px 4px rgba(0, 0, 0, 0.05);
-            margin: 8px;
-        }
-        .sidebar-info h3 {
-            color: #1f2937;
-            font-size: 1.25rem;
-            margin-bottom: 10px;
-            font-weight: 500;
-            padding-left: 20%;
-        }
-        .sidebar-info p {
-            color: #1f2937;
-            font-size: 0.875rem;
-            line-height: 1.4;
-        }
-        .sidebar-info ul {
-            padding-left: 20px;
-            font-size: 0.875rem;
-            color: #1f2937;
-        }
-        .sidebar-info ul li {
-            margin-bottom: 6px;
-        }
-        .sidebar-info p em {
-            color: #b91c1c;
-            font-weight: 500;
-        }
-        # .st-emotion-cache-br351g.active{
-        #             color: #513683;
-        #             }
-                    
-        .st-bd{
-                color: #513683;
-                }
-        .st-bn:hover{
-                    color: #513683; 
-                    }
-    </style>
-
-    <div class="sidebar-info">
-        <h3>About This App</h3>
-        <p>This is an <strong>Institute Management System</strong> where you can:</p>
-        <ul>
-            <li>Add, update, or delete institutes</li>
-            <li>Manage class sections</li>
-            <li>Update intitute records</li>
-            <li>Mangement of accounts</li>
-            <li>Visualize the updated reports</li>
-            <li>Store and retrieve data securely</li>
-        </ul>
-        <p style="margin-top:8px;"><em>Tip:</em> Register all institutes first before assigning sections.</p>
-    </div>
-""", unsafe_allow_html=True)
-
-# Updated title section with stronger left-alignment enforcement
-st.markdown("""
-    <style>
-        .title-wrapper {
-            display: block;
-            width: 100%;
-            text-align: left !important;
-            margin: 0 !important;
-            padding: 0 !important;
-        }
-        .title-wrapper h1 {
-            display: inline-block;
-            text-align: left !important;
-            margin-left: 0 !important;
-            padding-left: 15px !important;
-            width: auto;
-            text-shadow: none;
-        }
-        /* Override Streamlit's default container centering */
-        div[data-testid="stAppViewContainer"] > div {
-            text-align: left !important;
-        }
-    </style>
-""", unsafe_allow_html=True)
-
-# Use a container and wrap the title
-with st.container():
-    st.markdown('<div class="title-wrapper"><h1>Institute Management System</h1></div>', unsafe_allow_html=True)
-
-tabs = st.tabs([
-    "Registration", "Institute List", "Classes",
-    "Registers", "Accounts", "Reports", "Admin Panel"
-])
-
-# --- Tab 1: Registration ---
-with tabs[0]:
-    st.header("Institute Registration")
-    with st.form("reg_form"):
-        name = st.text_input("Institute Name")
-        address = st.text_area("Institute Address")
-        focal = st.text_input("Focal Person Name")
-        contact = st.text_input("Contact #")
-        agree_date = st.date_input(
-            "Agreement Signing Date",
-            min_value=date(2000,1,1),
-            max_value=date.today()
-        )
-        rate = st.number_input("Rate Per Student", min_value=0, step=1)
-        pdf_file = st.file_uploader("Upload the Agreement (PDF)", type=["pdf"])
-        if st.form_submit_button("Register Institute"):
-            path = None
-            if pdf_file:
-                os.makedirs("agreements", exist_ok=True)
-                path = os.path.join(
-                    "agreements",
-                    f"{name.replace(' ','_')}_{pdf_file.name}"
-                )
-                open(path, "wb").write(pdf_file.getbuffer())
-            inst = Institute(
-                name=name, address=address, focal_person=focal,
-                contact=contact, agreement_date=agree_date,
-                rate_per_student=rate, agreement_path=path
-            )
-            session.add(inst)
-            session.commit()
-            st.success(f"Registered '{name}' successfully!")
-
-# --- Tab 2: Institute List ---
-with tabs[1]:
-    st.header("Registered Institutes")
-    for inst in session.query(Institute).all():
-        with st.expander(f"{inst.name} (ID: {inst.id})"):
-            with st.form(f"upd_inst_{inst.id}"):
-                nn = st.text_input("Institute Name", inst.name)
-                aa = st.text_area("Institute Address", inst.address)
-                fp = st.text_input("Focal Person Name", inst.focal_person)
-                cc = st.text_input("Contact #", inst.contact)
-                dd = st.date_input(
-                    "Agreement Signing Date",
-                    inst.agreement_date or date.today()
-                )
-                rr = st.number_input("Rate Per Student", inst.rate_per_student or 0)
-                npdf = st.file_uploader("Replace Agreement PDF?", type=["pdf"])
-                if st.form_submit_button("Update"):
-                    if npdf:
-                        os.makedirs("agreements", exist_ok=True)
-                        p = os.path.join(
-                            "agreements",
-                            f"{nn.replace(' ','_')}_{npdf.name}"
-                        )
-                        open(p, "wb").write(npdf.getbuffer())
-                        inst.agreement_path = p
-                    inst.name, inst.address = nn, aa
-                    inst.focal_person, inst.contact = fp, cc
-                    inst.agreement_date, inst.rate_per_student = dd, rr
-                    session.commit()
-                    st.success("Updated!")
-
-# --- Tab 3: Classes & Sections ---
-with tabs[2]:
-    st.header("Class & Section Management")
-    st.subheader("1. Create Class")
-    with st.form("class_form"):
-        cname = st.text_input("Class Name")
-        agency = st.text_input("Agency")
-        if st.form_submit_button("Create Class"):
-            session.add(ClassModel(name=cname, agency=agency))
-            session.commit()
-            st.success("Class created!")
-
-    st.subheader("2. Create Section")
-    classes = session.query(ClassModel).all()
-    if classes:
-        with st.form("sec_form"):
-            sel = st.selectbox("Class", {c.id: f"{c.id}: {c.name}" for c in classes})
-            sname = st.text_input("Section Name")
-            sd = st.date_input("Start Date")
-            ed = st.date_input("End Date", min_value=sd)
-            dur = (ed.year - sd.year)*12 + (ed.month - sd.month)
-            st.write(f"Duration: {dur} month(s)")
-            if st.form_submit_button("Create Section"):
-                session.add(Section(
-                    class_id=sel, name=sname,
-                    start_date=sd, end_date=ed,
-                    duration_months=dur
-                ))
-                session.commit()
-                st.success("Section created!")
-    else:
-        st.info("Create a class first to add sections.")
-
-    st.subheader("3. Assign to Institute")
-    insts = session.query(Institute).all()
-    clss = session.query(ClassModel).all()
-    if insts and clss:
-        with st.form("assign_form"):
-            iid = st.selectbox("Institute", {i.id: f"{i.id}: {i.name}" for i in insts})
-            cid = st.selectbox("Class", {c.id: f"{c.id}: {c.name}" for c in clss})
-            # Only show sections for the selected class
-            secs = session.query(Section).filter(Section.class_id == cid).all()
-            sid = st.selectbox(
-                "Section",
-                {s.id: f"{s.id}: {s.name}" for s in secs} if secs else {0: "No sections available"},
-                disabled=not secs
-            )
-            ts = st.number_input("Total Students", min_value=0)
-            if st.form_submit_button("Assign", disabled=not secs or sid == 0):
-                session.add(Assignment(
-                    institute_id=iid, class_id=cid,
-                    section_id=sid, total_students=ts
-                ))
-                session.commit()
-                st.success("Assigned!")
-            elif not secs:
-                st.warning("No sections available for the selected class. Create a section first.")
-    else:
-        st.info("Ensure at least one institute and class exist.")
-
-# --- Tab 4: Registers ---
-with tabs[3]:
-    st.header("Letters Dispatch & Receive Registers")
-
-    st.subheader("Dispatch Register")
-    with st.form("disp_form"):
-        dd = st.date_input("Date", key="disp_date")
-        ref = st.text_input("Reference No.", key="disp_ref")
-        rec = st.text_input("Recipient", key="disp_rec")
-        if st.form_submit_button("Log Dispatch"):
-            session.add(LetterDispatch(date=dd, reference=ref, recipient=rec))
-            session.commit()
-            st.success("Dispatch logged!")
-
-    st.subheader("Receive Register")
-    with st.form("recv_form"):
-        rd = st.date_input("Date", key="recv_date")
-        rref = st.text_input("Reference No.", key="recv_ref")
-        snd = st.text_input("Sender", key="recv_snd")
-        if st.form_submit_button("Log Receive"):
-            session.add(LetterReceive(date=rd, reference=rref, sender=snd))
-            session.commit()
-            st.success("Receive logged!")
-
-# --- Tab 5: Accounts ---
-with tabs[4]:
-    st.header("Accounts: Income & Expense & Institute Share")
-
-    # Debugging: Display current database state with names
-    with st.expander("Debug: Database State"):
-        st.subheader("Institutes")
-        institutes = session.query(Institute).all()
-        st.write([(i.id, i.name) for i in institutes])
-        
-        st.subheader("Classes")
-        classes = session.query(ClassModel).all()
-        st.write([(c.id, c.name) for c in classes])
-        
-        st.subheader("Sections")
-        sections = session.query(Section).all()
-        section_data = []
-        for s in sections:
-            class_obj = session.query(ClassModel).filter_by(id=s.class_id).first()
-            class_name = class_obj.name if class_obj else "Unknown"
-            section_data.append((s.id, s.name, class_name))
-        st.write(section_data)
-        
-        st.subheader("Assignments")
-        assignments = session.query(Assignment).all()
-        assignment_data = []
-        for a in assignments:
-            inst_obj = session.query(Institute).filter_by(id=a.institute_id).first()
-            class_obj = session.query(ClassModel).filter_by(id=a.class_id).first()
-            section_obj = session.query(Section).filter_by(id=a.section_id).first()
-            inst_name = inst_obj.name if inst_obj else "Unknown"
-            class_name = class_obj.name if class_obj else "Unknown"
-            section_name = section_obj.name if section_obj else "Unknown"
-            assignment_data.append((a.id, inst_name, class_name, section_name, a.total_students))
-        st.write(assignment_data)
-
-    # Get classes with at least one section
-    valid_class_ids = [s.class_id for s in session.query(Section).distinct(Section.class_id).all()]
-    valid_classes = session.query(ClassModel).filter(ClassModel.id.in_(valid_class_ids)).all()
-    class_options = {c.id: f"{c.id}: {c.name}" for c in valid_classes} if valid_classes else {0: "No classes with sections"}
-
-    st.subheader("Income Register")
-    with st.form("inc_form"):
-        idate = st.date_input("Date", key="inc_date")
-        amt = st.number_input("Amount Received", min_value=0.0, step=0.01)
-        iid = st.selectbox(
-            "Institute", {i.id: f"{i.id}: {i.name}" for i in session.query(Institute)},
-            key="inc_inst"
-        )
-        cid = st.selectbox(
-            "Class", class_options,
-            key="inc_cls"
-        )
-        # Refresh session to ensure latest data
-        session.expire_all()
-        sec_list = session.query(Section).filter(Section.class_id == cid).all() if cid != 0 else []
-        sec_options = {s.id: f"{s.id}: {s.name}" for s in sec_list} if sec_list else {0: "No sections available"}
-        sid = st.selectbox(
-            "Section", sec_options,
-            key="inc_sec"
-        )
-        submit_button = st.form_submit_button("Log Income", disabled=(not sec_list or sid == 0))
-        if not valid_classes:
-            st.warning("No classes have sections. Please create a section in the 'Classes' tab under 'Create Section'.")
-        elif not sec_list:
-            st.warning("No sections available for the selected class. Please create a section in the 'Classes' tab under 'Create Section'.")
-        if submit_button and sec_list and sid != 0:
-            session.add(IncomeRegister(
-                date=idate, amount=amt,
-                institute_id=iid, class_id=cid, section_id=sid
-            ))
-            session.commit()
-            st.success("Income logged!")
-        elif submit_button and (not sec_list or sid == 0):
-            st.error("Please select a valid section to log income.")
-
-    st.subheader("Expense Register")
-    with st.form("exp_form"):
-        edate = st.date_input("Date", key="exp_date")
-        eamt = st.number_input("Amount Spent", min_value=0.0, step=0.01)
-        eiid = st.selectbox(
-            "Institute", {i.id: f"{i.id}: {i.name}" for i in session.query(Institute)},
-            key="exp_inst"
-        )
-        ecid = st.selectbox(
-            "Class", class_options,
-            key="exp_cls"
-        )
-        # Refresh session to ensure latest data
-        session.expire_all()
-        sec_list = session.query(Section).filter(Section.class_id == ecid).all() if ecid != 0 else []
-        sec_options = {s.id: f"{s.id}: {s.name}" for s in sec_list} if sec_list else {0: "No sections available"}
-        esid = st.selectbox(
-            "Section", sec_options,
-            key="exp_sec"
-        )
-        submit_button = st.form_submit_button("Log Expense", disabled=(not sec_list or esid == 0))
-        if not valid_classes:
-            st.warning("No classes have sections. Please create a section in the 'Classes' tab under 'Create Section'.")
-        elif not sec_list:
-            st.warning("No sections available for the selected class. Please create a section in the 'Classes' tab under 'Create Section'.")
-        if submit_button and sec_list and esid != 0:
-            session.add(ExpenseRegister(
-                date=edate, amount=eamt,
-                institute_id=eiid, class_id=ecid, section_id=esid
-            ))
-            session.commit()
-            st.success("Expense logged!")
-        elif submit_button and (not sec_list or esid == 0):
-            st.error("Please select a valid section to log expense.")
-
-    st.subheader("Institute Share Calculation")
-    with st.form("share_form"):
-        st.info("Ensure the selected Institute, Class, and Section have a valid assignment created in the 'Classes' tab.")
-        sid2 = st.selectbox(
-            "Institute", {i.id: f"{i.id}: {i.name}" for i in session.query(Institute)},
-            key="share_inst"
-        )
-        cid2 = st.selectbox(
-            "Class", class_options,
-            key="share_cls"
-        )
-        # Refresh session to ensure latest data
-        session.expire_all()
-        sec_list = session.query(Section).filter(Section.class_id == cid2).all() if cid2 != 0 else []
-        sec_options = {s.id: f"{s.id}: {s.name}" for s in sec_list} if sec_list else {0: "No sections available"}
-        sid3 = st.selectbox(
-            "Section", sec_options,
-            key="share_sec"
-        )
-        submit_button = st.form_submit_button("Save Share", disabled=(not sec_list or sid3 == 0))
-        if not valid_classes:
-            st.warning("No classes have sections. Please create a section in the 'Classes' tab under 'Create Section'.")
-        elif not sec_list:
-            st.warning("No sections available for the selected class. Please create a section in the 'Classes' tab under 'Create Section'.")
-        elif sid3 == 0:
-            st.error("Please select a valid section to calculate the institute share.")
-        else:
-            # Validate assignment
-            assign = session.query(Assignment).filter_by(
-                institute_id=sid2, class_id=cid2, section_id=sid3
-            ).first()
-            if not assign:
-                st.warning("No valid assignment found for this Institute-Class-Section combination. Please create a correct assignment in the 'Classes' tab under 'Assign to Institute'.")
-            else:
-                # Verify section belongs to the class
-                section = session.query(Section).filter_by(id=sid3, class_id=cid2).first()
-                if not section:
-                    st.error("Selected section does not belong to the chosen class. Please fix the assignment or create a new one.")
-                else:
-                    rate = session.query(Institute).get(sid2).rate_per_student
-                    duration = section.duration_months
-                    total = assign.total_students * rate * duration
-                    st.write(f"Total Students: {assign.total_students}")
-                    st.write(f"Rate per Student: {rate}")
-                    st.write(f"Duration (months): {duration}")
-                    st.write(f"Total Amount: {total}")
-                    pdate = st.date_input("Paid Date", key="share_date")
-                    if submit_button:
-                        session.add(InstituteShare(
-                            institute_id=sid2, class_id=cid2, section_id=sid3,
-                            total_students=assign.total_students,
-                            rate_per_student=rate, duration_months=duration,
-                            total_amount=total, paid_date=pdate
-                        ))
-                        session.commit()
-                        st.success("Institute share saved!")
-
-# --- Tab 6: Reports ---
-with tabs[5]:
-    st.header("Report Section")
-
-    st.subheader("1. Income Statement (Class Wise)")
-    df_income = pd.read_sql(
-        session.query(
-            ClassModel.name.label('Class'),
-            func.sum(IncomeRegister.amount).label('Total Income')
-        )
-        .join(IncomeRegister, IncomeRegister.class_id == ClassModel.id)
-        .group_by(ClassModel.name)
-        .statement,
-        engine
-    )
-    st.dataframe(style_dataframe(df_income))
-
-    st.subheader("2. Expense Statement (Class Wise)")
-    df_expense = pd.read_sql(
-        session.query(
-            ClassModel.name.label('Class'),
-            func.sum(ExpenseRegister.amount).label('Total Expense')
-        )
-        .join(ExpenseRegister, ExpenseRegister.class_id == ClassModel.id)
-        .group_by(ClassModel.name)
-        .statement,
-        engine
-    )
-    st.dataframe(style_dataframe(df_expense))
-
-    st.subheader("3. Dispatch Register")
-    df_disp = pd.read_sql(session.query(LetterDispatch).statement, engine)
-    st.dataframe(style_dataframe(df_disp))
-
-    st.subheader("4. Receiving Register")
-    df_recv = pd.read_sql(session.query(LetterReceive).statement, engine)
-    st.dataframe(style_dataframe(df_recv))
-
-    st.subheader("5. Profit/Loss Statement (Institute Wise)")
-    df_inc_inst = pd.read_sql(
-        session.query(
-            Institute.name.label('Institute'),
-            func.coalesce(func.sum(IncomeRegister.amount), 0).label('Income')
-        )
-        .outerjoin(IncomeRegister, IncomeRegister.institute_id == Institute.id)
-        .group_by(Institute.name)
-        .statement,
-        engine
-    )
-    df_exp_inst = pd.read_sql(
-        session.query(
-            Institute.name.label('Institute'),
-            func.coalesce(func.sum(ExpenseRegister.amount), 0).label('Expense')
-        )
-        .outerjoin(ExpenseRegister, ExpenseRegister.institute_id == Institute.id)
-        .group_by(Institute.name)
-        .statement,
-        engine
-    )
-    df_pl = df_inc_inst.merge(df_exp_inst, on='Institute', how='outer').fillna(0)
-    df_pl['Profit/Loss'] = df_pl['Income'] - df_pl['Expense']
-    st.dataframe(style_dataframe(df_pl))
-
-# --- Tab 7: Admin Panel ---
-with tabs[6]:
-    st.header("Admin Panel")
-    st.subheader("Create New Admin")
-    with st.form("admin_form"):
-        aname = st.text_input("Admin Name")
-        desig = st.text_input("Designation")
-        uid = st.text_input("User ID")
-        pwd = st.text_input("Password", type="password")
-        perm = st.text_input("Permission (Institute IDs comma-separated)")
-        if st.form_submit_button("Create Admin"):
-            session.add(Admin(
-                name=aname, designation=desig,
-                user_id=uid, password=pwd,
-                institute_permission=perm
-            ))
-            session.commit()
-            st.success(f"Admin '{aname}' created!")
-
-    st.subheader("Existing Admins")
-    df_admins = pd.read_sql(
-        session.query(Admin.id, Admin.name, Admin.designation, Admin.user_id).statement,
-        engine
-    )
-    st.dataframe(style_dataframe(df_admins))
+import logging
+import os
+import time
+import streamlit as st
+from datetime import date
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+import pandas as pd
+
+import agreements
+import archive
+import audit
+import auth
+import dashboard
+import db
+import diagnostics
+import exports
+import importer
+import institutes
+import jobs
+import pickers
+import profiler
+import rates
+import refdata
+import reports
+import scoping
+import search
+import shares
+from migrations import MigrationError
+from db import engine
+from models import (
+    Institute, ClassModel, Section, Assignment, LetterDispatch,
+    LetterReceive, IncomeRegister, ExpenseRegister, InstituteShare, Admin, AdminInstitute,
+    InstituteRate
+)
+
+logger = logging.getLogger(__name__)
+
+# --- Database setup ---
+@st.cache_resource
+def init_database():
+    # Runs once per process, not on every rerun.
+    db.init_db()
+    # Jobs of a previous server process have no worker any more.
+    jobs.recover()
+    return True
+
+def get_session():
+    # One ORM session per browser session; Streamlit runs sessions on
+    # separate threads so they must never share an identity map.
+    if "db_session" not in st.session_state:
+        st.session_state.db_session = db.Session()
+    return st.session_state.db_session
+
+try:
+    init_database()
+except MigrationError as e:
+    st.error(f"Database upgrade failed: {e}")
+    st.stop()
+session = get_session()
+# Start each rerun from a clean transaction so other users' writes are visible.
+session.close()
+
+def read_frame(query):
+    # pandas reads through the engine, outside the session's filter.
+    return pd.read_sql(scoping.restrict(query.statement, scoping.current(session)), engine)
+
+# --- Style function for dataframes ---
+def style_dataframe(df):
+    return df.style.set_table_styles([
+        {'selector': 'th', 'props': [('background-color', '#5c2f0d'), ('color', '#ffffff'), ('font-weight', 'bold'), ('padding', '10px'), ('font-family', 'Roboto, sans-serif')]},
+        {'selector': 'td', 'props': [('border', '1px solid #e5e7eb'), ('padding', '10px'), ('background-color', '#f8fafc'), ('color', '#1f2937'), ('font-family', 'Roboto, sans-serif')]}
+    ])
+
+# --- App UI ---
+st.markdown("""
+    <style>
+        @import url('https://fonts.googleapis.com/css2?family=Roboto:wght@300;400;500;700&display=swap');
+        body {
+            background: linear-gradient(135deg, #f8fafc, #e5e7eb);
+            font-family: 'Roboto', sans-serif;
+        }
+        .stApp {
+            background: linear-gradient(120deg, #ffffff, #f8fafc);
+            color: #1f2937;
+            max-width: 100%;
+            margin: 0 auto;
+            padding: 0;
+            border-radius: 8px;
+            box-shadow: 0 2px 10px rgba(0, 0, 0, 0.05);
+        }
+        .app-header {
+            width: 100%;
+            text-align: left;
+            margin: 0;
+            padding: 0;
+        }
+        h1, h2, h3 {
+            color: #5c2f0d;
+            background: #bfa3f3;
+            padding: 10px 15px;
+            border-radius: 10px;
+            box-shadow: 0 1px 4px rgba(0, 0, 0, 0.05);
+            font-family: 'Roboto', sans-serif;
+            font-weight: 500;
+        }
+        h1 {
+            text-align: left !important;
+            margin-left: 0;
+            padding-left: 15px;
+            font-size: 2rem;
+            font-weight: 700;
+        }
+        .css-18e3th9 {
+            padding: 2rem;
+        }
+        .stButton > button {
+            background: #b91c1c;
+            color: #ffffff;
+            border: none;
+            border-radius: 6px;
+            padding: 8px 16px;
+            font-weight: 500;
+            font-family: 'Roboto', sans-serif;
+            transition: all 0.2s ease;
+            box-shadow: 0 1px 4px rgba(0, 0, 0, 0.1);
+        }
+        .stButton > button:hover {
+            background: #5c2f0d;
+            transform: translateY(-1px);
+            # box-shadow: 0 2px 6px rgba(0, 0, 0, 0.15);
+        }
+        .stButton > button:disabled {
+            background: #d1d5db;
+            color: #9ca3af;
+            cursor: not-allowed;
+            box-shadow: none;
+        }
+        .stTextInput > div > input, .stTextArea > div > textarea, .stSelectbox > div > select {
+            background-color: #ffffff;
+            border: 1px solid #d1d5db;
+            border-radius: 6px;
+            padding: 8px;
+            color: #1f2937;
+            font-family: 'Roboto', sans-serif;
+            transition: border-color 0.2s ease;
+            box-shadow: 0 1px 2px rgba(0, 0, 0, 0.05);
+        }
+        .stTextInput > div > input:focus, .stTextArea > div > textarea:focus, .stSelectbox > div > select:focus {
+            border-color: #b91c1c;
+            box-shadow: 0 0 6px rgba(185, 28, 28, 0.3);
+        }
+        .stDateInput > div > input {
+            background-color: #ffffff;
+            border: 1px solid #d1d5db;
+            border-radius: 6px;
+            padding: 8px;
+            font-family: 'Roboto', sans-serif;
+        }
+        .stFileUploader > div {
+            background-color: #ffffff;
+            border: 1px solid #d1d5db;
+            border-radius: 6px;
+            padding: 8px;
+        }
+        .stTabs > div > button {
+            background-color: #bfa3f3;
+            color: #ffffff;
+            border-radius: 6px 6px 0 0;
+            margin-right: 4px;
+            padding: 8px 16px;
+            font-weight: 500;
+            font-family: 'Roboto', sans-serif;
+            transition: background-color 0.2s ease;
+        }
+        .stTabs > div > button:hover {
+            background-color: #8b4513;
+        }
+        .stTabs > div > button[aria-selected="true"] {
+            background-color: #b91c1c;
+            color: #ffffff;
+        }
+        .stExpander {
+            background-color: #f8fafc;
+            border: 1px solid #e5e7eb;
+            border-radius: 6px;
+            box-shadow: 0 1px 2px rgba(0, 0, 0, 0.05);
+        }
+        .stMarkdown, .stText {
+            color: #1f2937;
+            font-family: 'Roboto', sans-serif;
+        }
+        .stAlert > div {
+            border-radius: 6px;
+            font-family: 'Roboto', sans-serif;
+        }
+            
+        .st-emotion-cache-16tyu1 h2{
+            padding: 1rem 12px;
+            }
+        .st-emotion-cache-16tyu1 h3{
+            padding: 0.75rem 12px 1rem;
+            margin-top: 10px
+            }
+        .st-emotion-cache-13lcgu3:hover{
+             border-color: #513683;
+            }
+        .st-emotion-cache-10c9vv9 p:hover{
+            color: #513683;
+            }
+        .st-emotion-cache-4uzi61{
+            margin-top: 20px;
+            }
+    </style>
+""", unsafe_allow_html=True)
+
+st.sidebar.markdown("""
+    <style>
+        .sidebar-info {
+            background: #ffffff;
+            padding: 20px;
+            border-radius: 6px;
+            border-left: 6px solid #b91c1c;
+            font-family: 'Roboto', sans-serif;
+            box-shadow: 0 1px 4px rgba(0, 0, 0, 0.05);
+            margin: 8px;
+        }
+        .sidebar-info h3 {
+            color: #1f2937;
+            font-size: 1.25rem;
+            margin-bottom: 10px;
+            font-weight: 500;
+            padding-left: 20%;
+        }
+        .sidebar-info p {
+            color: #1f2937;
+            font-size: 0.875rem;
+            line-height: 1.4;
+        }
+        .sidebar-info ul {
+            padding-left: 20px;
+            font-size: 0.875rem;
+            color: #1f2937;
+        }
+        .sidebar-info ul li {
+            margin-bottom: 6px;
+        }
+        .sidebar-info p em {
+            color: #b91c1c;
+            font-weight: 500;
+        }
+        # .st-emotion-cache-br351g.active{
+        #             color: #513683;
+        #             }
+                    
+        .st-bd{
+                color: #513683;
+                }
+        .st-bn:hover{
+                    color: #513683; 
+                    }
+    </style>
+
+    <div class="sidebar-info">
+        <h3>About This App</h3>
+        <p>This is an <strong>Institute Management System</strong> where you can:</p>
+        <ul>
+            <li>Add, update, or delete institutes</li>
+            <li>Manage class sections</li>
+            <li>Update intitute records</li>
+            <li>Mangement of accounts</li>
+            <li>Visualize the updated reports</li>
+            <li>Store and retrieve data securely</li>
+        </ul>
+        <p style="margin-top:8px;"><em>Tip:</em> Register all institutes first before assigning sections.</p>
+    </div>
+""", unsafe_allow_html=True)
+
+# Updated title section with stronger left-alignment enforcement
+st.markdown("""
+    <style>
+        .title-wrapper {
+            display: block;
+            width: 100%;
+            text-align: left !important;
+            margin: 0 !important;
+            padding: 0 !important;
+        }
+        .title-wrapper h1 {
+            display: inline-block;
+            text-align: left !important;
+            margin-left: 0 !important;
+            padding-left: 15px !important;
+            width: auto;
+            text-shadow: none;
+        }
+        /* Override Streamlit's default container centering */
+        div[data-testid="stAppViewContainer"] > div {
+            text-align: left !important;
+        }
+    </style>
+""", unsafe_allow_html=True)
+
+# Use a container and wrap the title
+with st.container():
+    st.markdown('<div class="title-wrapper"><h1>Institute Management System</h1></div>', unsafe_allow_html=True)
+
+# --- Login ---
+def _no_admins():
+    return session.query(Admin.id).first() is None
+
+def first_admin_view():
+    st.header("Create the First Admin")
+    st.caption("There are no admins yet. This admin gets access to all institutes.")
+    with st.form("first_admin_form"):
+        aname = st.text_input("Admin Name")
+        uid = st.text_input("User ID")
+        pwd = st.text_input("Password", type="password")
+        # Checked again on submit: someone else may have created one meanwhile.
+        if st.form_submit_button("Create Admin") and uid and pwd and _no_admins():
+            session.add(Admin(name=aname, user_id=uid, password=auth.hash_password(pwd),
+                              all_institutes=True))
+            session.commit()
+            st.rerun()
+
+def login_view():
+    st.header("Sign In")
+    if session.query(Admin.id).filter(Admin.password.isnot(None)).first() is None:
+        # Admins without a password (e.g. blank ones cleared by migration 7)
+        # get one from the server, never from this page.
+        st.info("No admin has a password yet. Set one on the server with "
+                "`python manage.py set-password USER_ID`.")
+    with st.form("login_form"):
+        uid = st.text_input("User ID", key="login_uid")
+        pwd = st.text_input("Password", type="password", key="login_pwd")
+        if st.form_submit_button("Sign In"):
+            try:
+                st.session_state.auth_token = auth.login(session, uid, pwd)
+            except auth.LoginError as e:
+                st.error(str(e))
+            else:
+                st.rerun()
+
+# The password is checked once at sign-in; later reruns only check the
+# signed token against the in-memory session store.
+login = auth.current(st.session_state.get("auth_token"))
+if login is None:
+    st.session_state.pop("admin_id", None)
+    if _no_admins():
+        first_admin_view()
+    else:
+        login_view()
+    st.stop()
+st.session_state.admin_id = login.admin_id
+# Written to the audit log with every change of this rerun.
+session.info["admin_id"] = login.admin_id
+# Every query of the rerun sees only the admin's institutes (scoping.py).
+scoping.scope(session, login.admin_id)
+
+with st.sidebar:
+    st.caption(f"Signed in as {login.name}")
+    if st.button("Sign out", key="logout"):
+        auth.logout(st.session_state.pop("auth_token", None))
+        st.session_state.pop("my_jobs", None)
+        st.rerun()
+
+# --- Background jobs ---
+JOB_POLL_SECONDS = 2
+
+def submit_job(kind, **params):
+    job_id = jobs.submit(kind, **params)
+    st.session_state.setdefault("my_jobs", []).append(job_id)
+    st.info(f"Started job #{job_id}. Follow it under Background Jobs in the sidebar.")
+
+def _job_file(path):
+    # Opened on Streamlit's download thread when the button is clicked.
+    return lambda: open(path, "rb")
+
+def jobs_panel():
+    # Drawn after the tabs so a job submitted on this rerun is listed.
+    with db.Session() as job_session:
+        mine = jobs.get(job_session, st.session_state.get("my_jobs", []))
+    active = any(j.status in jobs.ACTIVE for j in mine)
+
+    @st.fragment(run_every=JOB_POLL_SECONDS if active else None)
+    def panel():
+        with db.Session() as job_session:
+            current = jobs.get(job_session, st.session_state.get("my_jobs", []))
+        st.subheader("Background Jobs")
+        for j in current[:10]:
+            st.markdown(f"**{jobs.label(j)}** · {j.status}")
+            if j.status in jobs.ACTIVE:
+                st.progress(j.progress, text=j.message)
+            elif j.status == "failed":
+                st.error(j.message or "Failed")
+            else:
+                st.caption(j.message)
+            if j.status == "done" and j.result_path and os.path.exists(j.result_path):
+                st.download_button(
+                    "Download", data=_job_file(j.result_path),
+                    file_name=os.path.basename(j.result_path),
+                    on_click="ignore", key=f"job_download_{j.id}"
+                )
+        if active and not any(j.status in jobs.ACTIVE for j in current):
+            # Finished: redraw the app so the tabs show the new data and polling stops.
+            st.rerun()
+
+    if mine:
+        with st.sidebar:
+            panel()
+
+# --- Dashboard ---
+# Range choice -> months back from today (None = everything on record).
+TREND_RANGES = {"Last 12 months": 12, "Last 3 years": 36, "Last 5 years": 60, "All": None}
+
+def dashboard_view():
+    st.header("Dashboard")
+    today = date.today()
+    k = dashboard.kpis(session, today)
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric(f"Income {k.month}", f"{k.income:,.0f}", f"{k.income - k.last_income:,.0f}")
+    c2.metric(f"Expense {k.month}", f"{k.expense:,.0f}", f"{k.expense - k.last_expense:,.0f}",
+              delta_color="inverse")
+    c3.metric("Outstanding shares", f"{k.outstanding:,.0f}",
+              help=f"{k.unpaid} ended sections without a share paid yet")
+    c4.metric("Students", f"{k.students:,}")
+
+    st.subheader("Students per agency")
+    agencies = dashboard.students_per_agency(session)
+    if agencies:
+        st.bar_chart(pd.DataFrame(agencies, columns=["Agency", "Students"]).set_index("Agency"))
+    else:
+        st.info("No students assigned yet.")
+
+    st.subheader("Monthly income by institute")
+    span = TREND_RANGES[st.selectbox("Range", list(TREND_RANGES), key="dash_range")]
+    start = None
+    if span is not None:
+        first = today.year * 12 + today.month - span
+        start = date(first // 12, first % 12 + 1, 1)
+    period, points = dashboard.income_trend(session, start, today)
+    if points:
+        trend = (pd.DataFrame(points, columns=["Month", "Institute", "Income"])
+                 .pivot_table(index="Month", columns="Institute", values="Income", aggfunc="sum"))
+        st.line_chart(trend)
+        if period > 1:
+            st.caption(f"Each point sums {period} months.")
+    else:
+        st.info("No income logged in this range.")
+    st.caption(f"Figures as of {time.strftime('%H:%M:%S', time.localtime(k.computed_at))}; "
+               f"refreshed after any change, or every {dashboard.TTL:.0f} s.")
+
+# --- Tab 1: Registration ---
+def registration_view():
+    st.header("Institute Registration")
+    with st.form("reg_form"):
+        name = st.text_input("Institute Name")
+        address = st.text_area("Institute Address")
+        focal = st.text_input("Focal Person Name")
+        contact = st.text_input("Contact #")
+        agree_date = st.date_input(
+            "Agreement Signing Date",
+            min_value=date(2000,1,1),
+            max_value=date.today()
+        )
+        rate = st.number_input("Rate Per Student", min_value=0, step=1)
+        pdf_file = st.file_uploader("Upload the Agreement (PDF)", type=["pdf"])
+        if st.form_submit_button("Register Institute"):
+            inst = Institute(
+                name=name, address=address, focal_person=focal,
+                contact=contact, agreement_date=agree_date,
+                rate_per_student=rate
+            )
+            session.add(inst)
+            session.flush()
+            inst_id = inst.id
+            first = rates.first_version(inst_id, rate)
+            if first is not None:
+                session.add(InstituteRate(**first))
+            scope = scoping.current(session)
+            if scope is not None:
+                # A restricted admin keeps access to what they register.
+                session.add(AdminInstitute(admin_id=scope.admin_id, institute_id=inst_id))
+            session.commit()
+            if pdf_file:
+                # Hashing and writing the PDF happen off the rerun.
+                agreements.attach_async(inst_id, pdf_file, pdf_file.name)
+            st.success(f"Registered '{name}' successfully!")
+
+# --- Tab 2: Institute List ---
+def _reset_institute_pages():
+    st.session_state.inst_cursors = [None]
+
+def _next_institute_page(last_id):
+    st.session_state.inst_cursors.append(last_id)
+
+def _prev_institute_page():
+    if len(st.session_state.inst_cursors) > 1:
+        st.session_state.inst_cursors.pop()
+
+def institute_list_view():
+    st.header("Registered Institutes")
+    if "inst_cursors" not in st.session_state:
+        _reset_institute_pages()
+    c1, c2 = st.columns([3, 1])
+    term = c1.text_input(
+        "Search by name, focal person or contact",
+        key="inst_search", on_change=_reset_institute_pages
+    )
+    page_size = c2.selectbox(
+        "Page size", institutes.PAGE_SIZES,
+        index=institutes.PAGE_SIZES.index(institutes.DEFAULT_PAGE_SIZE),
+        key="inst_page_size", on_change=_reset_institute_pages
+    )
+    total = institutes.count_institutes(session, term)
+    cursors = st.session_state.inst_cursors
+    rows, has_next = institutes.institute_page(
+        session, term, after_id=cursors[-1], page_size=page_size
+    )
+    first = (len(cursors) - 1) * page_size
+    st.caption(
+        f"Showing {first + 1 if rows else 0}-{first + len(rows)} of {total} institute(s)"
+    )
+    st.dataframe(style_dataframe(pd.DataFrame(
+        [tuple(r) for r in rows],
+        columns=["ID", "Name", "Focal Person", "Contact", "Rate Per Student"]
+    )))
+    p1, p2, _ = st.columns([1, 1, 4])
+    p1.button("Previous", disabled=len(cursors) == 1, on_click=_prev_institute_page)
+    p2.button(
+        "Next", disabled=not has_next,
+        on_click=_next_institute_page, args=(rows[-1].id if rows else None,)
+    )
+
+    # Only the selected institute gets an edit form.
+    labels = {r.id: f"{r.id}: {r.name}" for r in rows}
+    picked = st.selectbox(
+        "Edit institute", [None] + list(labels),
+        format_func=lambda i: labels.get(i, "Select an institute..."),
+        key="inst_edit_pick"
+    )
+    inst = session.get(Institute, picked) if picked else None
+    if inst:
+        with st.form(f"upd_inst_{inst.id}"):
+            nn = st.text_input("Institute Name", inst.name)
+            aa = st.text_area("Institute Address", inst.address)
+            fp = st.text_input("Focal Person Name", inst.focal_person)
+            cc = st.text_input("Contact #", inst.contact)
+            dd = st.date_input(
+                "Agreement Signing Date",
+                inst.agreement_date or date.today()
+            )
+            rr = st.number_input("Rate Per Student", inst.rate_per_student or 0)
+            r_from = st.date_input("New rate applies from", date.today(), key=f"rate_from_{inst.id}")
+            npdf = st.file_uploader("Replace Agreement PDF?", type=["pdf"])
+            if st.form_submit_button("Update"):
+                inst.name, inst.address = nn, aa
+                inst.focal_person, inst.contact = fp, cc
+                inst.agreement_date = dd
+                repriced = None
+                if rr != (inst.rate_per_student or 0):
+                    repriced = rates.set_rate(session, inst.id, int(rr), r_from)
+                session.commit()
+                if repriced and repriced.repriced:
+                    st.info(f"{repriced.repriced} unpaid share(s) recalculated for the new rate.")
+                if repriced and repriced.paid_differs:
+                    st.warning(
+                        f"{repriced.paid_differs} paid share(s) would come to "
+                        f"{repriced.paid_difference:+,.2f} in total at the new rate. "
+                        "Paid amounts are left as they were paid."
+                    )
+                if npdf:
+                    agreements.attach_async(inst.id, npdf, npdf.name)
+                    st.info("The new agreement is being stored and will show here shortly.")
+                st.success("Updated!")
+        schedule = rates.versions(session, inst.id)
+        if schedule:
+            with st.expander("Rate history"):
+                st.dataframe(style_dataframe(pd.DataFrame(
+                    [{"From": None if v.effective_from == rates.OPEN_START else v.effective_from,
+                      "Rate": v.rate} for v in schedule]
+                )))
+        with st.expander("Change history"):
+            conn = session.connection()
+            changes = audit.history(conn, Institute, inst.id)
+            if changes:
+                st.dataframe(style_dataframe(pd.DataFrame([
+                    {"When": when, "Admin": admin_id, "Action": action,
+                     "Changes": "; ".join(
+                         f"{k}: {v[0]} -> {v[1]}" if action == "update" else f"{k}: {v}"
+                         for k, v in values.items()
+                     )}
+                    for when, admin_id, action, values in reversed(changes)
+                ])))
+            else:
+                st.caption("No changes recorded since auditing started.")
+            on = st.date_input("Rate per student on", key=f"rate_on_{inst.id}")
+            rate = audit.value_at(conn, Institute, inst.id, "rate_per_student", on)
+            st.write(f"Rate on {on}: {'not set' if rate is None else rate}")
+        if inst.agreement_path and os.path.exists(inst.agreement_path):
+            meta = inst.agreement
+            if meta:
+                pages = f", {meta.page_count} page(s)" if meta.page_count else ""
+                st.caption(f"Agreement: {meta.original_name or 'PDF'} ({meta.size / 1024:.0f} KB{pages})")
+            st.download_button(
+                "View / download agreement",
+                data=agreements.reader(inst.agreement_path),
+                file_name=(meta.original_name if meta and meta.original_name
+                           else os.path.basename(inst.agreement_path)),
+                mime="application/pdf", on_click="ignore",
+                key=f"agreement_{inst.id}"
+            )
+
+# --- Tab 3: Classes & Sections ---
+def classes_view():
+    st.header("Class & Section Management")
+    st.subheader("1. Create Class")
+    with st.form("class_form"):
+        cname = st.text_input("Class Name")
+        agency = st.text_input("Agency")
+        if st.form_submit_button("Create Class"):
+            session.add(ClassModel(name=cname, agency=agency))
+            session.commit()
+            st.success("Class created!")
+
+    st.subheader("2. Create Section")
+    class_labels = refdata.classes(session)
+    if class_labels:
+        with st.form("sec_form"):
+            sel = st.selectbox("Class", class_labels)
+            sname = st.text_input("Section Name")
+            sd = st.date_input("Start Date")
+            ed = st.date_input("End Date", min_value=sd)
+            # Counted by the day, both dates included; shares use the dates.
+            exact = rates.months(sd, ed)
+            dur = round(exact)
+            st.write(f"Duration: {exact:.2f} month(s)")
+            if st.form_submit_button("Create Section"):
+                session.add(Section(
+                    class_id=sel, name=sname,
+                    start_date=sd, end_date=ed,
+                    duration_months=dur
+                ))
+                session.commit()
+                st.success("Section created!")
+    else:
+        st.info("Create a class first to add sections.")
+
+    st.subheader("3. Assign to Institute")
+
+    @st.fragment
+    @profiler.tracked("Assign form")
+    def assign_form():
+        # Picker outside the form so the section list follows the class
+        # without a submit; only this fragment reruns on each choice.
+        iid, cid, sid = pickers.assignment_picker(session, "asg", assigned=False)
+        with st.form("assign_form"):
+            ts = st.number_input("Total Students", min_value=0)
+            if st.form_submit_button("Assign", disabled=sid is None):
+                session.add(Assignment(
+                    institute_id=iid, class_id=cid,
+                    section_id=sid, total_students=ts
+                ))
+                try:
+                    session.commit()
+                    st.success("Assigned!")
+                except IntegrityError:
+                    session.rollback()
+                    st.error("This section is already assigned to the selected institute.")
+            elif iid is None or not class_labels:
+                st.info("Ensure at least one institute and class exist.")
+            elif sid is None:
+                st.warning("No unassigned sections in the selected class. Create a section first.")
+
+    assign_form()
+
+# --- Tab 4: Registers ---
+def registers_view():
+    st.header("Letters Dispatch & Receive Registers")
+
+    st.subheader("Dispatch Register")
+    with st.form("disp_form"):
+        dd = st.date_input("Date", key="disp_date")
+        ref = st.text_input("Reference No.", key="disp_ref")
+        rec = st.text_input("Recipient", key="disp_rec")
+        if st.form_submit_button("Log Dispatch"):
+            session.add(LetterDispatch(date=dd, reference=ref, recipient=rec))
+            session.commit()
+            st.success("Dispatch logged!")
+
+    st.subheader("Receive Register")
+    with st.form("recv_form"):
+        rd = st.date_input("Date", key="recv_date")
+        rref = st.text_input("Reference No.", key="recv_ref")
+        snd = st.text_input("Sender", key="recv_snd")
+        if st.form_submit_button("Log Receive"):
+            session.add(LetterReceive(date=rd, reference=rref, sender=snd))
+            session.commit()
+            st.success("Receive logged!")
+
+# --- Tab 5: Accounts ---
+def accounts_view():
+    st.header("Accounts: Income & Expense & Institute Share")
+
+    # Debugging: on-demand snapshot of the current database state
+    if st.toggle("Debug: Database State", key="debug_state"):
+        with st.container(border=True):
+            d1, d2 = st.columns(2)
+            dbg_size = d1.selectbox("Rows per list", (25, 50, 100), key="debug_page_size")
+            dbg_page = d2.number_input("Page", min_value=1, step=1, key="debug_page")
+            offset = (dbg_page - 1) * dbg_size
+            with db.QueryCounter() as qc:
+                n_inst, n_cls, n_sec, n_asg = diagnostics.table_counts(session)
+                inst_rows = diagnostics.institute_rows(session, dbg_size, offset)
+                cls_rows = diagnostics.class_rows(session, dbg_size, offset)
+                sec_rows = diagnostics.section_rows(session, dbg_size, offset)
+                asg_rows = diagnostics.assignment_rows(session, dbg_size, offset)
+            logger.info("debug snapshot: %d queries in %.1f ms", qc.count, qc.elapsed * 1000)
+            st.caption(f"{qc.count} queries, {qc.elapsed * 1000:.1f} ms")
+
+            st.subheader(f"Institutes ({n_inst})")
+            st.write([tuple(r) for r in inst_rows])
+
+            st.subheader(f"Classes ({n_cls})")
+            st.write([tuple(r) for r in cls_rows])
+
+            st.subheader(f"Sections ({n_sec})")
+            st.write([tuple(r) for r in sec_rows])
+
+            st.subheader(f"Assignments ({n_asg})")
+            st.write([tuple(r) for r in asg_rows])
+
+    # The pickers sit outside the forms, in fragments, and offer only the
+    # classes and sections assigned to the chosen institute.
+    NO_ASSIGNMENT = "No assignment for this institute. Please create one in the 'Classes' tab under 'Assign to Institute'."
+
+    st.subheader("Income Register")
+
+    @st.fragment
+    @profiler.tracked("Income form")
+    def income_form():
+        iid, cid, sid = pickers.assignment_picker(session, "inc")
+        with st.form("inc_form"):
+            idate = st.date_input("Date", key="inc_date")
+            amt = st.number_input("Amount Received", min_value=0.0, step=0.01)
+            submit_button = st.form_submit_button("Log Income", disabled=sid is None)
+            if sid is None:
+                st.warning(NO_ASSIGNMENT)
+            elif submit_button:
+                session.add(IncomeRegister(
+                    date=idate, amount=amt,
+                    institute_id=iid, class_id=cid, section_id=sid
+                ))
+                session.commit()
+                st.success("Income logged!")
+
+    income_form()
+
+    st.subheader("Expense Register")
+
+    @st.fragment
+    @profiler.tracked("Expense form")
+    def expense_form():
+        eiid, ecid, esid = pickers.assignment_picker(session, "exp")
+        with st.form("exp_form"):
+            edate = st.date_input("Date", key="exp_date")
+            eamt = st.number_input("Amount Spent", min_value=0.0, step=0.01)
+            submit_button = st.form_submit_button("Log Expense", disabled=esid is None)
+            if esid is None:
+                st.warning(NO_ASSIGNMENT)
+            elif submit_button:
+                session.add(ExpenseRegister(
+                    date=edate, amount=eamt,
+                    institute_id=eiid, class_id=ecid, section_id=esid
+                ))
+                session.commit()
+                st.success("Expense logged!")
+
+    expense_form()
+
+    st.subheader("Institute Share Calculation")
+
+    @st.fragment
+    @profiler.tracked("Share form")
+    def share_form():
+        sid2, cid2, sid3 = pickers.assignment_picker(session, "share")
+        with st.form("share_form"):
+            if sid3 is None:
+                st.form_submit_button("Save Share", disabled=True)
+                st.warning(NO_ASSIGNMENT)
+                return
+            students = refdata.assignments(session, sid2)[(cid2, sid3)]
+            sec = session.get(Section, sid3)
+            duration = sec.duration_months
+            total, rate = rates.load(session, [sid2]).share(
+                sid2, students, sec.start_date, sec.end_date, duration
+            )
+            st.write(f"Total Students: {students}")
+            st.write(f"Rate per Student: {rate}")
+            if sec.start_date and sec.end_date:
+                st.write(f"Duration (months): {rates.months(sec.start_date, sec.end_date):.2f}"
+                         f" ({sec.start_date} to {sec.end_date})")
+            else:
+                st.write(f"Duration (months): {duration}")
+            st.write(f"Total Amount: {total}")
+            pdate = st.date_input("Paid Date", key="share_date")
+            if total is None:
+                st.form_submit_button("Save Share", disabled=True)
+                st.warning("Students, rate or section dates are missing for this assignment.")
+            elif st.form_submit_button("Save Share"):
+                session.add(InstituteShare(
+                    institute_id=sid2, class_id=cid2, section_id=sid3,
+                    total_students=students,
+                    rate_per_student=rate, duration_months=duration,
+                    total_amount=total, paid_date=pdate
+                ))
+                session.commit()
+                st.success("Institute share saved!")
+
+    share_form()
+
+    st.subheader("Compute All Shares")
+    st.caption("Saves the share of every assignment that has none yet, in one step.")
+    with st.form("batch_share_form"):
+        b1, b2 = st.columns(2)
+        ended_by = b1.date_input("Sections ended by", value=date.today(), key="batch_ended_by")
+        batch_paid = b2.date_input("Paid Date", key="batch_paid_date")
+        b3, b4 = st.columns(2)
+        do_preview = b3.form_submit_button("Preview")
+        do_save = b4.form_submit_button("Save All Shares")
+    if do_preview:
+        n_unpaid, total, incomplete = shares.summary(session.connection(), ended_by, scope=scoping.current(session))
+        st.write(f"{n_unpaid} unpaid assignment(s), total share {total:,.2f}")
+        if incomplete:
+            st.warning(f"{incomplete} assignment(s) will be skipped: missing students, rate or duration.")
+        if n_unpaid:
+            df_batch = pd.DataFrame(shares.preview(session, ended_by))
+            if n_unpaid > len(df_batch):
+                st.caption(f"Showing the largest {len(df_batch)}.")
+            st.dataframe(style_dataframe(df_batch))
+    if do_save:
+        submit_job("shares", paid_date=batch_paid.isoformat(), ended_by=ended_by.isoformat(),
+                   admin_id=st.session_state.get("admin_id"))
+
+# --- Tab 6: Reports ---
+def _picked_id(event, df):
+    # ID of the row clicked in a selectable dataframe, if any.
+    rows = event.selection.rows if event else []
+    return int(df.iloc[rows[0]]["ID"]) if rows else None
+
+def reports_view():
+    st.header("Report Section")
+
+    st.subheader("Search")
+    query = st.text_input(
+        "Search letters and institutes", key="search_q",
+        placeholder="Reference, recipient, sender, institute name, address or focal person"
+    )
+    if query.strip():
+        found = search.search(session.connection(), query, scope=scoping.current(session))
+        st.caption(f"{found.total} match(es) in {found.elapsed * 1000:.1f} ms ({found.backend})")
+        for name, rows in found.hits.items():
+            if rows:
+                st.markdown(f"**{search.SOURCES[name].label}**")
+                st.dataframe(style_dataframe(pd.DataFrame(rows)))
+
+    # Shared filter bar; every report applies it in SQL.
+    f1, f2, f3, f4, f5 = st.columns(5)
+    r_start = f1.date_input("From", value=None, key="rep_from")
+    r_end = f2.date_input("To", value=None, key="rep_to")
+    r_inst_opts = {None: "All institutes"}
+    r_inst_opts.update(refdata.institutes(session))
+    r_inst = f3.selectbox("Institute", list(r_inst_opts), format_func=r_inst_opts.get, key="rep_inst")
+    r_cls_opts = {None: "All classes"}
+    r_cls_opts.update(refdata.classes(session))
+    r_cls = f4.selectbox("Class", list(r_cls_opts), format_func=r_cls_opts.get, key="rep_cls")
+    r_sec_opts = {None: "All sections"}
+    if r_cls is not None:
+        r_sec_opts.update(refdata.sections(session, r_cls))
+    r_sec = f5.selectbox(
+        "Section", list(r_sec_opts), format_func=r_sec_opts.get,
+        key="rep_sec", disabled=r_cls is None
+    )
+    filters = reports.ReportFilter(r_start, r_end, r_inst, r_cls, r_sec)
+
+    st.subheader("1. Income Statement (Class Wise)")
+    df_income = read_frame(reports.income_by_class(session, filters))
+    inc_pick = st.dataframe(
+        style_dataframe(df_income), key="rep_inc_tbl",
+        on_select="rerun", selection_mode="single-row"
+    )
+
+    st.subheader("2. Expense Statement (Class Wise)")
+    df_expense = read_frame(reports.expense_by_class(session, filters))
+    exp_pick = st.dataframe(
+        style_dataframe(df_expense), key="rep_exp_tbl",
+        on_select="rerun", selection_mode="single-row"
+    )
+
+    # Drill-down: class total -> sections -> individual register entries
+    drill_cls = _picked_id(inc_pick, df_income) or _picked_id(exp_pick, df_expense) or filters.class_id
+    if drill_cls:
+        st.markdown(f"**Sections of {r_cls_opts.get(drill_cls, drill_cls)}**")
+        cls_filters = reports.ReportFilter(
+            filters.start, filters.end, filters.institute_id, drill_cls, filters.section_id
+        )
+        df_secs = read_frame(reports.class_sections(session, cls_filters))
+        sec_pick = st.dataframe(
+            style_dataframe(df_secs), key="rep_sec_tbl",
+            on_select="rerun", selection_mode="single-row"
+        )
+        drill_sec = _picked_id(sec_pick, df_secs) or filters.section_id
+        if drill_sec:
+            st.markdown(f"**Entries for section {drill_sec}** (latest {reports.MAX_ROWS})")
+            sec_filters = reports.ReportFilter(
+                filters.start, filters.end, filters.institute_id, drill_cls, drill_sec
+            )
+            df_entries = read_frame(reports.register_entries(session, sec_filters))
+            st.dataframe(style_dataframe(df_entries))
+    else:
+        st.caption("Select a row in a class-wise statement to drill down to sections.")
+
+    st.subheader("3. Dispatch Register")
+    df_disp = read_frame(reports.dispatch_register(session, filters))
+    st.dataframe(style_dataframe(df_disp))
+
+    st.subheader("4. Receiving Register")
+    df_recv = read_frame(reports.receive_register(session, filters))
+    st.dataframe(style_dataframe(df_recv))
+
+    st.subheader("5. Profit/Loss Statement (Institute Wise)")
+    df_pl = read_frame(reports.profit_loss_by_institute(session, filters))
+    st.dataframe(style_dataframe(df_pl))
+
+    st.subheader("6. Export")
+    x1, x2 = st.columns(2)
+    x_name = x1.selectbox(
+        "Register or report", list(exports.EXPORTS),
+        format_func=lambda n: exports.EXPORTS[n][0], key="exp_name"
+    )
+    x_fmt = x2.selectbox("Format", list(exports.FORMATS), key="exp_fmt")
+    st.caption("The file is built in the background; download it from Background Jobs in the sidebar.")
+    if st.button("Export", key="exp_submit"):
+        submit_job(
+            "export", name=x_name, fmt=x_fmt, admin_id=st.session_state.get("admin_id"),
+            start=filters.start and filters.start.isoformat(),
+            end=filters.end and filters.end.isoformat(),
+            **filters.keys()
+        )
+
+# --- Tab 7: Admin Panel ---
+def admin_view():
+    st.header("Admin Panel")
+    if scoping.current(session) is not None:
+        # Imports, rollup rebuilds and archiving work on every institute.
+        st.info("The Admin Panel is only available to admins with access to all institutes.")
+        return
+    st.subheader("Create New Admin")
+    with st.form("admin_form"):
+        aname = st.text_input("Admin Name")
+        desig = st.text_input("Designation")
+        uid = st.text_input("User ID")
+        pwd = st.text_input("Password", type="password")
+        everything = st.checkbox("All institutes", key="admin_all")
+        inst_opts = refdata.institutes(session)
+        allowed = st.multiselect(
+            "Institutes", list(inst_opts), format_func=inst_opts.get, key="admin_insts",
+            help="Ignored when All institutes is ticked."
+        )
+        if st.form_submit_button("Create Admin"):
+            session.add(Admin(
+                name=aname, designation=desig,
+                user_id=uid, password=auth.hash_password(pwd) if pwd else None,
+                all_institutes=everything,
+                institutes=[] if everything else [AdminInstitute(institute_id=i) for i in allowed]
+            ))
+            session.commit()
+            st.success(f"Admin '{aname}' created!")
+
+    st.subheader("Bulk CSV Import")
+    with st.form("import_form"):
+        imp_target = st.selectbox("Import into", list(importer.TARGETS), key="imp_target")
+        t = importer.TARGETS[imp_target]
+        cols = list(t.fields) + list(t.refs)
+        st.caption(
+            "Columns: " + ", ".join(cols)
+            + (". institute/class/section accept an id or a name." if t.refs else ".")
+        )
+        imp_file = st.file_uploader("CSV file", type=["csv"], key="imp_file")
+        imp_dry = st.checkbox("Dry run (validate only)", value=True, key="imp_dry")
+        imp_skip = st.checkbox("Import valid rows even if some rows fail", key="imp_skip")
+        if st.form_submit_button("Import") and imp_file:
+            # The worker process reads the upload from disk.
+            path = jobs.upload_path(imp_file.name)
+            with open(path, "wb") as out:
+                out.write(imp_file.getbuffer())
+            submit_job("import", target=imp_target, path=path, dry_run=imp_dry, skip_errors=imp_skip)
+
+    st.subheader("Report Rollup")
+    st.caption("Recompute register_summary from the registers, e.g. after editing them outside the app.")
+    if st.button("Rebuild rollup", key="rollup_rebuild"):
+        submit_job("rebuild_summaries")
+
+    st.subheader("Archive Closed Years")
+    st.caption(
+        "Moves income and expense entries of past calendar years to read-only Parquet files; "
+        "reports and exports still include them, but they can no longer be edited."
+    )
+    with st.form("archive_form"):
+        through = st.number_input(
+            "Archive years up to", min_value=2000, max_value=date.today().year - 1,
+            value=date.today().year - 2, step=1, key="archive_through"
+        )
+        if st.form_submit_button("Archive"):
+            submit_job("archive", through=int(through))
+    df_parts = pd.DataFrame([
+        {"Register": p.table_name, "Year": p.year, "Rows": p.rows,
+         "Amount": p.amount, "MB": round(p.size_bytes / 1e6, 2)}
+        for p in archive.partitions(session.connection())
+    ])
+    if not df_parts.empty:
+        st.dataframe(style_dataframe(df_parts))
+
+    st.subheader("Recent Jobs")
+    df_jobs = pd.DataFrame([
+        {"ID": j.id, "Job": jobs.TASKS.get(j.kind, (j.kind,))[0], "Status": j.status,
+         "Progress": round(j.progress * 100), "Message": j.message,
+         "Created": j.created_at, "Finished": j.finished_at}
+        for j in jobs.recent(session)
+    ])
+    if df_jobs.empty:
+        st.info("No jobs yet.")
+    else:
+        st.dataframe(style_dataframe(df_jobs))
+
+    st.subheader("Existing Admins")
+    granted = (
+        select(func.count()).where(AdminInstitute.admin_id == Admin.id).scalar_subquery()
+    )
+    df_admins = read_frame(session.query(
+        Admin.id, Admin.name, Admin.designation, Admin.user_id,
+        Admin.all_institutes.label("all_institutes"), granted.label("institutes")
+    ))
+    st.dataframe(style_dataframe(df_admins))
+
+    st.subheader("Edit Admin")
+    admin_opts = dict(session.query(Admin.id, Admin.user_id).order_by(Admin.user_id).all())
+    edit_id = st.selectbox("Admin", list(admin_opts), format_func=admin_opts.get, key="admin_edit")
+    target = session.get(Admin, edit_id) if edit_id is not None else None
+    if target is not None:
+        with st.form(f"admin_edit_form_{target.id}"):
+            new_pwd = st.text_input("New password", type="password",
+                                    help="Leave empty to keep the current one.")
+            e_all = st.checkbox("All institutes", value=target.all_institutes)
+            inst_opts = refdata.institutes(session)
+            current = sorted(g.institute_id for g in target.institutes)
+            e_allowed = st.multiselect("Institutes", list(inst_opts), default=current,
+                                       format_func=inst_opts.get)
+            if st.form_submit_button("Save Admin"):
+                access_changed = e_all != target.all_institutes or (
+                    not e_all and sorted(e_allowed) != current)
+                if new_pwd:
+                    target.password = auth.hash_password(new_pwd)
+                if access_changed:
+                    target.all_institutes = e_all
+                    target.institutes = [] if e_all else [AdminInstitute(institute_id=i)
+                                                          for i in e_allowed]
+                session.commit()
+                if new_pwd or access_changed:
+                    # Their open sessions were granted under the old password
+                    # or access; they sign in again.
+                    auth.end_sessions(target.id)
+                st.success(f"Admin '{target.user_id}' saved.")
+        if target.id == st.session_state.get("admin_id"):
+            st.caption("You cannot delete your own account.")
+        elif st.button(f"Delete admin '{target.user_id}'", key=f"admin_delete_{target.id}"):
+            session.delete(target)
+            session.commit()
+            auth.end_sessions(edit_id)
+            st.rerun()
+
+    st.subheader("Query Profiler")
+    st.caption(
+        f"Statements since the server started. Queries slower than "
+        f"{profiler.SLOW_QUERY_MS} ms are logged with their plan to {profiler.SLOW_LOG}."
+    )
+    if st.button("Reset profiler", key="prof_reset"):
+        profiler.reset()
+    df_runs = pd.DataFrame(profiler.recent_runs())
+    if df_runs.empty:
+        st.info("No runs recorded yet.")
+    else:
+        st.write("Recent runs")
+        st.line_chart(df_runs, x="Started", y=["Query ms", "p95 ms"])
+        st.dataframe(style_dataframe(df_runs.iloc[::-1]))
+
+    st.write("Hottest statements")
+    df_hot = pd.DataFrame(profiler.hottest())
+    if not df_hot.empty:
+        df_hot.index = [f"#{i}" for i in range(1, len(df_hot) + 1)]
+        df_time = pd.DataFrame(profiler.timeline(), columns=["Minute", "Statement", "ms"])
+        st.line_chart(df_time.pivot_table(index="Minute", columns="Statement", values="ms", aggfunc="sum"))
+        st.dataframe(style_dataframe(df_hot))
+
+    st.write("Repeated statements (possible N+1)")
+    df_rep = pd.DataFrame(profiler.repeated_statements())
+    if df_rep.empty:
+        st.success(f"No statement ran {profiler.N_PLUS_ONE_MIN}+ times in one run.")
+    else:
+        st.dataframe(style_dataframe(df_rep))
+
+# --- Views ---
+# Only the open tab's view runs: tabs with on_change="rerun" report which one
+# is open, so a rerun no longer executes every tab's queries.
+VIEWS = [
+    ("Dashboard", dashboard_view),
+    ("Registration", registration_view),
+    ("Institute List", institute_list_view),
+    ("Classes", classes_view),
+    ("Registers", registers_view),
+    ("Accounts", accounts_view),
+    ("Reports", reports_view),
+    ("Admin Panel", admin_view),
+]
+# Filter and paging widgets keep their values while their tab is closed;
+# Streamlit otherwise drops the state of widgets that were not drawn.
+KEPT_WIDGETS = (
+    "inst_search", "inst_page_size", "debug_state", "debug_page_size", "debug_page",
+    "search_q", "rep_from", "rep_to", "rep_inst", "rep_cls", "rep_sec", "exp_name", "exp_fmt",
+    "imp_target", "dash_range", "admin_edit",
+)
+
+for k in KEPT_WIDGETS:
+    if k in st.session_state:
+        st.session_state[k] = st.session_state[k]
+
+tabs = st.tabs([label for label, _ in VIEWS], key="active_tab", on_change="rerun")
+for tab, (label, view) in zip(tabs, VIEWS):
+    if not tab.open:
+        continue
+    with tab:
+        with profiler.track(label) as run:
+            view()
+        logger.info("%s view: %d queries in %.1f ms", label, run.count, run.elapsed * 1000)
+        if st.query_params.get("timing"):
+            st.caption(f"{label}: {run.count} queries in {run.elapsed * 1000:.1f} ms")
+
+jobs_panel()
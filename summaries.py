@@ -0,0 +1,227 @@
+"""Incremental maintenance of the ``register_summary`` rollup.
+
+Every ORM flush that inserts, updates or deletes an income, expense or
+institute share row adds the matching delta to its (institute, class,
+section, month) bucket in the same transaction, so the rollup commits or
+rolls back together with the register. Writes that bypass the ORM (bulk
+Core inserts) must call ``apply_deltas`` themselves or ``rebuild`` afterwards.
+Rows moved to archive snapshots (archive.py) stay counted, so ``rebuild``
+and ``verify`` add them back from the snapshots.
+"""
+from collections import defaultdict
+
+from sqlalchemy import String, delete, event, func, inspect, literal, select, union_all
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.functions import GenericFunction
+
+import archive
+from dialects import insert_for
+from models import IncomeRegister, ExpenseRegister, InstituteShare, RegisterSummary
+
+KEY_ATTRS = ('institute_id', 'class_id', 'section_id')
+MEASURES = ('income', 'expense', 'share')
+
+# model -> (measure, date attribute, amount attribute)
+TRACKED = {
+    IncomeRegister: ('income', 'date', 'amount'),
+    ExpenseRegister: ('expense', 'date', 'amount'),
+    InstituteShare: ('share', 'paid_date', 'total_amount'),
+}
+
+AMOUNT_TOLERANCE = 0.005
+
+
+class year_month(GenericFunction):
+    """``'YYYY-MM'`` for a date column, on any supported backend."""
+    type = String()
+    inherit_cache = True
+
+
+@compiles(year_month)
+def _year_month_default(element, compiler, **kw):
+    return "strftime('%%Y-%%m', %s)" % compiler.process(element.clauses, **kw)
+
+
+@compiles(year_month, 'postgresql')
+def _year_month_postgresql(element, compiler, **kw):
+    return "to_char(%s, 'YYYY-MM')" % compiler.process(element.clauses, **kw)
+
+
+def month_key(d):
+    return f"{d.year:04d}-{d.month:02d}" if d else ''
+
+
+def bucket_key(institute_id, class_id, section_id, d):
+    return (institute_id or 0, class_id or 0, section_id or 0, month_key(d))
+
+
+# --- Delta capture ---
+def _old(state, attr):
+    history = state.attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return state.attrs[attr].value
+
+
+def _values(obj, spec, previous=False):
+    _, date_attr, amount_attr = spec
+    if previous:
+        state = inspect(obj)
+        get = lambda a: _old(state, a)
+    else:
+        get = lambda a: getattr(obj, a)
+    key = bucket_key(*(get(a) for a in KEY_ATTRS), get(date_attr))
+    return key, get(amount_attr) or 0
+
+
+def _track_old_values():
+    # Make the ORM load the previous value when one of these attributes is
+    # overwritten on an expired instance, so updates can subtract it.
+    for model, (_, date_attr, amount_attr) in TRACKED.items():
+        for attr in KEY_ATTRS + (date_attr, amount_attr):
+            event.listen(getattr(model, attr), 'set',
+                         lambda *args: None, active_history=True)
+
+
+@event.listens_for(Session, 'before_flush')
+def _load_deleted(session, flush_context, instances):
+    # Deleted rows are gone after the flush; read their values while we can.
+    for obj in session.deleted:
+        spec = TRACKED.get(type(obj))
+        if spec:
+            _values(obj, spec)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_deltas(session, flush_context):
+    deltas = defaultdict(lambda: defaultdict(float))
+
+    def add(key, measure, amount, count):
+        deltas[key][measure] += amount
+        deltas[key][measure + '_count'] += count
+
+    for obj in session.new:
+        spec = TRACKED.get(type(obj))
+        if spec:
+            key, amount = _values(obj, spec)
+            add(key, spec[0], amount, 1)
+    for obj in session.dirty:
+        spec = TRACKED.get(type(obj))
+        if spec and session.is_modified(obj, include_collections=False):
+            old_key, old_amount = _values(obj, spec, previous=True)
+            new_key, new_amount = _values(obj, spec)
+            if (old_key, old_amount) != (new_key, new_amount):
+                add(old_key, spec[0], -old_amount, -1)
+                add(new_key, spec[0], new_amount, 1)
+    for obj in session.deleted:
+        spec = TRACKED.get(type(obj))
+        if spec:
+            key, amount = _values(obj, spec)
+            add(key, spec[0], -amount, -1)
+
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+
+def apply_deltas(conn, deltas):
+    """Add ``{bucket_key: {measure: delta, measure_count: delta}}`` to the rollup."""
+    columns = [m for measure in MEASURES for m in (measure, measure + '_count')]
+    rows = []
+    for (institute_id, class_id, section_id, month), change in deltas.items():
+        row = dict(institute_id=institute_id, class_id=class_id,
+                   section_id=section_id, month=month)
+        for col in columns:
+            row[col] = int(change.get(col, 0)) if col.endswith('_count') else change.get(col, 0.0)
+        rows.append(row)
+
+    table = RegisterSummary.__table__
+    stmt = insert_for(conn)(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['institute_id', 'class_id', 'section_id', 'month'],
+        set_={col: table.c[col] + stmt.excluded[col] for col in columns},
+    )
+    conn.execute(stmt, rows)
+
+
+# --- Rebuild and verify ---
+def aggregate_select():
+    """The rollup as computed from scratch over the raw registers."""
+    parts = []
+    for model, (measure, date_attr, amount_attr) in TRACKED.items():
+        cols = [
+            func.coalesce(getattr(model, a), 0).label(a) for a in KEY_ATTRS
+        ] + [func.coalesce(year_month(getattr(model, date_attr)), '').label('month')]
+        for m in MEASURES:
+            if m == measure:
+                cols.append(func.coalesce(getattr(model, amount_attr), 0).label(m))
+                cols.append(literal(1).label(m + '_count'))
+            else:
+                cols.append(literal(0.0).label(m))
+                cols.append(literal(0).label(m + '_count'))
+        parts.append(select(*cols))
+    raw = union_all(*parts).subquery()
+    keys = [raw.c[a] for a in KEY_ATTRS] + [raw.c.month]
+    sums = [func.sum(raw.c[c]).label(c) for m in MEASURES for c in (m, m + '_count')]
+    return select(*keys, *sums).group_by(*keys)
+
+
+def rebuild(conn):
+    """Recompute the whole rollup from the registers. Returns the bucket count."""
+    table = RegisterSummary.__table__
+    conn.execute(delete(table))
+    agg = aggregate_select().subquery()
+    cols = [c.name for c in agg.columns]
+    conn.execute(table.insert().from_select(cols, select(*agg.columns)))
+    archived = archive.buckets(conn)
+    if archived:
+        apply_deltas(conn, archived)
+    return conn.execute(select(func.count()).select_from(table)).scalar()
+
+
+def _is_empty(row):
+    return all(row[m + '_count'] == 0 for m in MEASURES)
+
+
+def verify(conn):
+    """Compare the stored rollup with the registers.
+
+    Returns a list of ``(key, stored, expected)`` for every bucket that
+    differs; an empty list means the rollup is correct.
+    """
+    key_cols = KEY_ATTRS + ('month',)
+
+    def load(stmt):
+        out = {}
+        for row in conn.execute(stmt).mappings():
+            row = dict(row)
+            if not _is_empty(row):
+                out[tuple(row[k] for k in key_cols)] = row
+        return out
+
+    table = RegisterSummary.__table__
+    stored = load(select(*(table.c[k] for k in key_cols),
+                         *(table.c[c] for m in MEASURES for c in (m, m + '_count'))))
+    expected = load(aggregate_select())
+    for key, change in archive.buckets(conn).items():
+        row = expected.setdefault(key, dict(zip(key_cols, key), **{
+            c: 0 for m in MEASURES for c in (m, m + '_count')
+        }))
+        for col, value in change.items():
+            row[col] += value
+
+    mismatches = []
+    for key in stored.keys() | expected.keys():
+        got, want = stored.get(key), expected.get(key)
+        if got is None or want is None or any(
+            got[m + '_count'] != want[m + '_count']
+            or abs(got[m] - want[m]) > AMOUNT_TOLERANCE
+            for m in MEASURES
+        ):
+            mismatches.append((key, got, want))
+    return sorted(mismatches, key=lambda m: m[0])
+
+
+_track_old_values()
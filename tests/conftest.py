@@ -0,0 +1,87 @@
+import os
+import sys
+import tempfile
+
+# Set before the app modules are imported: they read these once.
+_tmp = tempfile.mkdtemp(prefix="ims-tests-")
+os.environ["IMS_DATABASE_URL"] = f"sqlite:///{_tmp}/default.db"
+os.environ["IMS_ARCHIVE_DIR"] = os.path.join(_tmp, "archive")
+os.environ["IMS_SCRYPT_N"] = "1024"  # hashing cost only matters in production
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import date  # noqa: E402
+
+import pytest  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+import archive  # noqa: E402
+import audit  # noqa: E402
+import db  # noqa: E402
+import jobs  # noqa: E402
+from models import (  # noqa: E402
+    Admin, AdminInstitute, Assignment, ClassModel, IncomeRegister, Institute, Section
+)
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """A fresh database; ``db.engine`` and ``db.Session`` point at it."""
+    eng = db.make_engine(f"sqlite:///{tmp_path}/test.db")
+    db.init_db(eng, log=lambda *a: None)
+    monkeypatch.setattr(db, "engine", eng)
+    monkeypatch.setattr(db, "Session", sessionmaker(bind=eng))
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    monkeypatch.setattr(jobs, "JOB_DIR", str(tmp_path / "jobs"))
+    yield eng
+    audit.flush()
+    eng.dispose()
+
+
+@pytest.fixture
+def session(engine):
+    with db.Session() as s:
+        yield s
+
+
+@pytest.fixture
+def institutes(session):
+    """Three institutes sharing class 1, each with its own section; the
+    second also runs class 2. ``{name: (institute, class, section)}``."""
+    c1, c2 = ClassModel(name="Welding", agency="TEVTA"), ClassModel(name="Tailoring", agency="PSDF")
+    session.add_all([c1, c2])
+    session.flush()
+    made = {}
+    for n, cls in ((1, c1), (2, c1), (2, c2), (3, c1)):
+        inst = session.query(Institute).filter_by(name=f"Institute {n}").first()
+        if inst is None:
+            inst = Institute(name=f"Institute {n}", rate_per_student=1000)
+            session.add(inst)
+        sec = Section(class_id=cls.id, name=f"{cls.name} {n}",
+                      start_date=date(2018, 1, 1), end_date=date(2018, 12, 31), duration_months=12)
+        session.add(sec)
+        session.flush()
+        session.add(Assignment(institute_id=inst.id, class_id=cls.id, section_id=sec.id,
+                               total_students=10))
+        made[(n, cls.name)] = (inst.id, cls.id, sec.id)
+    session.commit()
+    return made
+
+
+def add_income(session, key, day, amount):
+    iid, cid, sid = key
+    session.add(IncomeRegister(date=day, amount=amount, institute_id=iid, class_id=cid,
+                               section_id=sid))
+
+
+def make_admin(session, user_id, institute_ids=None, password=None):
+    """An admin seeing ``institute_ids`` (all institutes if ``None``)."""
+    import auth
+
+    admin = Admin(name=user_id, user_id=user_id, all_institutes=institute_ids is None,
+                  password=auth.hash_password(password) if password else None)
+    session.add(admin)
+    session.flush()
+    for iid in institute_ids or ():
+        session.add(AdminInstitute(admin_id=admin.id, institute_id=iid))
+    session.commit()
+    return admin.id
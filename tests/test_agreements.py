@@ -0,0 +1,19 @@
+from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime
+
+import agreements
+
+
+def test_reader_hands_streamlit_the_file_and_closes_it(tmp_path):
+    path = tmp_path / "a.pdf"
+    path.write_bytes(b"%PDF-1.4 agreement")
+    f = agreements.reader(str(path))()
+    data, _ = convert_data_to_bytes_and_infer_mime(f, unsupported_error=TypeError())
+    assert data == b"%PDF-1.4 agreement"
+    assert f.closed
+
+
+def test_reader_of_an_empty_file(tmp_path):
+    path = tmp_path / "empty.pdf"
+    path.write_bytes(b"")
+    f = agreements.reader(str(path))()
+    assert convert_data_to_bytes_and_infer_mime(f, unsupported_error=TypeError())[0] == b""
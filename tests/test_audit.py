@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import DatabaseError
+
+import audit
+import db
+from models import Admin, AuditLog, Institute
+
+
+def _commit(session):
+    session.commit()
+    assert audit.flush(timeout=10)
+    return datetime.now()
+
+
+def test_value_at_replays_changes(session):
+    session.info['admin_id'] = 3
+    inst = Institute(name="Old name", rate_per_student=100)
+    session.add(inst)
+    before_insert = datetime.now() - timedelta(seconds=1)
+    after_insert = _commit(session)
+    inst.rate_per_student = 150
+    after_update = _commit(session)
+    inst.name = "New name"
+    _commit(session)
+
+    with db.engine.connect() as conn:
+        assert audit.value_at(conn, Institute, inst.id, 'rate_per_student', before_insert) is None
+        assert audit.value_at(conn, Institute, inst.id, 'rate_per_student', after_insert) == 100
+        assert audit.value_at(conn, Institute, inst.id, 'rate_per_student', after_update) == 150
+        assert audit.value_at(conn, Institute, inst.id, 'name', after_update) == "Old name"
+        actions = [(admin_id, action) for _, admin_id, action, _ in
+                   audit.history(conn, Institute, inst.id)]
+    assert actions == [(3, 'insert'), (3, 'update'), (3, 'update')]
+
+
+def test_deleted_row_can_be_read_back(session):
+    inst = Institute(name="Gone", rate_per_student=70)
+    session.add(inst)
+    before_delete = _commit(session)
+    iid = inst.id
+    session.delete(inst)
+    after_delete = _commit(session)
+    with db.engine.connect() as conn:
+        assert audit.state_at(conn, Institute, iid, after_delete) is None
+        assert audit.value_at(conn, Institute, iid, 'name', before_delete) == "Gone"
+
+
+def test_rollback_logs_nothing(session):
+    session.add(Institute(name="Never"))
+    session.flush()
+    session.rollback()
+    audit.flush(timeout=10)
+    with db.engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM audit_log")).scalar() == 0
+
+
+def test_passwords_are_masked(session):
+    session.add(Admin(user_id="masked", password="scrypt$secret"))
+    _commit(session)
+    with db.engine.connect() as conn:
+        (changes,) = conn.execute(text("SELECT changes FROM audit_log")).scalars()
+    assert "secret" not in changes and audit.HIDDEN in changes
+
+
+def test_log_is_append_only(session):
+    session.add(Institute(name="Kept"))
+    _commit(session)
+    with pytest.raises(DatabaseError, match="append-only"):
+        with db.engine.begin() as conn:
+            conn.execute(AuditLog.__table__.delete())
+    with pytest.raises(DatabaseError, match="append-only"):
+        with db.engine.begin() as conn:
+            conn.execute(AuditLog.__table__.update().values(action='x'))
+
+
+def test_disposed_engine_is_not_retried(tmp_path, caplog):
+    eng = db.make_engine(f"sqlite:///{tmp_path}/scratch.db")
+    db.init_db(eng)
+    eng.dispose()
+    with eng.begin() as conn:
+        conn.execute(text("DROP TABLE audit_log"))
+    with db.Session(bind=eng) as session:
+        session.add(Institute(name="Scratch"))
+        session.commit()
+    started = datetime.now()
+    assert audit.flush(timeout=10)
+    assert datetime.now() - started < timedelta(seconds=1)
+    assert "Dropped 1 audit entries of a disposed engine" in caplog.text
+    eng.dispose()
@@ -0,0 +1,118 @@
+import pytest
+
+import auth
+from conftest import make_admin
+
+
+@pytest.fixture(autouse=True)
+def clean_store():
+    auth._sessions.clear()
+    auth._failures.clear()
+    yield
+    auth._sessions.clear()
+    auth._failures.clear()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(auth.time, "time", lambda: now[0])
+    return now
+
+
+def test_hash_round_trip():
+    stored = auth.hash_password("s3cret")
+    assert auth.is_hashed(stored) and "s3cret" not in stored
+    assert auth.verify_password("s3cret", stored)
+    assert not auth.verify_password("wrong", stored)
+    assert not auth.verify_password("s3cret", "s3cret")  # plaintext never matches
+
+
+def test_rehash_at_a_new_cost(session, monkeypatch):
+    make_admin(session, "cost", password="pw")
+    monkeypatch.setattr(auth, "SCRYPT_N", auth.SCRYPT_N * 2)
+    auth.login(session, "cost", "pw")
+    session.expire_all()
+    from models import Admin
+    stored = session.query(Admin).filter_by(user_id="cost").one().password
+    assert stored.split("$")[1] == str(auth.SCRYPT_N)
+
+
+def test_login_and_current(session):
+    admin_id = make_admin(session, "ana", password="pw")
+    token = auth.login(session, " ana ", "pw")
+    login = auth.current(token)
+    assert login.admin_id == admin_id and login.name == "ana"
+
+
+def test_wrong_password_and_unknown_user(session):
+    make_admin(session, "ana", password="pw")
+    with pytest.raises(auth.LoginError):
+        auth.login(session, "ana", "nope")
+    with pytest.raises(auth.LoginError):
+        auth.login(session, "nobody", "pw")
+
+
+def test_tampered_token_is_rejected(session):
+    admin_id = make_admin(session, "ana", password="pw")
+    token = auth.login(session, "ana", "pw")
+    payload, _, signature = token.rpartition(".")
+    forged = f"{admin_id + 1}{payload[len(str(admin_id)):]}.{signature}"
+    assert auth.current(forged) is None
+    assert auth.current(None) is None
+
+
+def test_session_expires(session, clock, monkeypatch):
+    make_admin(session, "ana", password="pw")
+    monkeypatch.setattr(auth, "IDLE_MINUTES", 10 ** 6)
+    token = auth.login(session, "ana", "pw")
+    clock[0] += auth.SESSION_HOURS * 3600 - 1
+    assert auth.current(token) is not None
+    clock[0] += 2
+    assert auth.current(token) is None
+
+
+def test_idle_session_ends(session, clock):
+    make_admin(session, "ana", password="pw")
+    token = auth.login(session, "ana", "pw")
+    clock[0] += auth.IDLE_MINUTES * 60 - 1
+    assert auth.current(token) is not None  # activity restarts the idle clock
+    clock[0] += auth.IDLE_MINUTES * 60 - 1
+    assert auth.current(token) is not None
+    clock[0] += auth.IDLE_MINUTES * 60 + 1
+    assert auth.current(token) is None
+
+
+def test_logout_and_end_sessions(session):
+    admin_id = make_admin(session, "ana", password="pw")
+    first, second = auth.login(session, "ana", "pw"), auth.login(session, "ana", "pw")
+    auth.logout(first)
+    assert auth.current(first) is None and auth.current(second) is not None
+    auth.end_sessions(admin_id)
+    assert auth.current(second) is None
+
+
+def test_lockout_after_repeated_failures(session, clock):
+    make_admin(session, "ana", password="pw")
+    for _ in range(auth.MAX_FAILURES):
+        with pytest.raises(auth.LoginError, match="Wrong"):
+            auth.login(session, "ana", "nope")
+    with pytest.raises(auth.LoginError, match="Too many"):
+        auth.login(session, "ana", "pw")
+    clock[0] += auth.LOCKOUT_SECONDS
+    assert auth.current(auth.login(session, "ana", "pw")) is not None
+    assert "ana" not in auth._failures
+
+
+def test_failure_counts_are_bounded(session, clock, monkeypatch):
+    monkeypatch.setattr(auth, "MAX_TRACKED_IDS", 3)
+    for n in range(5):
+        with pytest.raises(auth.LoginError):
+            auth.login(session, f"guess{n}", "x")
+        clock[0] += 1
+    assert list(auth._failures) == ["guess2", "guess3", "guess4"]
+    # Expired counts are swept by the next attempt, whatever its id.
+    clock[0] += auth.LOCKOUT_SECONDS
+    with pytest.raises(auth.LoginError):
+        auth.login(session, "other", "x")
+    assert list(auth._failures) == ["other"]
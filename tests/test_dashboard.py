@@ -0,0 +1,83 @@
+from datetime import date
+
+import dashboard
+from conftest import add_income
+from models import ClassModel, Institute, Section
+
+
+def _institutes(session, names):
+    cls = ClassModel(name="Welding")
+    session.add(cls)
+    session.flush()
+    sec = Section(class_id=cls.id, name="A")
+    session.add(sec)
+    made = [Institute(name=name) for name in names]
+    session.add_all(made)
+    session.flush()
+    return [(inst.id, cls.id, sec.id) for inst in made]
+
+
+def test_trend_keeps_institutes_with_the_same_name_apart(session, monkeypatch):
+    dashboard.clear()
+    monkeypatch.setattr(dashboard, "TOP_INSTITUTES", 3)
+    twin_a, twin_b, others, small = _institutes(session, ["Twin", "Twin", "Others", "Small"])
+    for key, amount in ((twin_a, 400), (twin_b, 300), (others, 200), (small, 5)):
+        add_income(session, key, date(2024, 5, 10), amount)
+    session.commit()
+
+    period, points = dashboard.income_trend(session, date(2024, 1, 1), date(2024, 12, 31))
+    assert period == 1
+    assert {name: amount for _, name, amount in points} == {
+        f"{twin_a[0]}: Twin": 400, f"{twin_b[0]}: Twin": 300,
+        f"{others[0]}: Others": 200, "Others": 5,
+    }
+
+
+def test_long_ranges_are_downsampled(session):
+    dashboard.clear()
+    (key,) = _institutes(session, ["Long"])
+    for year in range(2015, 2025):
+        for month in (1, 7):
+            add_income(session, key, date(year, month, 1), 1)
+    session.commit()
+    period, points = dashboard.income_trend(session, date(2015, 1, 1), date(2024, 12, 31))
+    assert period == 3 and len(points) == 20
+    assert points[0][0] == "2015-01" and sum(p[2] for p in points) == 20
+
+
+def test_kpis_refresh_after_a_write(session):
+    dashboard.clear()
+    (key,) = _institutes(session, ["Busy"])
+    today = date(2024, 5, 20)
+    add_income(session, key, date(2024, 4, 2), 50)
+    session.commit()
+    first = dashboard.kpis(session, today)
+    assert (first.income, first.last_income) == (0.0, 50.0)
+    assert dashboard.kpis(session, today) is first
+    add_income(session, key, date(2024, 5, 2), 70)
+    session.commit()
+    assert dashboard.kpis(session, today).income == 70.0
+
+
+def test_register_writes_do_not_reprice_outstanding_shares(session, institutes, monkeypatch):
+    dashboard.clear()
+    today = date(2024, 5, 20)
+    before = dashboard.kpis(session, today)
+    assert before.unpaid == 4
+    calls = []
+    monkeypatch.setattr(dashboard.shares, 'summary', lambda *a, **kw: calls.append(1))
+    add_income(session, institutes[(1, "Welding")], date(2024, 5, 2), 70)
+    session.commit()
+    after = dashboard.kpis(session, today)
+    assert after.income == 70.0 and not calls
+    assert (after.unpaid, after.outstanding) == (before.unpaid, before.outstanding)
+
+
+def test_cache_keeps_the_most_recent_entries(session, monkeypatch):
+    dashboard.clear()
+    monkeypatch.setattr(dashboard, 'MAX_ENTRIES', 3)
+    _institutes(session, ["Busy"])
+    session.commit()
+    for year in range(2020, 2025):
+        dashboard.income_trend(session, date(year, 1, 1))
+    assert [key[2] for key in dashboard._cache] == [(date(y, 1, 1), None) for y in (2022, 2023, 2024)]
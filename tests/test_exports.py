@@ -0,0 +1,44 @@
+import io
+from datetime import date
+
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+import archive
+import db
+import exports
+from conftest import add_income
+
+READERS = {
+    'csv': lambda f: pd.read_csv(f, parse_dates=['date']),
+    'xlsx': lambda f: pd.read_excel(f, parse_dates=['date']),
+    'parquet': pd.read_parquet,
+}
+
+
+@pytest.mark.parametrize("fmt", sorted(exports.WRITERS))
+def test_register_export_round_trip(session, institutes, fmt):
+    for n, key in enumerate(institutes.values(), start=1):
+        add_income(session, key, date(2018, 6, n), 100.5 * n)
+        add_income(session, key, date(2024, 2, n), 10.25 * n)
+    session.commit()
+    with db.engine.connect() as conn:
+        want = sorted(conn.execute(text(
+            "SELECT id, date, amount, institute_id FROM income_register"
+        )).all())
+    archive.archive_closed(db.engine, 2019, log=lambda *a: None)
+    with db.engine.connect() as conn:
+        live = conn.execute(text("SELECT COUNT(*) FROM income_register")).scalar()
+    assert live == len(institutes)
+
+    out = io.BytesIO()
+    exports.export(db.engine, session, 'income_register', fmt, out, chunk_size=3)
+    out.seek(0)
+    frame = READERS[fmt](out)
+
+    assert frame.columns.tolist() == ['id', 'date', 'amount', 'institute_id', 'class_id',
+                                      'section_id']
+    got = sorted((int(r.id), f"{pd.Timestamp(r.date):%Y-%m-%d}", float(r.amount),
+                  int(r.institute_id)) for r in frame.itertuples())
+    assert got == [tuple(r) for r in want]
@@ -0,0 +1,59 @@
+import io
+
+from sqlalchemy import text
+
+import db
+import importer
+import summaries
+
+INCOME = """date,amount,institute,class,section
+2024-01-31,100,Institute 1,Welding,Welding 1
+2024-02-01,250.5,Institute 2,Tailoring,Tailoring 2
+2024-02-02,75,3,Welding,Welding 3
+"""
+
+
+def _income(conn):
+    return conn.execute(text(
+        "SELECT date, amount, institute_id FROM income_register ORDER BY date"
+    )).all()
+
+
+def _rollup_income(conn):
+    return conn.execute(text("SELECT COALESCE(SUM(income), 0) FROM register_summary")).scalar()
+
+
+def test_dry_run_checks_everything_and_writes_nothing(session, institutes):
+    result = importer.import_csv(db.engine, 'income_register', io.StringIO(INCOME), dry_run=True)
+    assert (result.rows, result.valid, result.inserted, result.errors) == (3, 3, 0, [])
+    assert not result.committed
+    with db.engine.connect() as conn:
+        assert _income(conn) == []
+        assert _rollup_income(conn) == 0
+
+
+def test_commit_writes_rows_and_rollup(session, institutes):
+    result = importer.import_csv(db.engine, 'income_register', io.StringIO(INCOME))
+    assert (result.valid, result.inserted, result.committed) == (3, 3, True)
+    with db.engine.connect() as conn:
+        assert _income(conn) == [
+            ('2024-01-31', 100.0, institutes[(1, "Welding")][0]),
+            ('2024-02-01', 250.5, institutes[(2, "Tailoring")][0]),
+            ('2024-02-02', 75.0, institutes[(3, "Welding")][0]),
+        ]
+        assert _rollup_income(conn) == 425.5
+        assert summaries.verify(conn) == []
+
+
+def test_errors_roll_back_unless_skipped(session, institutes):
+    bad = INCOME + "2024-02-03,10,Nowhere,Welding,Welding 1\n"
+    result = importer.import_csv(db.engine, 'income_register', io.StringIO(bad))
+    assert result.errors == [(5, "unknown institute 'Nowhere'")]
+    assert (result.valid, result.inserted, result.committed) == (3, 0, False)
+    with db.engine.connect() as conn:
+        assert _income(conn) == []
+
+    result = importer.import_csv(db.engine, 'income_register', io.StringIO(bad), skip_errors=True)
+    assert (result.inserted, result.committed) == (3, True)
+    with db.engine.connect() as conn:
+        assert len(_income(conn)) == 3
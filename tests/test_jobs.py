@@ -0,0 +1,12 @@
+from datetime import date
+
+import jobs
+from conftest import add_income
+
+
+def test_archive_task_reports_the_registers_it_touched(session, institutes):
+    assert 'touched' not in jobs.archive_task(jobs.JobContext(0), 2019)
+    add_income(session, institutes[(1, "Welding")], date(2018, 3, 20), 100)
+    session.commit()
+    outcome = jobs.archive_task(jobs.JobContext(0), 2019)
+    assert outcome['touched'] == ['income_register', 'expense_register']
@@ -0,0 +1,26 @@
+from datetime import date
+
+import db
+import migrations
+import summaries
+from conftest import add_income
+from models import ExpenseRegister, InstituteShare, RegisterSummary
+
+
+def test_rollup_backfill_matches_the_registers(session, institutes):
+    a, b = institutes[(1, "Welding")], institutes[(2, "Tailoring")]
+    add_income(session, a, date(2024, 1, 5), 10)
+    add_income(session, a, date(2024, 1, 25), 5)
+    add_income(session, b, date(2024, 2, 1), 7)
+    add_income(session, b, None, 1)
+    session.add(ExpenseRegister(date=date(2024, 1, 9), amount=3, institute_id=a[0],
+                                class_id=a[1], section_id=a[2]))
+    session.add(InstituteShare(institute_id=b[0], class_id=b[1], section_id=b[2],
+                               total_amount=100, paid_date=date(2024, 3, 1)))
+    session.commit()
+
+    with db.engine.begin() as conn:
+        conn.execute(RegisterSummary.__table__.delete())
+        migrations._m002_register_summary(conn)
+        assert summaries.verify(conn) == []
+        assert conn.execute(RegisterSummary.__table__.select()).all()
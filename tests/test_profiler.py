@@ -0,0 +1,19 @@
+import time
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+import profiler
+
+
+def test_failed_statement_leaves_no_start_time(engine):
+    profiler.install(engine)
+    profiler.reset()
+    with engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.execute(text("SELECT * FROM no_such_table"))
+        time.sleep(0.2)
+        conn.execute(text("SELECT 42")).all()
+        assert "profiler_started" not in conn.info
+    assert profiler.statements["SELECT 42"].max < 0.1
@@ -0,0 +1,103 @@
+import io
+from datetime import date
+
+import pytest
+from sqlalchemy import select
+
+import db
+import importer
+import migrations
+import rates
+from models import Institute, InstituteShare, Section
+from rates import RateHistory
+
+
+def test_months_counts_by_the_day():
+    assert rates.months(date(2024, 1, 1), date(2024, 1, 31)) == 1
+    assert rates.months(date(2024, 1, 15), date(2024, 3, 14)) == pytest.approx(17 / 31 + 1 + 14 / 31)
+    assert rates.months(date(2024, 2, 1), date(2024, 2, 15)) == pytest.approx(15 / 29)
+    assert rates.months(date(2024, 3, 1), date(2024, 2, 1)) == 0
+
+
+def test_share_without_versions_uses_the_current_rate():
+    history = RateHistory({}, {1: 1000})
+    assert history.share(1, 10, date(2024, 1, 1), date(2024, 3, 31)) == (30000, 1000)
+    assert history.share(1, 10, None, None, duration_months=4) == (40000, 1000)
+    assert history.share(1, None, date(2024, 1, 1), date(2024, 1, 31)) == (None, None)
+
+
+def test_share_is_prorated_across_a_rate_change():
+    history = RateHistory({1: [(rates.OPEN_START, 1000), (date(2024, 2, 1), 1200)]}, {1: 1200})
+    amount, rate = history.share(1, 10, date(2024, 1, 15), date(2024, 3, 14))
+    assert rate == 1000
+    assert amount == pytest.approx(10 * (1000 * 17 / 31 + 1200 * (1 + 14 / 31)), abs=0.01)
+
+
+def test_change_in_the_middle_of_a_month():
+    history = RateHistory({1: [(rates.OPEN_START, 300), (date(2023, 4, 11), 600)]}, {1: 600})
+    assert history.prorated(1, date(2023, 4, 1), date(2023, 4, 30)) == pytest.approx(
+        300 * 10 / 30 + 600 * 20 / 30)
+
+
+def test_days_before_the_first_version_have_no_rate():
+    history = RateHistory({1: [(date(2024, 2, 1), 1200)]}, {1: 1200})
+    assert history.share(1, 10, date(2024, 1, 20), date(2024, 2, 20)) == (None, None)
+
+
+def test_set_rate_reprices_unpaid_shares_only(session, institutes):
+    iid, cid, sid = institutes[(1, "Welding")]  # section runs 2018, 10 students
+    sec = session.get(Section, sid)
+    unpaid, paid = (
+        InstituteShare(institute_id=iid, class_id=cid, section_id=sid, total_students=10,
+                       rate_per_student=1000, duration_months=12, total_amount=120000,
+                       paid_date=paid_date)
+        for paid_date in (None, date(2019, 1, 5))
+    )
+    session.add_all([unpaid, paid])
+    session.commit()
+
+    result = rates.set_rate(session, iid, 1500, date(2018, 7, 1))
+    session.commit()
+    new_amount = 10 * (1000 * 6 + 1500 * 6)
+    assert result == rates.Repricing(repriced=1, paid_differs=1, paid_difference=new_amount - 120000)
+    assert unpaid.total_amount == pytest.approx(new_amount)
+    assert paid.total_amount == 120000
+    assert rates.rate_on(session.connection(), iid, date(2018, 6, 30)) == 1000
+    assert rates.rate_on(session.connection(), iid, sec.end_date) == 1500
+
+
+def _versions(session, iid):
+    return [(v.effective_from, v.rate) for v in rates.versions(session, iid)]
+
+
+def test_imported_institutes_start_with_a_rate_version(session):
+    result = importer.import_csv(db.engine, 'institutes', io.StringIO(
+        "name,rate_per_student\nWith rate,800\nWithout rate,\n"))
+    assert result.committed
+    with_rate, without = session.scalars(select(Institute).order_by(Institute.id)).all()
+    assert _versions(session, with_rate.id) == [(rates.OPEN_START, 800)]
+    assert _versions(session, without.id) == []
+
+
+def test_registered_institutes_start_with_a_rate_version(session, engine):
+    from test_app import signed_in_app
+
+    at = signed_in_app(session, "Registration")
+    next(t for t in at.text_input if t.label == "Institute Name").input("Fresh")
+    next(n for n in at.number_input if n.label == "Rate Per Student").set_value(650)
+    next(b for b in at.button if b.label == "Register Institute").click().run()
+    assert not at.exception
+    inst = session.scalars(select(Institute).where(Institute.name == "Fresh")).one()
+    assert _versions(session, inst.id) == [(rates.OPEN_START, 650)]
+
+
+def test_migration_backfills_first_versions(session, institutes):
+    iid = institutes[(1, "Welding")][0]
+    rates.set_rate(session, iid, 1200, date(2020, 1, 1))
+    session.commit()
+    with db.engine.begin() as conn:
+        migrations._m008_first_rates(conn)
+    others = {i for i, _, _ in institutes.values()} - {iid}
+    for other in others:
+        assert _versions(session, other) == [(rates.OPEN_START, 1000)]
+    assert _versions(session, iid) == [(rates.OPEN_START, 1000), (date(2020, 1, 1), 1200)]
@@ -0,0 +1,42 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+
+import db
+import reports
+from conftest import add_income
+from reports import ReportFilter
+
+
+@pytest.mark.parametrize("start, end, expected", [
+    (None, None, ((None, None), [])),
+    (date(2024, 1, 1), date(2024, 3, 31), (("2024-01", "2024-03"), [])),
+    (date(2024, 1, 15), date(2024, 3, 10), (
+        ("2024-02", "2024-02"),
+        [(date(2024, 1, 15), date(2024, 1, 31)), (date(2024, 3, 1), date(2024, 3, 10))])),
+    (date(2024, 1, 31), date(2024, 2, 1), (
+        None, [(date(2024, 1, 31), date(2024, 1, 31)), (date(2024, 2, 1), date(2024, 2, 1))])),
+    (date(2024, 2, 10), date(2024, 2, 20), (None, [(date(2024, 2, 10), date(2024, 2, 20))])),
+    (date(2024, 2, 29), None, (("2024-03", None), [(date(2024, 2, 29), date(2024, 2, 29))])),
+    (None, date(2024, 2, 28), ((None, "2024-01"), [(date(2024, 2, 1), date(2024, 2, 28))])),
+    (date(2024, 3, 1), date(2024, 2, 1), (None, [])),
+])
+def test_split_range(start, end, expected):
+    assert reports.split_range(start, end) == expected
+
+
+def test_profit_loss_counts_edge_days_once(session, institutes):
+    for n, key in enumerate(institutes.values(), start=1):
+        for day in (date(2024, 1, 14), date(2024, 1, 15), date(2024, 1, 31),
+                    date(2024, 2, 1), date(2024, 2, 29), date(2024, 3, 10), date(2024, 3, 11)):
+            add_income(session, key, day, n * day.day)
+    session.commit()
+    filters = ReportFilter(date(2024, 1, 15), date(2024, 3, 10))
+    got = {r.ID: r.Income for r in reports.profit_loss_by_institute(session, filters)}
+    with db.engine.connect() as conn:
+        want = dict(conn.execute(text(
+            "SELECT institute_id, SUM(amount) FROM income_register "
+            "WHERE date BETWEEN '2024-01-15' AND '2024-03-10' GROUP BY institute_id"
+        )).all())
+    assert got == want
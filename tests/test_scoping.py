@@ -0,0 +1,97 @@
+import csv
+from datetime import date
+
+import pandas as pd
+from sqlalchemy import select
+
+import archive
+import db
+import exports
+import jobs
+import reports
+import scoping
+from conftest import add_income, make_admin
+from models import AdminInstitute, IncomeRegister, Institute
+from reports import ReportFilter
+
+
+def test_restricted_session_reads_only_permitted_institutes(session, institutes):
+    first = institutes[(1, "Welding")][0]
+    admin_id = make_admin(session, "one", [first])
+    for key in institutes.values():
+        add_income(session, key, date(2024, 5, 1), 100)
+    session.commit()
+
+    scoping.scope(session, admin_id)
+    assert [i.id for i in session.scalars(select(Institute))] == [first]
+    assert {r.institute_id for r in session.scalars(select(IncomeRegister))} == {first}
+    other = institutes[(3, "Welding")][0]
+    assert session.get(Institute, other) is None
+
+    scoping.scope(session, None)
+    assert len(session.scalars(select(Institute)).all()) == 3
+
+
+def test_unrestricted_admin_has_no_scope(session, institutes):
+    admin_id = make_admin(session, "all")
+    assert scoping.scope(session, admin_id) is None
+    assert len(session.scalars(select(Institute)).all()) == 3
+
+
+def test_scope_follows_permission_changes(session, institutes):
+    first, third = institutes[(1, "Welding")][0], institutes[(3, "Welding")][0]
+    admin_id = make_admin(session, "grow", [first])
+    assert scoping.scope(session, admin_id).institute_ids == {first}
+    session.add(AdminInstitute(admin_id=admin_id, institute_id=third))
+    session.commit()
+    assert scoping.scope(session, admin_id).institute_ids == {first, third}
+
+
+def test_restrict_filters_engine_reads(session, institutes):
+    first = institutes[(1, "Welding")][0]
+    scope = scoping.Scope(0, frozenset({first}))
+    frame = pd.read_sql(scoping.restrict(select(Institute.id, Institute.name), scope), db.engine)
+    assert frame["id"].tolist() == [first]
+
+
+def _archived_incomes(session, institutes):
+    # Edge days of the range in an archived year, for every institute.
+    for n, key in enumerate(institutes.values(), start=1):
+        add_income(session, key, date(2018, 3, 20), 100.0 * n)
+        add_income(session, key, date(2018, 4, 10), 1.0 * n)
+        add_income(session, key, date(2022, 6, 5), 10.0 * n)
+    session.commit()
+    archive.archive_closed(db.engine, 2019, log=lambda *a: None)
+    assert archive.partitions(session.connection(), 'income_register')
+
+
+def test_export_job_matches_report_over_archived_range(session, institutes):
+    _archived_incomes(session, institutes)
+    first = institutes[(1, "Welding")][0]
+    admin_id = make_admin(session, "export", [first])
+    period = {'start': "2018-03-15", 'end': "2022-06-10"}
+
+    outcome = jobs.export_task(jobs.JobContext(0), 'income_by_class', 'csv', admin_id=admin_id,
+                               **period)
+    with open(outcome['result_path'], newline='') as f:
+        exported = {int(r['ID']): float(r['Total Income']) for r in csv.DictReader(f)}
+
+    scoping.scope(session, admin_id)
+    filters = ReportFilter(date(2018, 3, 15), date(2022, 6, 10))
+    in_app = {r.ID: r[2] for r in reports.income_by_class(session, filters)}
+    welding = institutes[(1, "Welding")][1]
+    assert in_app == {welding: 111.0}
+    assert exported == in_app
+
+
+def test_register_export_skips_other_institutes_archives(session, institutes):
+    _archived_incomes(session, institutes)
+    first = institutes[(1, "Welding")][0]
+    scope = scoping.Scope(0, frozenset({first}))
+    filters = ReportFilter(date(2018, 1, 1), date(2022, 12, 31))
+    with db.engine.connect() as conn:
+        assert exports.row_count(conn, session, 'income_register', filters, scope) == 3
+        archived = [r for chunk in archive.iter_chunks(conn, 'income_register', filters, scope=scope)
+                    for r in chunk]
+    assert len(archived) == 2
+    assert {r[3] for r in archived} == {first}
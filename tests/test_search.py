@@ -0,0 +1,78 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+
+import db
+import migrations
+import scoping
+import search
+from conftest import make_admin
+from models import Institute, LetterDispatch, LetterReceive
+
+
+def test_index_lookup_is_cached_until_an_upgrade(session, institutes):
+    with db.engine.connect() as conn:
+        assert search.search(conn, "institute").backend == "fts5"
+        with db.QueryCounter() as q:
+            search.search(conn, "institute")
+    assert q.count == len(search.SOURCES)
+    migrations.upgrade(db.engine, log=lambda *a: None)
+    assert db.engine not in search._indexes
+
+
+def _seed(session):
+    session.add_all([
+        Institute(name="Crescent Welding Academy", address="Mall Road, Lahore", focal_person="Ayesha"),
+        Institute(name="Crescent Tailoring", address="Canal View", focal_person="Bilal"),
+        Institute(name="Indus Technical", address="Crescent Lane", focal_person="Sana"),
+        LetterDispatch(date=date(2024, 1, 5), reference="TEVTA/2024/17", recipient="Crescent Welding"),
+        LetterReceive(date=date(2024, 1, 9), reference="PSDF-88", sender="Indus Board"),
+    ])
+    session.commit()
+
+
+def _ids(results):
+    return {name: {row['ID'] for row in rows} for name, rows in results.hits.items()}
+
+
+@pytest.mark.parametrize("query", ["crescent", "cresc weld", "tevta 2024", "indus", "o'brien \"x"])
+def test_fts5_and_like_find_the_same_rows(session, query):
+    _seed(session)
+    with db.engine.connect() as conn:
+        fts = search.search(conn, query)
+        with pytest.MonkeyPatch.context() as m:
+            m.setattr(search, 'BACKENDS', {})
+            like = search.search(conn, query)
+    assert (fts.backend, like.backend) == ("fts5", "like")
+    assert _ids(fts) == _ids(like)
+
+
+def test_fts5_ranks_name_hits_first(session):
+    _seed(session)
+    with db.engine.connect() as conn:
+        rows = search.search(conn, "crescent", sources=['institutes']).hits['institutes']
+    assert [r['name'] for r in rows][-1] == "Indus Technical"
+
+
+def test_missing_index_falls_back_to_like(session):
+    _seed(session)
+    with db.engine.begin() as conn:
+        conn.execute(text("DROP TABLE institutes_fts"))
+    migrations.upgrade(db.engine, log=lambda *a: None)
+    with db.engine.connect() as conn:
+        results = search.search(conn, "crescent")
+    assert results.backend == "fts5/like"
+    assert len(results.hits['institutes']) == 3
+
+
+def test_scope_limits_institute_hits(session):
+    _seed(session)
+    first = session.query(Institute).filter_by(name="Crescent Tailoring").one().id
+    scope = scoping.Scope(make_admin(session, "one", [first]), frozenset({first}))
+    for backends in (search.BACKENDS, {}):
+        with db.engine.connect() as conn, pytest.MonkeyPatch.context() as m:
+            m.setattr(search, 'BACKENDS', backends)
+            hits = search.search(conn, "crescent", scope=scope).hits
+        assert [r['ID'] for r in hits['institutes']] == [first]
+        assert len(hits['letters_dispatch']) == 1
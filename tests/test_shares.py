@@ -0,0 +1,28 @@
+from datetime import date
+
+from sqlalchemy import func, select
+
+import audit
+import db
+import shares
+from models import AuditLog, InstituteShare
+
+
+def test_compute_all_logs_every_share(session, institutes):
+    result = shares.compute_all(db.engine, date(2019, 1, 15), ended_by=date(2018, 12, 31),
+                                admin_id=7)
+    assert result.inserted == 4
+    with db.engine.connect() as conn:
+        for share_id, amount in conn.execute(select(InstituteShare.id, InstituteShare.total_amount)):
+            (changed_at, admin_id, action, changes), = audit.history(conn, InstituteShare, share_id)
+            assert (admin_id, action) == (7, 'insert')
+            assert changes['total_amount'] == amount and changes['paid_date'] == "2019-01-15"
+        assert audit.value_at(conn, InstituteShare, share_id, 'total_amount', date.today()) == amount
+
+
+def test_dry_run_logs_nothing(session, institutes):
+    result = shares.compute_all(db.engine, date(2019, 1, 15), dry_run=True)
+    assert result.inserted == 4
+    with db.engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(AuditLog)).scalar() == 0
+        assert conn.execute(select(func.count()).select_from(InstituteShare)).scalar() == 0
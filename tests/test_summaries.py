@@ -0,0 +1,58 @@
+from datetime import date
+
+from sqlalchemy import text
+
+import db
+import summaries
+from conftest import add_income
+from models import ExpenseRegister, IncomeRegister
+
+RAW = text(
+    "SELECT institute_id, strftime('%Y-%m', date) AS month, SUM(amount) FROM income_register "
+    "GROUP BY institute_id, month"
+)
+ROLLUP = text(
+    "SELECT institute_id, month, SUM(income) FROM register_summary "
+    "WHERE income_count > 0 GROUP BY institute_id, month"
+)
+
+
+def _compare(conn):
+    raw, rollup = conn.execute(RAW).all(), conn.execute(ROLLUP).all()
+    assert sorted(rollup) == sorted(raw)
+
+
+def test_rollup_matches_the_registers_across_a_month_boundary(session, institutes):
+    key = institutes[(2, "Tailoring")]
+    for day, amount in ((date(2024, 1, 31), 10.0), (date(2024, 2, 1), 20.0),
+                        (date(2024, 2, 29), 40.0), (date(2024, 3, 1), 80.0)):
+        add_income(session, key, day, amount)
+    session.add(ExpenseRegister(date=date(2024, 1, 31), amount=5.0, institute_id=key[0],
+                                class_id=key[1], section_id=key[2]))
+    session.commit()
+    with db.engine.connect() as conn:
+        _compare(conn)
+        assert summaries.verify(conn) == []
+
+    # Moving an entry over the boundary shifts it between buckets.
+    moved = session.query(IncomeRegister).filter_by(date=date(2024, 1, 31)).one()
+    moved.date = date(2024, 2, 1)
+    session.delete(session.query(IncomeRegister).filter_by(date=date(2024, 3, 1)).one())
+    session.commit()
+    with db.engine.connect() as conn:
+        _compare(conn)
+        assert summaries.verify(conn) == []
+        assert conn.execute(text(
+            "SELECT month, income, income_count FROM register_summary ORDER BY month"
+        )).all() == [("2024-01", 0.0, 0), ("2024-02", 70.0, 3), ("2024-03", 0.0, 0)]
+
+
+def test_rebuild_reproduces_the_maintained_rollup(session, institutes):
+    for n, key in enumerate(institutes.values(), start=1):
+        add_income(session, key, date(2023, 12, 31), n)
+        add_income(session, key, date(2024, 1, 1), 10 * n)
+    session.commit()
+    with db.engine.begin() as conn:
+        before = conn.execute(ROLLUP).all()
+        assert summaries.rebuild(conn) == 2 * len(institutes)
+        assert sorted(conn.execute(ROLLUP).all()) == sorted(before)